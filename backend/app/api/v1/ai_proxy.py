@@ -1,16 +1,57 @@
-from fastapi import APIRouter # type: ignore
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException # type: ignore
+from fastapi.responses import StreamingResponse # type: ignore
 from pydantic import BaseModel # type: ignore
-from app.services.ai_service import call_text_model, call_text_to_speech # type: ignore
+from app.services.ai_service import call_text_model # type: ignore
+from app.services.llm_service import route_stats
+from app.services.tts_cache import synthesize
 
 router = APIRouter()
 
 class AIRequest(BaseModel):
     text: str
 
+
+class TTSRequest(AIRequest):
+    voice_id: Optional[str] = None
+    model_id: Optional[str] = None
+    voice_settings: Optional[Dict[str, Any]] = None
+
+
 @router.post("/text")
 async def text(req: AIRequest):
     return {"reply": await call_text_model(req.text)}
 
+@router.get("/llm/routes")
+async def llm_routes():
+    """Rolling latency/error stats per LLM route, best first."""
+    return route_stats()
+
 @router.post("/tts")
-async def tts(req: AIRequest):
-    return {"audio_url": await call_text_to_speech(req.text)}
\ No newline at end of file
+async def tts(req: TTSRequest):
+    """Stream audio for `text`; identical requests share one cached clip."""
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="text is required")
+    result = await synthesize(req.text, voice_id=req.voice_id, model_id=req.model_id, voice_settings=req.voice_settings)
+    chunks = result.chunks
+    # Wait for the first chunk so a failed synthesis is a 502, not a
+    # truncated 200.
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception:
+        raise HTTPException(status_code=502, detail="speech synthesis failed")
+
+    async def body():
+        if first:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=result.media_type,
+        headers={"X-TTS-Cache": result.status, "ETag": f'"{result.key}"', "Cache-Control": "public, max-age=86400"},
+    )
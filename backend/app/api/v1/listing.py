@@ -1,11 +1,12 @@
-from typing import Optional
+import datetime
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException, status # type: ignore
+from fastapi import APIRouter, HTTPException, Query, Request, status # type: ignore
+from fastapi.responses import StreamingResponse # type: ignore
 from pydantic import BaseModel # type: ignore
 
 from app.services.listing_service import (
     create_listing,
-    get_competitor_prices,
     list_listings,
     get_listing,
     update_listing,
@@ -13,7 +14,15 @@ from app.services.listing_service import (
     set_availability,
     adjust_price,
     adjust_all_dynamic,
+    current_sequence,
+    wait_for_changes,
 )
+from app.services.comp_index import DEFAULT_K, DEFAULT_RADIUS_KM, get_competitor_prices, record_competitor_observations
+from app.services.search_index import search_listings
+from app.services.platform_sync import publish_listing, sync_status
+from app.services.price_history import MAX_BUCKETS, listing_price_history, portfolio_summary
+from app.services.price_grid import HORIZON_DAYS, get_nightly_prices, record_booking, record_competitor_prices
+from app.utils.serialization import FastJSONResponse, json_dumps
 
 router = APIRouter()
 
@@ -46,6 +55,52 @@ class PriceAdjust(BaseModel):
 class DynamicAdjust(BaseModel):
     rate: float = 1.0
 
+
+class CompetitorObservation(BaseModel):
+    platform: str
+    external_id: str
+    price: float
+    beds: Optional[int] = None
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    address: Optional[str] = None
+
+
+class CompetitorObservations(BaseModel):
+    observations: List[CompetitorObservation]
+
+
+class Booking(BaseModel):
+    start: datetime.date
+    end: datetime.date
+
+
+class CompetitorPrices(BaseModel):
+    prices: Dict[datetime.date, float]
+
+
+class Publish(BaseModel):
+    platforms: Optional[List[str]] = None
+
+
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+def _history_window(start: Optional[datetime.datetime], end: Optional[datetime.datetime], bucket: Optional[str]):
+    """Epoch bounds (default: the last 30 days) and bucket seconds, validated."""
+    end_ts = end.timestamp() if end else datetime.datetime.now(datetime.timezone.utc).timestamp()
+    start_ts = start.timestamp() if start else end_ts - 30 * 86400
+    if end_ts <= start_ts:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    bucket_s = None
+    if bucket:
+        if bucket not in BUCKETS:
+            raise HTTPException(status_code=400, detail=f"bucket must be one of {sorted(BUCKETS)}")
+        bucket_s = BUCKETS[bucket]
+        if (end_ts - start_ts) / bucket_s > MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail=f"at most {MAX_BUCKETS} buckets per request")
+    return start_ts, end_ts, bucket_s
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create(l: ListingCreate):
     try:
@@ -55,13 +110,108 @@ async def create(l: ListingCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/compare")
-async def compare(address: str):
-    return await get_competitor_prices(address)
+async def compare(
+    address: Optional[str] = None,
+    listing_id: Optional[str] = None,
+    k: int = Query(DEFAULT_K, ge=1, le=100),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=100),
+    beds: Optional[int] = None,
+    include_own: bool = True,
+):
+    """Nearest comparable listings and competitor observations."""
+    if address is None and listing_id is None:
+        raise HTTPException(status_code=400, detail="address or listing_id is required")
+    return await get_competitor_prices(address=address, listing_id=listing_id, k=k, radius_km=radius_km, beds=beds, include_own=include_own)
+
+
+@router.post("/compare/observations")
+async def add_observations(body: CompetitorObservations):
+    return await record_competitor_observations([o.dict() for o in body.observations])
+
+
+async def _sse_changes(request: Request, since: int, limit: int):
+    yield "retry: 2000\n\n"
+    cursor = since
+    while not await request.is_disconnected():
+        result = await wait_for_changes(cursor, timeout=15.0, limit=limit)
+        if result["resync_required"]:
+            yield f"event: resync\ndata: {json_dumps(result).decode()}\n\n"
+            return
+        for change in result["changes"]:
+            yield f"id: {change['seq']}\nevent: change\ndata: {json_dumps(change).decode()}\n\n"
+            cursor = change["seq"]
+        if not result["changes"]:
+            yield ": keep-alive\n\n"
+
+
+@router.get("/changes")
+async def changes(
+    request: Request,
+    since: Optional[int] = None,
+    timeout: float = Query(0.0, ge=0.0, le=60.0),
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+):
+    """Listing changes after sequence `since`.
+
+    - Long-poll: waits up to `timeout` seconds for the first change.
+    - SSE: `stream=true` or `Accept: text/event-stream`; resumes from
+      `Last-Event-ID` on reconnect.
+    - Without `since`, returns the current sequence as a starting cursor.
+    - 410 with `resync_required: true` when the cursor is too old to serve
+      by delta; re-read `GET /api/v1/listings/` and continue from `last_seq`.
+    """
+    if since is None and request.headers.get("last-event-id", "").isdigit():
+        since = int(request.headers["last-event-id"])
+    if since is None:
+        since = await current_sequence()
+        if not stream and "text/event-stream" not in request.headers.get("accept", ""):
+            return FastJSONResponse({"resync_required": False, "last_seq": since, "changes": [], "has_more": False})
+
+    if stream or "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _sse_changes(request, since, limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    result = await wait_for_changes(since, timeout=timeout, limit=limit)
+    return FastJSONResponse(result, status_code=status.HTTP_410_GONE if result["resync_required"] else 200)
+
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    available_only: bool = False,
+):
+    """Full-text search over title, description and address (BM25 ranked)."""
+    return FastJSONResponse(await search_listings(q, limit=limit, offset=offset, available_only=available_only))
+
+
+@router.get("/price-history")
+async def price_history_summary(
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    bucket: str = "day",
+    percentiles: str = "25,50,75,90",
+):
+    """Portfolio-wide distribution of time-weighted mean prices per window."""
+    start_ts, end_ts, bucket_s = _history_window(start, end, bucket)
+    try:
+        qs = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers")
+    if any(not 0 <= q <= 100 for q in qs):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 100")
+    return FastJSONResponse(await portfolio_summary(start_ts, end_ts, bucket_s, qs))
 
 
 @router.get("/")
 async def list_all(available_only: bool = False):
-    return await list_listings(available_only=available_only)
+    # Returned as a response directly so large arrays skip `jsonable_encoder`.
+    return FastJSONResponse(await list_listings(available_only=available_only))
 
 
 @router.get("/{listing_id}")
@@ -96,6 +246,63 @@ async def availability(listing_id: str, body: Availability):
     return updated
 
 
+@router.get("/{listing_id}/prices")
+async def nightly_prices(listing_id: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None):
+    """Per-night prices for `[start, end)`; defaults to the next 30 nights."""
+    start = start or datetime.datetime.now(datetime.timezone.utc).date()
+    end = end or start + datetime.timedelta(days=30)
+    if end <= start or (end - start).days > HORIZON_DAYS:
+        raise HTTPException(status_code=400, detail=f"end must be after start and within {HORIZON_DAYS} days")
+    nights = await get_nightly_prices(listing_id, start, end)
+    if nights is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return FastJSONResponse({"id": listing_id, "start": start.isoformat(), "end": end.isoformat(), "nights": nights})
+
+
+@router.get("/{listing_id}/price-history")
+async def price_history(
+    listing_id: str,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    bucket: Optional[str] = None,
+):
+    """Price changes in the window, or per-`bucket` mean/min/max/close."""
+    start_ts, end_ts, bucket_s = _history_window(start, end, bucket)
+    if await get_listing(listing_id) is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return FastJSONResponse(await listing_price_history(listing_id, start_ts, end_ts, bucket_s))
+
+
+@router.post("/{listing_id}/bookings")
+async def add_booking(listing_id: str, body: Booking):
+    if body.end <= body.start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if await get_listing(listing_id) is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return {"recomputed_nights": await record_booking(listing_id, body.start, body.end)}
+
+
+@router.post("/{listing_id}/competitor-prices")
+async def add_competitor_prices(listing_id: str, body: CompetitorPrices):
+    if await get_listing(listing_id) is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return {"recomputed_nights": await record_competitor_prices(listing_id, body.prices)}
+
+
+@router.post("/{listing_id}/publish")
+async def publish(listing_id: str, body: Publish):
+    """Publish to the platforms; later edits are synced as field-level diffs."""
+    results = await publish_listing(listing_id, body.platforms)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return {"results": results}
+
+
+@router.get("/{listing_id}/sync")
+async def sync(listing_id: str):
+    return await sync_status(listing_id)
+
+
 @router.post("/{listing_id}/price")
 async def price_adjust(listing_id: str, body: PriceAdjust):
     updated = await adjust_price(listing_id, multiplier=body.multiplier, delta=body.delta, set_price=body.set_price)
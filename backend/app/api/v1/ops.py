@@ -0,0 +1,78 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query # type: ignore
+from pydantic import BaseModel # type: ignore
+
+from app.services.agents import run_ops_checks, schedule_cleaning, schedule_cleanings
+from app.services.ops_tasks import cancel_task, complete_task, get_task, list_tasks, stats
+
+router = APIRouter()
+
+
+class Cleaning(BaseModel):
+    listing_id: str
+    when: str
+    cleaner_id: Optional[str] = None
+
+
+class Cleanings(BaseModel):
+    cleanings: List[Cleaning]
+
+
+@router.post("/cleanings")
+async def create_cleaning(body: Cleaning):
+    res = await schedule_cleaning(body.listing_id, body.when, cleaner_id=body.cleaner_id)
+    if "task" not in res:
+        raise HTTPException(status_code=400, detail=res.get("error", "invalid request"))
+    return res
+
+
+@router.post("/cleanings/bulk")
+async def create_cleanings(body: Cleanings):
+    try:
+        return await schedule_cleanings([c.dict() for c in body.cleanings])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/tasks")
+async def tasks(
+    status: str = Query("upcoming", pattern="^(upcoming|overdue)$"),
+    within_hours: float = Query(24.0, gt=0, le=24 * 366),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    return await list_tasks(status, within_s=within_hours * 3600, limit=limit)
+
+
+@router.get("/tasks/stats")
+async def task_stats():
+    return await stats()
+
+
+@router.get("/tasks/{task_id}")
+async def read_task(task_id: str):
+    task = await get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@router.post("/tasks/{task_id}/complete")
+async def complete(task_id: str):
+    task = await complete_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@router.post("/tasks/{task_id}/cancel")
+async def cancel(task_id: str):
+    task = await cancel_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@router.post("/checks")
+async def checks():
+    return await run_ops_checks()
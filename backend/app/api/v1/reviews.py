@@ -0,0 +1,27 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException # type: ignore
+from pydantic import BaseModel # type: ignore
+
+from app.services.agents import send_review_requests
+
+router = APIRouter()
+
+# Larger sends should be split by the caller (or scheduled as a job).
+MAX_REVIEW_REQUESTS = 10000
+
+
+class ReviewRequest(BaseModel):
+    listing_id: str
+    guest: Dict[str, Any] = {}
+
+
+class ReviewRequests(BaseModel):
+    requests: List[ReviewRequest]
+
+
+@router.post("/requests")
+async def bulk_review_requests(body: ReviewRequests):
+    if len(body.requests) > MAX_REVIEW_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_REVIEW_REQUESTS} requests per call")
+    return await send_review_requests([r.dict() for r in body.requests])
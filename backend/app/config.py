@@ -30,6 +30,48 @@ class Settings:
     ALLOW_ORIGINS: List[str] = (
         os.getenv("ALLOW_ORIGINS", "http://localhost,http://localhost:3000").split(",")
     )
+    # Text-to-speech: default ElevenLabs voice/model, and the on-disk audio
+    # cache (content-addressed, least recently used files evicted first).
+    ELEVENLABS_VOICE_ID: str = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
+    ELEVENLABS_MODEL_ID: str = os.getenv("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2")
+    TTS_CACHE_DIR: str = os.getenv(
+        "TTS_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "tts_cache")
+    )
+    TTS_CACHE_MAX_MB: float = float(os.getenv("TTS_CACHE_MAX_MB", "512"))
+    # On-disk format of the listing store: `json` or `msgpack` (compact
+    # binary). Existing stores in the other format are migrated on first read.
+    LISTING_STORE_FORMAT: str = os.getenv("LISTING_STORE_FORMAT", "json")
+    # Nominatim-compatible geocoder used for addresses missing from the
+    # local geocode cache; empty disables lookups.
+    GEOCODE_URL: str = os.getenv("GEOCODE_URL", "")
+    # Number of recent listing changes each worker keeps for
+    # `GET /api/v1/listings/changes`; older cursors must resync.
+    CHANGE_FEED_SIZE: int = int(os.getenv("CHANGE_FEED_SIZE", "10000"))
+    # Startup warm-up (see app/services/warmup.py): preload the listing
+    # store and indexes before serving; the lifespan waits at most
+    # WARMUP_TIMEOUT_S, then finishes in the background (`/ready` is 503
+    # until then). WARMUP_LLM=1 also sends one probe prompt per LLM route.
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "1").lower() in ("1", "true", "yes")
+    WARMUP_TIMEOUT_S: float = float(os.getenv("WARMUP_TIMEOUT_S", "60"))
+    WARMUP_LLM: bool = os.getenv("WARMUP_LLM", "0").lower() in ("1", "true", "yes")
+    # Platform sync (see app/services/platform_sync.py): published listings
+    # push changed fields once they've been quiet for SYNC_DEBOUNCE_S,
+    # and at most SYNC_MAX_DELAY_S after the first pending change.
+    SYNC_ENABLED: bool = os.getenv("SYNC_ENABLED", "1").lower() in ("1", "true", "yes")
+    SYNC_DEBOUNCE_S: float = float(os.getenv("SYNC_DEBOUNCE_S", "2"))
+    SYNC_MAX_DELAY_S: float = float(os.getenv("SYNC_MAX_DELAY_S", "30"))
+    # Admission control for expensive routes (see app/utils/admission.py):
+    # per-worker pool overrides as `pool=limit/queue/max_wait_s,...`.
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+    ADMISSION_LIMITS: str = os.getenv("ADMISSION_LIMITS", "")
+    # Profiling: requests carrying `X-Profile: <PROFILE_TOKEN>` are profiled;
+    # PROFILE_ALL_REQUESTS=1 profiles everything (admin/debug use only).
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_ALL_REQUESTS: bool = os.getenv("PROFILE_ALL_REQUESTS", "0").lower() in ("1", "true", "yes")
+    PROFILE_DIR: str = os.getenv(
+        "PROFILE_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "profiles")
+    )
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
 
 
 settings = Settings()
\ No newline at end of file
@@ -1,9 +1,53 @@
-from fastapi import FastAPI # type: ignore
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from app.api.v1 import listing, webhook, ai_proxy
+from app.api.v1 import listing, webhook, ai_proxy, ops, reviews
+from app.config import settings
 from app.routes.predict import router as predict_router
+from app.services.platform_sync import flush_pending
+from app.services.warmup import mark_ready_without_warmup, readiness, warm_up
+from app.utils.admission import AdmissionMiddleware
+from app.utils.http import close_http_client
+from app.utils.metrics import REGISTRY, PrometheusMiddleware
+from app.utils.profiler import ProfilingMiddleware
+from app.utils.serialization import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    task = None
+    if settings.WARMUP_ENABLED:
+        task = asyncio.ensure_future(warm_up())
+        try:
+            # Shielded: on timeout warm-up keeps going and `/ready` stays 503.
+            await asyncio.wait_for(asyncio.shield(task), settings.WARMUP_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            logger.warning("Warm-up exceeded %.0fs; continuing in the background", settings.WARMUP_TIMEOUT_S)
+    else:
+        mark_ready_without_warmup()
+    logger.info("Startup took %.0f ms", (time.perf_counter() - started) * 1000)
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+    # Push debounced listing edits rather than dropping them.
+    try:
+        await flush_pending()
+    except Exception:
+        logger.exception("Final platform sync flush failed")
+    await close_http_client()
+
 
-app = FastAPI(title="Unicorn AI Backend")
+app = FastAPI(title="Unicorn AI Backend", default_response_class=FastJSONResponse, lifespan=lifespan)
+# Innermost, so shed requests still get CORS headers and are counted.
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, limits=settings.ADMISSION_LIMITS)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -16,13 +60,30 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+# Added last so it is the outermost middleware and times the whole stack.
+app.add_middleware(PrometheusMiddleware)
 app.include_router(predict_router)
 
 
 app.include_router(listing.router, prefix="/api/v1/listings")
 app.include_router(webhook.router, prefix="/api/v1/webhooks")
 app.include_router(ai_proxy.router, prefix="/api/v1/ai")
+app.include_router(ops.router, prefix="/api/v1/ops")
+app.include_router(reviews.router, prefix="/api/v1/reviews")
 
 @app.get("/health")
 def health():
+    """Liveness: the process is up. Use `/ready` for traffic readiness."""
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    report = readiness.report()
+    return FastJSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,227 @@
+"""Compact, columnar in-memory representation of the listing portfolio.
+
+Hot fields live in parallel columns — `price` in an `array('d')`,
+`available` in a `bytearray` and `id`/`title`/`address` in plain lists —
+so scanning or bulk-updating prices never touches per-listing dicts.
+`metadata` and any other (cold) fields are kept as encoded bytes and only
+decoded when a caller materializes a row or asks for the metadata.
+
+Rows are materialized into fresh dicts on access, so callers may mutate
+what they get back without affecting the table.
+"""
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.utils.serialization import json_dumps, json_loads
+
+_NAN = float("nan")
+# `available` column values; _UNSET means the stored listing had no flag,
+# which readers treat as available.
+_NO, _YES, _UNSET = 0, 1, 2
+_HOT_FIELDS = ("id", "title", "address", "price", "available", "metadata")
+
+
+def _encode(value: Optional[Dict[str, Any]]) -> Optional[bytes]:
+    if value is None:
+        return None
+    # orjson returns bytes backed by an over-allocated buffer (~4 KiB); copy
+    # into an exact-size object since these blobs stay resident.
+    return bytes(memoryview(json_dumps(value)))
+
+
+class ListingTable:
+    __slots__ = ("ids", "titles", "addresses", "prices", "available", "extras", "meta_raw", "_index")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.titles: List[Optional[str]] = []
+        self.addresses: List[Optional[str]] = []
+        self.prices = array("d")
+        self.available = bytearray()
+        # Encoded cold fields (description, constraints, ...) and metadata.
+        self.extras: List[Optional[bytes]] = []
+        self.meta_raw: List[Optional[bytes]] = []
+        self._index: Dict[str, int] = {}
+
+    @classmethod
+    def from_dicts(cls, listings: Iterable[Dict[str, Any]]) -> "ListingTable":
+        table = cls()
+        for l in listings:
+            table.append(l)
+        return table
+
+    def copy(self) -> "ListingTable":
+        """A snapshot safe to read from another thread while this table is written."""
+        table = ListingTable()
+        table.ids = list(self.ids)
+        table.titles = list(self.titles)
+        table.addresses = list(self.addresses)
+        table.prices = array("d", self.prices)
+        table.available = bytearray(self.available)
+        table.extras = list(self.extras)
+        table.meta_raw = list(self.meta_raw)
+        table._index = dict(self._index)
+        return table
+
+    # --- encoding -------------------------------------------------------
+
+    @staticmethod
+    def _split(listing: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str], float, int, Optional[bytes], Optional[bytes]]:
+        extras = {k: v for k, v in listing.items() if k not in _HOT_FIELDS}
+        price = listing.get("price")
+        if price is None:
+            price_value = _NAN
+        else:
+            try:
+                price_value = float(price)
+            except (TypeError, ValueError):
+                # Keep unparseable prices verbatim rather than losing them.
+                price_value = _NAN
+                extras["price"] = price
+        if "available" in listing:
+            avail = _YES if listing["available"] else _NO
+        else:
+            avail = _UNSET
+        return (
+            str(listing.get("id")),
+            listing.get("title"),
+            listing.get("address"),
+            price_value,
+            avail,
+            _encode(extras) if extras else None,
+            _encode(listing["metadata"]) if "metadata" in listing else None,
+        )
+
+    # --- row access -----------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, listing_id: str) -> bool:
+        return str(listing_id) in self._index
+
+    def index_of(self, listing_id: str) -> int:
+        return self._index.get(str(listing_id), -1)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Materialize row `i` as a listing dict (decodes cold fields)."""
+        out: Dict[str, Any] = {"id": self.ids[i]}
+        if self.titles[i] is not None:
+            out["title"] = self.titles[i]
+        if self.addresses[i] is not None:
+            out["address"] = self.addresses[i]
+        price = self.prices[i]
+        if not math.isnan(price):
+            out["price"] = price
+        avail = self.available[i]
+        if avail != _UNSET:
+            out["available"] = avail == _YES
+        if self.extras[i] is not None:
+            out.update(json_loads(self.extras[i]))
+        if self.meta_raw[i] is not None:
+            out["metadata"] = json_loads(self.meta_raw[i])
+        return out
+
+    def get(self, listing_id: str) -> Optional[Dict[str, Any]]:
+        i = self.index_of(listing_id)
+        return self.row(i) if i >= 0 else None
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        raw = self.meta_raw[i]
+        return json_loads(raw) if raw is not None else {}
+
+    def extra(self, i: int, key: str, default: Any = None) -> Any:
+        """One cold field of row `i` (e.g. `description`, `constraints`)."""
+        raw = self.extras[i]
+        if raw is None:
+            return default
+        return json_loads(raw).get(key, default)
+
+    def is_available(self, i: int) -> bool:
+        return self.available[i] != _NO
+
+    def iter_rows(self, available_only: bool = False) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.ids)):
+            if available_only and self.available[i] == _NO:
+                continue
+            yield self.row(i)
+
+    def to_dicts(self, available_only: bool = False) -> List[Dict[str, Any]]:
+        return list(self.iter_rows(available_only))
+
+    def to_json(self) -> bytes:
+        """The whole table as a JSON array, byte-for-byte `json_dumps(to_dicts())`.
+
+        Hot fields are encoded from the columns and the stored cold-field
+        bytes are spliced in as they are, so no row is decoded.
+        """
+        parts: List[bytes] = []
+        for i in range(len(self.ids)):
+            hot: Dict[str, Any] = {"id": self.ids[i]}
+            if self.titles[i] is not None:
+                hot["title"] = self.titles[i]
+            if self.addresses[i] is not None:
+                hot["address"] = self.addresses[i]
+            price = self.prices[i]
+            if not math.isnan(price):
+                hot["price"] = price
+            avail = self.available[i]
+            if avail != _UNSET:
+                hot["available"] = avail == _YES
+            head = json_dumps(hot)
+            extras, meta = self.extras[i], self.meta_raw[i]
+            if extras is None and meta is None:
+                parts.append(head)
+                continue
+            # `head` and `extras` are compact JSON objects: drop the closing
+            # and opening braces and join their members.
+            row = [head[:-1]]
+            if extras is not None:
+                row.append(b"," + extras[1:-1])
+            if meta is not None:
+                row.append(b',"metadata":' + meta)
+            row.append(b"}")
+            parts.append(b"".join(row))
+        return b"[" + b",".join(parts) + b"]"
+
+    # --- mutation -------------------------------------------------------
+
+    def append(self, listing: Dict[str, Any]) -> int:
+        listing_id, title, address, price, avail, extras, meta = self._split(listing)
+        if listing_id in self._index:
+            self.set_row(self._index[listing_id], listing)
+            return self._index[listing_id]
+        i = len(self.ids)
+        self.ids.append(listing_id)
+        self.titles.append(title)
+        self.addresses.append(address)
+        self.prices.append(price)
+        self.available.append(avail)
+        self.extras.append(extras)
+        self.meta_raw.append(meta)
+        self._index[listing_id] = i
+        return i
+
+    def set_row(self, i: int, listing: Dict[str, Any]) -> None:
+        _, title, address, price, avail, extras, meta = self._split(listing)
+        self.titles[i] = title
+        self.addresses[i] = address
+        self.prices[i] = price
+        self.available[i] = avail
+        self.extras[i] = extras
+        self.meta_raw[i] = meta
+
+    def set_price(self, i: int, price: float) -> None:
+        self.prices[i] = float(price)
+
+    def remove(self, listing_id: str) -> bool:
+        i = self.index_of(listing_id)
+        if i < 0:
+            return False
+        for column in (self.ids, self.titles, self.addresses, self.prices, self.available, self.extras, self.meta_raw):
+            del column[i]
+        del self._index[str(listing_id)]
+        for j in range(i, len(self.ids)):
+            self._index[self.ids[j]] = j
+        return True
@@ -9,8 +9,8 @@ and robust error handling as you iterate.
 from .calendar_agent import run_calendar_sync
 from .pricing_agent import run_pricing_for_listing, run_pricing_all
 from .guest_comm_agent import handle_incoming_message
-from .ops_agent import schedule_cleaning, run_ops_checks
-from .review_agent import send_review_request
+from .ops_agent import schedule_cleaning, schedule_cleanings, run_ops_checks
+from .review_agent import send_review_request, send_review_requests
 
 __all__ = [
     "run_calendar_sync",
@@ -18,6 +18,8 @@ __all__ = [
     "run_pricing_all",
     "handle_incoming_message",
     "schedule_cleaning",
+    "schedule_cleanings",
     "run_ops_checks",
     "send_review_request",
+    "send_review_requests",
 ]
@@ -4,10 +4,12 @@ from typing import Optional, List, Dict, Any
 
 from app.services.listing_service import list_listings, update_listing
 from app.services.integrations_service import fetch_remote_availability
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+@traced("calendar_agent.run_calendar_sync")
 async def run_calendar_sync(listing_id: Optional[str] = None) -> List[Dict[str, Any]]:
     """Basic calendar sync agent.
 
@@ -4,10 +4,12 @@ from typing import Dict, Any
 
 from app.services.llm_service import run_llm
 from app.services.n8n_service import send_webhook
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+@traced("guest_comm_agent.handle_incoming_message")
 async def handle_incoming_message(listing_id: str, message: str, guest: Dict[str, Any]) -> Dict[str, Any]:
     """Basic guest communication agent.
 
@@ -1,30 +1,77 @@
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 
 from app.services.n8n_service import send_webhook
 from app.services.listing_service import get_listing
+from app.services import ops_tasks
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Overdue tasks per escalation webhook, and webhooks in flight at once.
+ESCALATION_BATCH_SIZE = 200
+ESCALATION_CONCURRENCY = 4
 
+
+@traced("ops_agent.schedule_cleaning")
 async def schedule_cleaning(listing_id: str, when: str, cleaner_id: Optional[str] = None) -> Dict[str, Any]:
-    """Schedule a cleaning task via n8n webhook.
+    """Record a cleaning task and notify n8n.
 
-    - `when` is an ISO timestamp or simple description.
-    - Returns webhook result.
+    - `when` is an ISO date or timestamp (naive means UTC).
+    - Returns the stored task and the webhook result; `ok` is False if
+      `when` can't be parsed or the webhook failed (the task is kept
+      either way and escalated if it goes overdue).
     """
+    try:
+        task = await ops_tasks.schedule_task(listing_id, when, kind="cleaning", cleaner_id=cleaner_id)
+    except ValueError:
+        return {"ok": False, "error": f"invalid `when`: {when!r}"}
     l = await get_listing(listing_id)
-    payload = {"listing": l, "when": when, "cleaner_id": cleaner_id}
+    payload = {"listing": l, "when": task["due_at"], "cleaner_id": cleaner_id, "task_id": task["id"]}
     try:
         res = await send_webhook("cleaning-schedule", payload)
-        return {"ok": True, "result": res}
+        return {"ok": bool(res.get("ok")), "task": task, "result": res}
     except Exception:
         logger.exception("Failed to schedule cleaning for %s", listing_id)
-        return {"ok": False}
+        return {"ok": False, "task": task}
+
+
+@traced("ops_agent.schedule_cleanings")
+async def schedule_cleanings(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Bulk-schedule cleanings (`listing_id`, `when`, optional `cleaner_id`).
+
+    Stored in one journal write and announced to n8n in one webhook.
+    """
+    tasks = await ops_tasks.schedule_tasks([{**item, "kind": "cleaning"} for item in items])
+    res = await send_webhook("cleaning-schedule-batch", {"tasks": tasks})
+    return {"ok": bool(res.get("ok")), "scheduled": len(tasks), "result": res}
+
+
+async def _escalate_batch(batch: List[Dict[str, Any]], sem: asyncio.Semaphore) -> bool:
+    async with sem:
+        res = await send_webhook("ops-escalation", {"tasks": batch, "count": len(batch)})
+    ok = bool(res.get("ok"))
+    await ops_tasks.record_escalations([t["id"] for t in batch], ok)
+    if not ok:
+        logger.warning("Escalation batch of %d tasks failed; retrying in %ds", len(batch), ops_tasks.ESCALATION_RETRY_S)
+    return ok
 
 
+@traced("ops_agent.run_ops_checks")
 async def run_ops_checks() -> List[Dict[str, Any]]:
-    """Run a quick ops pass — placeholder that could check overdue tasks, etc."""
-    # In a full implementation, fetch tasks, check statuses, escalate if overdue
-    logger.info("Running ops checks (placeholder)")
-    return [{"status": "ok"}]
+    """Escalate overdue tasks in batches.
+
+    Only tasks whose escalation time has passed are popped from the task
+    heap, so a pass costs O(k log n) for k due tasks regardless of how many
+    cleanings are scheduled.
+    """
+    due = await ops_tasks.claim_due()
+    if not due:
+        return [{"status": "ok", "escalated": 0}]
+    sem = asyncio.Semaphore(ESCALATION_CONCURRENCY)
+    batches = [due[i:i + ESCALATION_BATCH_SIZE] for i in range(0, len(due), ESCALATION_BATCH_SIZE)]
+    results = await asyncio.gather(*[_escalate_batch(b, sem) for b in batches])
+    escalated = sum(len(b) for b, ok in zip(batches, results) if ok)
+    logger.info("Ops checks: %d due, %d escalated in %d batches", len(due), escalated, len(batches))
+    return [{"status": "ok" if all(results) else "partial", "due": len(due), "escalated": escalated, "batches": len(batches)}]
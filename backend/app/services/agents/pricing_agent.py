@@ -2,8 +2,10 @@ import asyncio
 import logging
 from typing import Optional, Dict, Any, List
 
+from app.services.comp_index import get_competitor_prices
 from app.services.listing_service import get_listing, list_listings, update_listing
-from app.services.integrations_service import get_competitor_prices
+from app.services.price_grid import rebuild_price_grid
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +34,7 @@ def _compute_suggested_price(current_price: float, competitors: List[Dict[str, A
     return round(max(0.0, suggested), 2)
 
 
+@traced("pricing_agent.run_pricing_for_listing")
 async def run_pricing_for_listing(listing_id: str) -> Optional[Dict[str, Any]]:
     """Run pricing logic for a single listing and persist suggestion.
 
@@ -41,9 +44,10 @@ async def run_pricing_for_listing(listing_id: str) -> Optional[Dict[str, Any]]:
     if not l:
         return None
     current = float(l.get("price", 0.0))
-    # fetch competitor prices (mock)
+    # nearby competitor observations with a similar bed count; our own
+    # listings are left out so repeated runs don't undercut each other
     try:
-        comp = await get_competitor_prices(l.get("address", ""))
+        comp = await get_competitor_prices(address=l.get("address"), listing_id=listing_id, include_own=False)
         competitors = comp.get("competitors", [])
     except Exception:
         logger.exception("Failed to fetch competitor prices for %s", listing_id)
@@ -58,7 +62,12 @@ async def run_pricing_for_listing(listing_id: str) -> Optional[Dict[str, Any]]:
     return updated
 
 
+@traced("pricing_agent.run_pricing_all")
 async def run_pricing_all() -> List[Dict[str, Any]]:
     listings = await list_listings(available_only=False)
     tasks = [ run_pricing_for_listing(l["id"]) for l in listings ]
-    return await asyncio.gather(*tasks)
+    results = await asyncio.gather(*tasks)
+    # Base prices moved for the whole portfolio: one bulk pass beats
+    # refreshing every dirty row individually.
+    await rebuild_price_grid()
+    return results
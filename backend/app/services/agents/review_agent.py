@@ -1,12 +1,17 @@
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
+from app.services.listing_service import get_listing_table
 from app.services.llm_service import run_llm
 from app.services.n8n_service import send_webhook
+from app.utils.serialization import json_loads
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+@traced("review_agent.send_review_request")
 async def send_review_request(listing_id: str, guest: Dict[str, Any]) -> Dict[str, Any]:
     """Generate and send a review-request message for a guest.
 
@@ -30,3 +35,148 @@ async def send_review_request(listing_id: str, guest: Dict[str, Any]) -> Dict[st
     except Exception:
         logger.exception("Failed to send review message via n8n")
         return {"ok": False}
+
+
+# --- bulk -------------------------------------------------------------------
+
+# Guests per LLM call, LLM calls in flight, messages per n8n payload and
+# deliveries in flight.
+GENERATION_BATCH_SIZE = 25
+GENERATION_CONCURRENCY = 4
+DELIVERY_BATCH_SIZE = 100
+DELIVERY_CONCURRENCY = 4
+
+
+def _fallback_message(guest: Dict[str, Any], title: Optional[str]) -> str:
+    name = guest.get("name")
+    greeting = f"Hi {name}, thanks" if name else "Thanks"
+    place = f" at {title}" if title else ""
+    return f"{greeting} for staying with us{place} — we hope you enjoyed it! If you have a moment, please leave a review."
+
+
+def _batch_prompt(items: List[Dict[str, Any]]) -> str:
+    lines = [
+        "Write a short, friendly message for each guest below asking them to leave a review for their recent stay.",
+        "Address the guest by name and mention the property. Keep each under 40 words and include a thank you.",
+        'Reply with only a JSON array of objects {"i": <number>, "message": <text>}, one per guest.',
+        "",
+    ]
+    for item in items:
+        guest = item["guest"]
+        lines.append(f'{item["i"]}. guest: {guest.get("name") or "guest"}; property: {item.get("title") or "our place"}')
+    return "\n".join(lines)
+
+
+def _parse_messages(reply: str) -> Dict[int, str]:
+    start, end = reply.find("["), reply.rfind("]")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        parsed = json_loads(reply[start:end + 1])
+    except Exception:
+        return {}
+    out: Dict[int, str] = {}
+    for entry in parsed if isinstance(parsed, list) else []:
+        if isinstance(entry, dict) and isinstance(entry.get("message"), str) and entry["message"].strip():
+            try:
+                out[int(entry.get("i"))] = entry["message"].strip()
+            except (TypeError, ValueError):
+                continue
+    return out
+
+
+async def _generate_batch(items: List[Dict[str, Any]], sem: asyncio.Semaphore) -> None:
+    async with sem:
+        try:
+            messages = _parse_messages(await run_llm(_batch_prompt(items)))
+        except Exception:
+            logger.exception("LLM failure generating %d review messages", len(items))
+            messages = {}
+    for item in items:
+        message = messages.get(item["i"])
+        item["source"] = "llm" if message else "fallback"
+        item["message"] = message or _fallback_message(item["guest"], item.get("title"))
+
+
+def _delivery_results(result: Any) -> Optional[Dict[int, Dict[str, Any]]]:
+    """Per-message outcomes from the webhook reply, keyed by message `i`.
+
+    The `send-review-messages` workflow replies with `[{"i", "ok", "error"?}]`
+    (optionally wrapped as `{"results": [...]}`); None if it doesn't.
+    """
+    if isinstance(result, dict):
+        result = result.get("results")
+    if not isinstance(result, list):
+        return None
+    out: Dict[int, Dict[str, Any]] = {}
+    for entry in result:
+        try:
+            out[int(entry["i"])] = entry
+        except (KeyError, TypeError, ValueError):
+            continue
+    return out
+
+
+async def _deliver_batch(items: List[Dict[str, Any]], sem: asyncio.Semaphore) -> None:
+    payload = {"messages": [{"i": it["i"], "listing_id": it["listing_id"], "guest": it["guest"], "message": it["message"]} for it in items]}
+    async with sem:
+        try:
+            res = await send_webhook("send-review-messages", payload)
+        except Exception as e:
+            logger.exception("Failed to send %d review messages via n8n", len(items))
+            res = {"ok": False, "error": str(e)}
+    if not res.get("ok"):
+        # The whole batch was rejected: no guest's message went out.
+        error = res.get("error") or f"status {res.get('status_code')}"
+        for item in items:
+            item.update(ok=False, status="failed", error=error)
+        return
+    outcomes = _delivery_results(res.get("result"))
+    for item in items:
+        if outcomes is None:
+            # Accepted as a batch; the workflow didn't report per message.
+            item.update(ok=True, status="accepted")
+            continue
+        outcome = outcomes.get(item["i"])
+        if outcome is None:
+            item.update(ok=False, status="failed", error="no delivery result")
+        elif outcome.get("ok"):
+            item.update(ok=True, status="sent")
+        else:
+            item.update(ok=False, status="failed", error=str(outcome.get("error") or "delivery failed"))
+
+
+@traced("review_agent.send_review_requests")
+async def send_review_requests(requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Generate and send review requests for many guests at once.
+
+    `requests` are `{"listing_id": ..., "guest": {...}}`. Messages are
+    generated `GENERATION_BATCH_SIZE` guests per LLM call (falling back to a
+    templated message for any guest the model skips) and delivered in
+    grouped `send-review-messages` webhooks of up to `DELIVERY_BATCH_SIZE`.
+    Returns per-guest results in input order, each with its own delivery
+    `status`: `sent` or `failed` as reported by the workflow for that
+    message, `failed` for every guest of a rejected batch, or `accepted`
+    when the workflow acknowledged the batch without per-message results.
+    """
+    table = await get_listing_table()
+    items = []
+    for i, req in enumerate(requests):
+        row = table.index_of(req["listing_id"])
+        items.append({"i": i, "listing_id": req["listing_id"], "guest": req.get("guest") or {}, "title": table.titles[row] if row >= 0 else None})
+
+    gen_sem = asyncio.Semaphore(GENERATION_CONCURRENCY)
+    await asyncio.gather(*[
+        _generate_batch(items[k:k + GENERATION_BATCH_SIZE], gen_sem) for k in range(0, len(items), GENERATION_BATCH_SIZE)
+    ])
+    send_sem = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+    await asyncio.gather(*[
+        _deliver_batch(items[k:k + DELIVERY_BATCH_SIZE], send_sem) for k in range(0, len(items), DELIVERY_BATCH_SIZE)
+    ])
+
+    results = [
+        {"index": it["i"], **{k: it[k] for k in ("listing_id", "guest", "ok", "status", "source", "message", "error") if k in it}}
+        for it in items
+    ]
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("sent", "accepted", "failed")}
+    return {"requested": len(results), **counts, "results": results}
@@ -1,5 +1,8 @@
 import os, httpx # type: ignore
+import struct
+from typing import Any, AsyncIterator, Dict, Optional
 from app.config import settings
+from app.utils.http import get_http_client
 async def call_text_model(text: str) -> str:
     # Example: call Google/any LLM proxy or OpenAI (replace with real API)
     api_key = settings.GOOGLE_API_KEY
@@ -7,16 +10,47 @@ async def call_text_model(text: str) -> str:
         # fallback mock
         return f"MOCK_REPLY: {text}"
     # sample httpx call template (real implementation depends on provider)
-    async with httpx.AsyncClient() as client:
-        resp = await client.post("https://api.openai.com/v1/chat/completions", json={
-            "model": "gpt-4o-mini", "messages":[{"role":"user","content":text}]
-        }, headers={"Authorization": f"Bearer {api_key}"})
-        data = resp.json()
-        return data["choices"][0]["message"]["content"]
-
-async def call_text_to_speech(text: str) -> str:
-    # ElevenLabs TTS example (return URL or binary) - placeholder
+    resp = await get_http_client().post("https://api.openai.com/v1/chat/completions", json={
+        "model": "gpt-4o-mini", "messages":[{"role":"user","content":text}]
+    }, headers={"Authorization": f"Bearer {api_key}"})
+    data = resp.json()
+    return data["choices"][0]["message"]["content"]
+
+
+ELEVENLABS_STREAM_URL = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+TTS_CHUNK_SIZE = 16 * 1024
+
+
+def tts_media_type() -> str:
+    """Content type produced by `stream_text_to_speech` with the current config."""
+    return "audio/mpeg" if settings.ELEVENLABS_API_KEY else "audio/wav"
+
+
+async def _mock_audio(text: str) -> AsyncIterator[bytes]:
+    # Silent 8 kHz mono WAV, ~60 ms per character, so clients get real audio.
+    samples = 8000 * 60 * max(len(text), 1) // 1000
+    yield b"RIFF" + struct.pack("<I", 36 + samples) + b"WAVEfmt " + struct.pack("<IHHIIHH", 16, 1, 1, 8000, 8000, 1, 8) + b"data" + struct.pack("<I", samples)
+    remaining = samples
+    while remaining:
+        n = min(remaining, TTS_CHUNK_SIZE)
+        yield b"\x80" * n
+        remaining -= n
+
+
+async def stream_text_to_speech(text: str, voice_id: Optional[str] = None, model_id: Optional[str] = None,
+                                voice_settings: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+    """Stream synthesized audio for `text` from ElevenLabs (mock WAV without an API key)."""
     if not settings.ELEVENLABS_API_KEY:
-        return "https://example.com/mock_audio.mp3"
-    # Implement real ElevenLabs call here
-    return "https://example.com/generated_audio.mp3"
\ No newline at end of file
+        async for chunk in _mock_audio(text):
+            yield chunk
+        return
+    body: Dict[str, Any] = {"text": text, "model_id": model_id or settings.ELEVENLABS_MODEL_ID}
+    if voice_settings:
+        body["voice_settings"] = voice_settings
+    url = ELEVENLABS_STREAM_URL.format(voice_id=voice_id or settings.ELEVENLABS_VOICE_ID)
+    headers = {"xi-api-key": settings.ELEVENLABS_API_KEY, "Accept": "audio/mpeg"}
+    async with get_http_client().stream("POST", url, json=body, headers=headers, timeout=httpx.Timeout(60.0, connect=10.0)) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(TTS_CHUNK_SIZE):
+            yield chunk
+
@@ -0,0 +1,141 @@
+"""Bounded in-memory log of listing mutations.
+
+Every change gets a sequence number taken from the listing store's shared
+version counter, so sequence numbers are monotonic and agree across
+uvicorn workers. Each worker keeps the most recent `CHANGE_FEED_SIZE`
+entries; a consumer asking for changes older than that (or from before
+this worker's history starts) is told to resync from a full listing read.
+
+Entries look like:
+
+    {"seq": 42, "op": "updated", "id": "...", "ts": 1700000000.0, "listing": {...}}
+
+`listing` is `None` for deletions. In-process consumers (search/geo
+indexes, sync) can `subscribe` to receive each published batch; entries are
+shared between consumers, so treat them as read-only. Consumers that persist
+changes subscribe with `local_only=True` so each write is recorded once, by
+the worker that made it, rather than again by every worker that reloads it.
+
+When this worker's history restarts without the changes in between (first
+load, a truncated change log, a reload after a failed write), subscribers
+registered with `on_reset` are told, so derived state built from the
+listing table can be dropped and rebuilt from the reloaded one.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Change = Dict[str, Any]
+
+
+class ChangeFeed:
+    def __init__(self, maxlen: int = 10000):
+        self._log: Deque[Change] = deque(maxlen=maxlen)
+        # Highest sequence number this worker knows about, and the sequence
+        # before which history is unavailable here.
+        self.last_seq = 0
+        self._floor = 0
+        self._event = asyncio.Event()
+        self._subscribers: List[Tuple[Callable[[List[Change]], None], bool]] = []
+        self._reset_callbacks: List[Callable[[], None]] = []
+
+    def subscribe(self, callback: Callable[[List[Change]], None], local_only: bool = False,
+                  on_reset: Optional[Callable[[], None]] = None) -> None:
+        """Call `callback(changes)` synchronously after every published batch.
+
+        With `local_only`, only batches written by this worker are delivered.
+        `on_reset()` is called when history restarts and changes may have
+        been missed (see `reset`).
+        """
+        self._subscribers.append((callback, local_only))
+        if on_reset is not None:
+            self._reset_callbacks.append(on_reset)
+
+    def reset(self, seq: int) -> None:
+        """Start (or restart) history at `seq`, e.g. after a full reload.
+
+        Changes before `seq` that weren't published are lost, so `on_reset`
+        subscribers are told to resync.
+        """
+        self._log.clear()
+        self.last_seq = self._floor = seq
+        for callback in self._reset_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Change feed reset handler %r failed", callback)
+        self._notify()
+
+    def publish(self, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]], last_seq: int, local: bool = True,
+                seqs: Optional[List[int]] = None) -> List[Change]:
+        """Record `changes` as `(op, id, listing)`, numbered up to `last_seq`.
+
+        `local` is False for changes another worker wrote, seen on reload;
+        those carry the writer's numbers in `seqs`.
+        """
+        if not changes:
+            self.last_seq = max(self.last_seq, last_seq)
+            return []
+        ts = time.time()
+        first = last_seq - len(changes) + 1
+        if self._log and first <= self._log[-1]["seq"]:
+            # Defensive: never let sequence numbers go backwards.
+            first = self._log[-1]["seq"] + 1
+        entries = [
+            {"seq": seqs[k] if seqs is not None else max(first + k, 0), "op": op, "id": listing_id, "ts": ts, "listing": listing}
+            for k, (op, listing_id, listing) in enumerate(changes)
+        ]
+        overflow = len(self._log) + len(entries) > (self._log.maxlen or 0)
+        self._log.extend(entries)
+        if overflow:
+            # Older entries fell off the front: history now starts later.
+            self._floor = self._log[0]["seq"] - 1
+        self.last_seq = max(self.last_seq, last_seq, entries[-1]["seq"])
+        for callback, local_only in self._subscribers:
+            if local_only and not local:
+                continue
+            try:
+                callback(entries)
+            except Exception:
+                logger.exception("Change feed subscriber %r failed", callback)
+        self._notify()
+        return entries
+
+    def since(self, seq: int, limit: int = 1000) -> Dict[str, Any]:
+        """Changes after `seq`, or a resync signal if they are no longer held."""
+        if seq < self._floor or seq > self.last_seq:
+            return {
+                "resync_required": True,
+                "last_seq": self.last_seq,
+                "oldest_seq": self._floor + 1,
+                "changes": [],
+            }
+        changes = [c for c in self._log if c["seq"] > seq] if seq < self.last_seq else []
+        return {
+            "resync_required": False,
+            "last_seq": self.last_seq,
+            "changes": changes[:limit],
+            "has_more": len(changes) > limit,
+        }
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the next publish; True if one happened."""
+        event = self._event
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _notify(self) -> None:
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+
+feed = ChangeFeed(maxlen=settings.CHANGE_FEED_SIZE)
@@ -0,0 +1,524 @@
+"""Spatial comp-set index over our listings and competitor observations.
+
+Points live in a uniform latitude/longitude grid (geohash-style cells,
+starting at `CELL_DEG` degrees, ~5.5 km north-south). The grid adapts to
+density: when occupied cells average more than `MAX_CELL_POINTS` points,
+cells are halved (down to `MIN_CELL_DEG`) and the points re-bucketed.
+Radius queries scan only the cells overlapping the circle; k-nearest
+queries expand rings of cells outwards until the distance to the edge of
+the scanned block exceeds the k-th best distance. Distances are
+haversine, in km.
+
+Coordinates come from `metadata.lat`/`metadata.lng` when a listing has
+them, otherwise from a local geocode cache (`data/geocode_cache.json`) keyed
+by normalized address. Cache misses are resolved through a
+Nominatim-compatible `GEOCODE_URL` when one is configured; without it,
+listings that have neither coordinates nor a cached address are simply
+not indexed.
+
+Competitor observations (`platform`, `external_id`, `price`, `beds`,
+coordinates or address) are recorded via `record_competitor_observations`
+and persisted to `data/competitor_observations.json`. Both JSON files are
+shared by all workers: saves re-read and merge them under a `FileLock`,
+picking up entries other workers recorded. Our own listings are kept
+current through the listing change feed; if the feed resets, the index is
+rebuilt on next use.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import os
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.change_feed import feed as change_feed
+from app.services.listing_service import DATA_FILE, get_listing_table
+from app.utils.http import get_http_client
+from app.utils.interprocess import FileLock
+from app.utils.serialization import json_dumps, json_loads
+from app.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+CELL_DEG = 0.05
+MIN_CELL_DEG = 0.0025  # ~280 m
+MAX_CELL_POINTS = 16
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+DEFAULT_K = 10
+DEFAULT_RADIUS_KM = 5.0
+# Comparable listings have a bed count within this many of the subject's.
+BEDS_TOLERANCE = 1
+
+GEOCODE_CACHE_FILE = os.path.join(os.path.dirname(DATA_FILE), "geocode_cache.json")
+OBSERVATIONS_FILE = os.path.join(os.path.dirname(DATA_FILE), "competitor_observations.json")
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def normalize_address(address: str) -> str:
+    return " ".join(address.lower().replace(",", " ").split())
+
+
+class SpatialIndex:
+    def __init__(self, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Cell, Set[str]] = {}
+        # key -> (lat, lng, cell); attributes are kept separately so callers
+        # can filter without touching coordinates.
+        self._points: Dict[str, Tuple[float, float, Cell]] = {}
+        self.attrs: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._points
+
+    def location(self, key: str) -> Optional[Tuple[float, float]]:
+        point = self._points.get(key)
+        return None if point is None else (point[0], point[1])
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _cell_km(self, lat: float) -> Tuple[float, float]:
+        """Cell height and width in km at latitude `lat`."""
+        height = self.cell_deg * KM_PER_DEG
+        return height, height * max(math.cos(math.radians(lat)), 0.01)
+
+    def upsert(self, key: str, lat: float, lng: float, attrs: Dict[str, Any]) -> None:
+        cell = self._cell(lat, lng)
+        old = self._points.get(key)
+        if old is not None and old[2] != cell:
+            self._discard(key, old[2])
+        self._points[key] = (lat, lng, cell)
+        self._cells.setdefault(cell, set()).add(key)
+        self.attrs[key] = attrs
+        if len(self._points) > MAX_CELL_POINTS * len(self._cells) and self.cell_deg / 2 >= MIN_CELL_DEG:
+            self._regrid(self.cell_deg / 2)
+
+    def _regrid(self, cell_deg: float) -> None:
+        """Re-bucket every point into cells of `cell_deg` degrees."""
+        self.cell_deg = cell_deg
+        self._cells = {}
+        for key, (lat, lng, _) in self._points.items():
+            cell = self._cell(lat, lng)
+            self._points[key] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key: str) -> bool:
+        old = self._points.pop(key, None)
+        if old is None:
+            return False
+        self._discard(key, old[2])
+        self.attrs.pop(key, None)
+        return True
+
+    def _discard(self, key: str, cell: Cell) -> None:
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def radius(self, lat: float, lng: float, radius_km: float, predicate: Optional[Callable[[str], bool]] = None) -> List[Tuple[float, str]]:
+        """`(distance_km, key)` for points within `radius_km`, nearest first."""
+        ci, cj = self._cell(lat, lng)
+        height, width = self._cell_km(lat)
+        di, dj = math.ceil(radius_km / height), math.ceil(radius_km / width)
+        max_dlat = radius_km / KM_PER_DEG
+        cells, points = self._cells, self._points
+        out = []
+        for i in range(ci - di, ci + di + 1):
+            for j in range(cj - dj, cj + dj + 1):
+                for key in cells.get((i, j), ()):
+                    plat, plng, _ = points[key]
+                    # The latitude gap alone is a lower bound on the distance.
+                    if abs(plat - lat) > max_dlat or (predicate is not None and not predicate(key)):
+                        continue
+                    d = haversine_km(lat, lng, plat, plng)
+                    if d <= radius_km:
+                        out.append((d, key))
+        out.sort()
+        return out
+
+    def _block_edge_km(self, lat: float, lng: float, ci: int, cj: int, r: int) -> float:
+        """Distance from (lat, lng) to the nearest edge of the block of rings 0..r.
+
+        Every point outside the block is at least this far away: the nearest
+        point on a parallel is due north/south, and a meridian `dl` away is
+        `asin(cos(lat) * sin(dl))` of arc away.
+        """
+        c = self.cell_deg
+        dlat = min(lat - (ci - r) * c, (ci + r + 1) * c - lat)
+        dlng = min(lng - (cj - r) * c, (cj + r + 1) * c - lng)
+        ns = dlat * KM_PER_DEG
+        if dlng >= 90.0:
+            return ns
+        ew = EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(math.radians(lat)) * math.sin(math.radians(dlng))))
+        return min(ns, ew)
+
+    def nearest(self, lat: float, lng: float, k: int, max_km: float, predicate: Optional[Callable[[str], bool]] = None) -> List[Tuple[float, str]]:
+        """Up to `k` nearest points within `max_km`, nearest first."""
+        if k <= 0 or not self._points:
+            return []
+        ci, cj = self._cell(lat, lng)
+        height, width = self._cell_km(lat)
+        max_ring = math.ceil(max_km / min(height, width)) + 1
+        cells, points = self._cells, self._points
+        best: List[Tuple[float, str]] = []  # max-heap via negated distance
+        worst = max_km
+        ring = 0
+        while ring <= max_ring:
+            for cell in self._ring(ci, cj, ring):
+                for key in cells.get(cell, ()):
+                    plat, plng, _ = points[key]
+                    if abs(plat - lat) * KM_PER_DEG > worst or (predicate is not None and not predicate(key)):
+                        continue
+                    d = haversine_km(lat, lng, plat, plng)
+                    if d > worst:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, key))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, key))
+                    if len(best) >= k:
+                        worst = -best[0][0]
+            # Nothing outside the scanned block is closer than its edge.
+            if self._block_edge_km(lat, lng, ci, cj, ring) >= worst:
+                break
+            ring += 1
+        return sorted((-d, key) for d, key in best)
+
+    @staticmethod
+    def _ring(ci: int, cj: int, r: int):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+
+# --- module state -----------------------------------------------------------
+
+_index = SpatialIndex()
+_geocode_cache: Dict[str, Tuple[float, float]] = {}
+_observations: Dict[str, Dict[str, Any]] = {}
+_pending_geocode: Set[str] = set()
+_loaded = False
+_load_lock = asyncio.Lock()
+_save_lock = asyncio.Lock()
+# Feed changes that arrive while the index is being built.
+_backlog: Optional[List[Dict[str, Any]]] = None
+# Bumped on every feed reset; a build that spans one is discarded.
+_resets = 0
+
+
+def _read_json_sync(path: str) -> Any:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return json_loads(f.read())
+
+
+def _write_json_sync(path: str, payload: Any) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(json_dumps(payload))
+    os.replace(tmp, path)
+
+
+def _merge_json_sync(path: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+    merged = _read_json_sync(path) or {}
+    merged.update(updates)
+    _write_json_sync(path, merged)
+    return merged
+
+
+async def _merge_json(path: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-read the JSON object at `path`, apply `updates` and write it back.
+
+    Runs under the file's `FileLock` so concurrent saves from other workers
+    are merged rather than overwritten; returns the merged contents.
+    """
+    async with _save_lock:
+        lock = FileLock(path + ".lock")
+        await lock.acquire()
+        try:
+            return await asyncio.to_thread(_merge_json_sync, path, updates)
+        finally:
+            lock.release()
+
+
+def _coords(meta: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    lat = meta.get("lat", meta.get("latitude"))
+    lng = meta.get("lng", meta.get("longitude"))
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+def _beds(meta: Dict[str, Any]) -> Optional[int]:
+    beds = meta.get("beds", meta.get("bedrooms"))
+    try:
+        return int(beds) if beds is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _locate(address: Optional[str], meta: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    point = _coords(meta)
+    if address:
+        key = normalize_address(address)
+        if point is not None:
+            # Listings with known coordinates seed the cache for free.
+            _geocode_cache.setdefault(key, point)
+        else:
+            point = _geocode_cache.get(key)
+            if point is None:
+                _pending_geocode.add(address)
+    return point
+
+
+def _index_listing(listing_id: str, address: Optional[str], price: Optional[float], meta: Dict[str, Any]) -> None:
+    key = f"listing:{listing_id}"
+    point = _locate(address, meta)
+    if point is None:
+        _index.remove(key)
+        return
+    _index.upsert(key, point[0], point[1], {"source": "listing", "id": listing_id, "price": price, "beds": _beds(meta)})
+
+
+def _index_observation(key: str, obs: Dict[str, Any]) -> bool:
+    point = _locate(obs.get("address"), obs)
+    if point is None:
+        return False
+    _index.upsert(key, point[0], point[1], {
+        "source": "competitor",
+        "id": obs.get("external_id"),
+        "platform": obs.get("platform"),
+        "price": obs.get("price"),
+        "beds": _beds(obs),
+    })
+    return True
+
+
+async def ensure_index() -> SpatialIndex:
+    """Build the index on first use; later changes arrive via the change feed."""
+    global _index, _loaded, _backlog
+    if _loaded:
+        return _index
+    async with _load_lock:
+        while not _loaded:
+            cache = await asyncio.to_thread(_read_json_sync, GEOCODE_CACHE_FILE) or {}
+            observations = await asyncio.to_thread(_read_json_sync, OBSERVATIONS_FILE) or {}
+            for address, point in cache.items():
+                _geocode_cache[address] = (float(point[0]), float(point[1]))
+            table = await get_listing_table()
+            resets, snapshot, _backlog = _resets, table.copy(), []
+            try:
+                # Nothing else touches the index until it is loaded, so it can be
+                # built in a worker thread; feed changes meanwhile are queued.
+                await asyncio.to_thread(_build_sync, snapshot, observations)
+                if resets == _resets:
+                    _apply(_backlog)
+                    _loaded = True
+                else:
+                    _index = SpatialIndex()  # the table was reloaded mid-build
+            finally:
+                _backlog = None
+    _schedule_geocoding()
+    return _index
+
+
+def _build_sync(table, observations: Dict[str, Dict[str, Any]]) -> None:
+    for i, listing_id in enumerate(table.ids):
+        price = table.prices[i]
+        _index_listing(listing_id, table.addresses[i], None if math.isnan(price) else price, table.metadata(i))
+    for key, obs in observations.items():
+        _observations[key] = obs
+        _index_observation(key, obs)
+
+
+def _apply(changes: List[Dict[str, Any]]) -> None:
+    for change in changes:
+        listing = change.get("listing")
+        if change["op"] == "deleted" or listing is None:
+            _index.remove(f"listing:{change['id']}")
+        else:
+            _index_listing(change["id"], listing.get("address"), listing.get("price"), listing.get("metadata") or {})
+
+
+def _on_listing_changes(changes: List[Dict[str, Any]]) -> None:
+    if not _loaded:
+        if _backlog is not None:
+            _backlog.extend(changes)
+        return
+    _apply(changes)
+    _schedule_geocoding()
+
+
+def _on_feed_reset() -> None:
+    global _index, _loaded, _resets
+    _resets += 1
+    if _backlog is None:
+        # Not mid-build (that build is discarded instead): drop the index.
+        _index, _loaded = SpatialIndex(), False
+
+
+change_feed.subscribe(_on_listing_changes, on_reset=_on_feed_reset)
+
+
+# --- geocoding ----------------------------------------------------------------
+
+_geocode_task: Optional[asyncio.Task] = None
+
+
+async def geocode(address: str, timeout: float = 10.0) -> Optional[Tuple[float, float]]:
+    """Coordinates for `address` from the local cache, else `GEOCODE_URL`."""
+    key = normalize_address(address)
+    if key in _geocode_cache:
+        return _geocode_cache[key]
+    if not settings.GEOCODE_URL:
+        return None
+    try:
+        resp = await get_http_client().get(settings.GEOCODE_URL, params={"q": address, "format": "json", "limit": 1}, timeout=timeout)
+        resp.raise_for_status()
+        results = resp.json()
+    except Exception:
+        logger.exception("Geocoding failed for %r", address)
+        return None
+    if not results:
+        return None
+    point = (float(results[0]["lat"]), float(results[0]["lon"]))
+    _geocode_cache[key] = point
+    return point
+
+
+def _schedule_geocoding() -> None:
+    global _geocode_task
+    if not _pending_geocode or not settings.GEOCODE_URL:
+        return
+    if _geocode_task is None or _geocode_task.done():
+        _geocode_task = asyncio.get_running_loop().create_task(_geocode_pending())
+
+
+async def _geocode_pending() -> None:
+    resolved = 0
+    while _pending_geocode:
+        if await geocode(_pending_geocode.pop()) is not None:
+            resolved += 1
+    if resolved:
+        await _save_geocode_cache()
+        # Re-index anything that was waiting on an address.
+        table = await get_listing_table()
+        for i, listing_id in enumerate(table.ids):
+            if f"listing:{listing_id}" not in _index:
+                price = table.prices[i]
+                _index_listing(listing_id, table.addresses[i], None if math.isnan(price) else price, table.metadata(i))
+        for key, obs in _observations.items():
+            if key not in _index:
+                _index_observation(key, obs)
+        # Addresses that failed again stay unindexed until they change.
+        _pending_geocode.clear()
+
+
+async def _save_geocode_cache() -> None:
+    payload = {address: list(point) for address, point in _geocode_cache.items()}
+    merged = await _merge_json(GEOCODE_CACHE_FILE, payload)
+    for address, point in merged.items():
+        _geocode_cache.setdefault(address, (float(point[0]), float(point[1])))
+
+
+# --- public API ---------------------------------------------------------------
+
+@traced("comp_index.record_competitor_observations")
+async def record_competitor_observations(observations: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Add or replace competitor observations keyed by `platform:external_id`."""
+    await ensure_index()
+    indexed = 0
+    recorded: Dict[str, Dict[str, Any]] = {}
+    for obs in observations:
+        key = f"{obs.get('platform', 'unknown')}:{obs.get('external_id')}"
+        if _coords(obs) is None and obs.get("address"):
+            await geocode(obs["address"])
+        _observations[key] = recorded[key] = obs
+        if _index_observation(key, obs):
+            indexed += 1
+    merged = await _merge_json(OBSERVATIONS_FILE, recorded)
+    # Pick up observations other workers recorded since we loaded.
+    for key, obs in merged.items():
+        if key not in recorded and _observations.get(key) != obs:
+            _observations[key] = obs
+            _index_observation(key, obs)
+    await _save_geocode_cache()
+    return {"recorded": len(observations), "indexed": indexed}
+
+
+@traced("comp_index.get_competitor_prices")
+async def get_competitor_prices(
+    address: Optional[str] = None,
+    listing_id: Optional[str] = None,
+    k: int = DEFAULT_K,
+    radius_km: float = DEFAULT_RADIUS_KM,
+    beds: Optional[int] = None,
+    include_own: bool = True,
+) -> Dict[str, Any]:
+    """The `k` nearest comparables within `radius_km` of a listing or address.
+
+    `beds` (defaulting to the subject listing's) restricts results to
+    listings within `BEDS_TOLERANCE` beds. `include_own=False` keeps only
+    competitor observations, excluding our own portfolio.
+    """
+    index = await ensure_index()
+    center = None
+    exclude = None
+    if listing_id is not None:
+        exclude = f"listing:{listing_id}"
+        center = index.location(exclude)
+        if center is not None:
+            if beds is None:
+                beds = index.attrs[exclude].get("beds")
+    if center is None and address:
+        center = await geocode(address)
+    result: Dict[str, Any] = {"address": address, "listing_id": listing_id, "competitors": []}
+    if center is None:
+        result["reason"] = "location_unknown"
+        return result
+
+    attrs = index.attrs
+
+    def comparable(key: str) -> bool:
+        if key == exclude:
+            return False
+        a = attrs[key]
+        if not include_own and a["source"] == "listing":
+            return False
+        if a.get("price") is None:
+            return False
+        return beds is None or a.get("beds") is None or abs(a["beds"] - beds) <= BEDS_TOLERANCE
+
+    result["center"] = {"lat": center[0], "lng": center[1]}
+    result["competitors"] = [
+        {**attrs[key], "distance_km": round(d, 3)}
+        for d, key in index.nearest(center[0], center[1], k, radius_km, comparable)
+    ]
+    return result
@@ -1,11 +1,14 @@
 import os
+import time
 import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 
 import httpx
 
 from app.config import settings
+from app.utils.metrics import INTEGRATION_LATENCY, outcome
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -51,7 +54,56 @@ _ADAPTERS = {
     "vrbo": _post_to_vrbo,
 }
 
+# Listing fields mirrored on the platforms; everything else is internal.
+SYNC_FIELDS = ("title", "description", "address", "price", "available", "photos", "amenities")
 
+
+async def _patch_airbnb(remote_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Mock partial update for Airbnb: only `fields` are sent."""
+    if not os.getenv("AIRBNB_API_KEY"):
+        return {"platform": "airbnb", "status": "skipped", "reason": "no_api_key"}
+    await asyncio.sleep(0.05)
+    return {"platform": "airbnb", "status": "updated", "remote_id": remote_id, "fields": sorted(fields)}
+
+
+async def _patch_booking(remote_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Mock partial update for Booking.com."""
+    if not os.getenv("BOOKING_API_KEY"):
+        return {"platform": "booking", "status": "skipped", "reason": "no_api_key"}
+    await asyncio.sleep(0.05)
+    return {"platform": "booking", "status": "updated", "remote_id": remote_id, "fields": sorted(fields)}
+
+
+async def _patch_vrbo(remote_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Mock partial update for Vrbo."""
+    if not os.getenv("VRBO_API_KEY"):
+        return {"platform": "vrbo", "status": "skipped", "reason": "no_api_key"}
+    await asyncio.sleep(0.05)
+    return {"platform": "vrbo", "status": "updated", "remote_id": remote_id, "fields": sorted(fields)}
+
+
+_PATCH_ADAPTERS = {
+    "airbnb": _patch_airbnb,
+    "booking": _patch_booking,
+    "vrbo": _patch_vrbo,
+}
+
+
+async def _wrap_call(platform: str, operation: str, call: Awaitable[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(call, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.exception("Timeout while contacting platform")
+        result = {"platform": platform, "status": "error", "reason": "timeout"}
+    except Exception as e:
+        logger.exception("Error while contacting platform: %s", e)
+        result = {"platform": platform, "status": "error", "reason": str(e)}
+    INTEGRATION_LATENCY.observe(time.perf_counter() - started, platform, operation, outcome(result.get("status") != "error"))
+    return result
+
+
+@traced("integrations_service.publish_listing_cross_platform")
 async def publish_listing_cross_platform(listing: Dict[str, Any], platforms: Optional[List[str]] = None, timeout: int = 30) -> List[Dict[str, Any]]:
     """Publish a `listing` to multiple third-party platforms concurrently.
 
@@ -63,16 +115,6 @@ async def publish_listing_cross_platform(listing: Dict[str, Any], platforms: Opt
     """
     platforms = platforms or list(_ADAPTERS.keys())
 
-    async def _wrap_call(fn, payload):
-        try:
-            return await asyncio.wait_for(fn(payload), timeout=timeout)
-        except asyncio.TimeoutError:
-            logger.exception("Timeout while contacting platform")
-            return {"platform": getattr(fn, "__name__", "unknown"), "status": "error", "reason": "timeout"}
-        except Exception as e:
-            logger.exception("Error while contacting platform: %s", e)
-            return {"platform": getattr(fn, "__name__", "unknown"), "status": "error", "reason": str(e)}
-
     tasks = []
     for p in platforms:
         adapter = _ADAPTERS.get(p)
@@ -80,12 +122,30 @@ async def publish_listing_cross_platform(listing: Dict[str, Any], platforms: Opt
             results = {"platform": p, "status": "unknown_platform"}
             tasks.append(asyncio.sleep(0, results))
         else:
-            tasks.append(_wrap_call(adapter, listing))
+            tasks.append(_wrap_call(p, "publish", adapter(listing), timeout))
 
     results = await asyncio.gather(*tasks)
     return results
 
 
+@traced("integrations_service.update_listing_cross_platform")
+async def update_listing_cross_platform(patches: Dict[str, Tuple[str, Dict[str, Any]]], timeout: int = 30) -> List[Dict[str, Any]]:
+    """Send partial updates concurrently.
+
+    - `patches`: mapping platform -> (remote_id, changed fields). Fields not
+      in the mapping are left untouched on the platform.
+    """
+    tasks = []
+    for p, (remote_id, fields) in patches.items():
+        adapter = _PATCH_ADAPTERS.get(p)
+        if not adapter:
+            tasks.append(asyncio.sleep(0, {"platform": p, "status": "unknown_platform"}))
+        else:
+            tasks.append(_wrap_call(p, "update", adapter(remote_id, fields), timeout))
+    return await asyncio.gather(*tasks)
+
+
+@traced("integrations_service.remove_listing_cross_platform")
 async def remove_listing_cross_platform(remote_ids: Dict[str, str], platforms: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """Remove listings on third-party platforms.
 
@@ -95,7 +155,8 @@ async def remove_listing_cross_platform(remote_ids: Dict[str, str], platforms: O
     platforms = platforms or list(remote_ids.keys())
 
     async def _mock_delete(platform: str, remote_id: str):
-        await asyncio.sleep(0.05)
+        with INTEGRATION_LATENCY.time(platform, "remove", "success"):
+            await asyncio.sleep(0.05)
         return {"platform": platform, "status": "deleted", "remote_id": remote_id}
 
     tasks = []
@@ -109,11 +170,13 @@ async def remove_listing_cross_platform(remote_ids: Dict[str, str], platforms: O
     return await asyncio.gather(*tasks)
 
 
+@traced("integrations_service.fetch_remote_availability")
 async def fetch_remote_availability(platform: str, remote_id: str) -> Dict[str, Any]:
     """Fetch availability/pricing from a remote platform for a given remote_id.
 
     This is a convenience function for cross-checking competitor data.
     """
     # Placeholder implementation — real code will call platform APIs
-    await asyncio.sleep(0.05)
+    with INTEGRATION_LATENCY.time(platform, "fetch_availability", "success"):
+        await asyncio.sleep(0.05)
     return {"platform": platform, "remote_id": remote_id, "available": True, "price": 100}
@@ -1,69 +1,316 @@
 import os
-import json
+import math
 import uuid
-import threading
 import asyncio
-from typing import Any, Dict, List, Optional
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple, Union
 import logging
 
+from app.config import settings
+from app.models.listing_table import ListingTable
+from app.services.change_feed import Change, feed as change_feed
 from app.services.n8n_service import send_webhook
+from app.utils.interprocess import FileLock, VersionCounter
+from app.utils.metrics import STORAGE_LATENCY
+from app.utils.serialization import CODECS, JSONCodec, get_codec, loads_any
+from app.utils.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
-# File-backed listings storage (no DB). Uses atomic replace and a module-level lock
+# File-backed listings storage (no DB). Uses atomic replace plus in-process and
+# cross-process locks (see `_locked`).
+# `DATA_FILE` is the base path; the on-disk extension follows the configured
+# codec (`listings.json` or `listings.msgpack`, see LISTING_STORE_FORMAT).
 DATA_FILE = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "..", "data", "listings.json")
 )
+STORE_FORMAT = settings.LISTING_STORE_FORMAT
+
+# Writers take two locks: an asyncio lock serializing coroutines in this
+# process (a threading lock held across awaits would deadlock the agents'
+# `gather` fan-out) and an OS file lock serializing uvicorn workers.
+_lock = asyncio.Lock()
+# Serializes format migrations, which run inside worker threads.
+_migrate_lock = threading.Lock()
+# Per-store (lock file, shared version counter), keyed by base path.
+_coordination: Dict[str, Tuple[FileLock, VersionCounter]] = {}
+
+
+def _store_coordination() -> Tuple[FileLock, VersionCounter]:
+    base = os.path.splitext(DATA_FILE)[0]
+    coord = _coordination.get(base)
+    if coord is None:
+        coord = _coordination[base] = (FileLock(base + ".lock"), VersionCounter(base + ".version"))
+    return coord
+
+
+@asynccontextmanager
+async def _locked():
+    file_lock, _ = _store_coordination()
+    with span("listing_service.lock_wait"):
+        await _lock.acquire()
+        try:
+            await file_lock.acquire()
+        except BaseException:
+            _lock.release()
+            raise
+    try:
+        yield
+    finally:
+        file_lock.release()
+        _lock.release()
+
+
+def _store_path(fmt: str) -> str:
+    return os.path.splitext(DATA_FILE)[0] + CODECS[fmt].extension
+
+
+def _decode_file(path: str) -> List[Dict[str, Any]]:
+    with STORAGE_LATENCY.time("read"), span("listing_service.read_file"):
+        with open(path, "rb") as f:
+            raw = f.read()
+        with span("listing_service.decode", bytes=len(raw)):
+            try:
+                return loads_any(raw)
+            except Exception:
+                logger.exception("Failed to decode listing store %s", path)
+                return []
 
-_lock = threading.Lock()
+
+def _migrate_sync(legacy_path: str, target_path: str) -> List[Dict[str, Any]]:
+    """Rewrite a store found in another format into the configured one."""
+    with _migrate_lock:
+        if os.path.exists(target_path):
+            return _decode_file(target_path)
+        data = _decode_file(legacy_path)
+        _write_file_sync(data)
+        try:
+            os.replace(legacy_path, legacy_path + ".migrated")
+        except FileNotFoundError:
+            # another worker migrated the same store concurrently
+            pass
+        logger.info("Migrated listing store %s -> %s (%d listings)", legacy_path, target_path, len(data))
+        return data
 
 
 def _read_file_sync() -> List[Dict[str, Any]]:
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except Exception:
-            return []
+    path = _store_path(get_codec(STORE_FORMAT).name)
+    if os.path.exists(path):
+        return _decode_file(path)
+    for fmt in CODECS:
+        legacy = _store_path(fmt)
+        if legacy != path and os.path.exists(legacy):
+            return _migrate_sync(legacy, path)
+    return []
 
 
-def _write_file_sync(data: List[Dict[str, Any]]) -> None:
-    dirpath = os.path.dirname(DATA_FILE)
-    os.makedirs(dirpath, exist_ok=True)
-    tmp = DATA_FILE + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, DATA_FILE)
+def _write_file_sync(data: Union[List[Dict[str, Any]], ListingTable]) -> None:
+    """Replace the store with `data`, a list of listings or a `ListingTable`.
 
+    A table is encoded from its columns for the JSON store (see
+    `ListingTable.to_json`), without decoding any row.
+    """
+    codec = get_codec(STORE_FORMAT)
+    path = _store_path(codec.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with STORAGE_LATENCY.time("write"), span("listing_service.write_file", records=len(data)):
+        with span("listing_service.encode"):
+            if not isinstance(data, ListingTable):
+                raw = codec.dumps(data)
+            elif codec is JSONCodec:
+                raw = data.to_json()
+            else:
+                raw = codec.dumps(data.to_dicts())
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+
+
+# Resident, compact copy of the store, tagged with the (store path, version)
+# it was loaded at. Every write in any worker bumps the shared version
+# counter, so a worker reloads only after someone else has written, and
+# reads otherwise skip file I/O and parsing entirely.
+_table: Optional[ListingTable] = None
+_table_key: Optional[Tuple[str, int]] = None
+_reload_lock = asyncio.Lock()
+
+
+def _store_key() -> Tuple[str, int]:
+    _, counter = _store_coordination()
+    return (_store_path(get_codec(STORE_FORMAT).name), counter.read())
+
+
+def _change_log_path() -> str:
+    return os.path.splitext(DATA_FILE)[0] + ".changes"
+
+
+# Shared change log: one `<seq> <op> <id>` line per change, appended by the
+# writer under the store's FileLock, so every worker publishes other
+# workers' writes with the writer's sequence numbers and in write order.
+# When it grows past CHANGE_LOG_MAX_BYTES it is rewritten to the newest
+# CHANGE_FEED_SIZE lines behind a `# floor <seq>` header: readers that had
+# not yet seen `floor` must resync.
+CHANGE_LOG_MAX_BYTES = 64 * 4 * settings.CHANGE_FEED_SIZE
+# (inode, offset) of the change log up to which this worker has published.
+_log_pos: Optional[Tuple[int, int]] = None
+
+
+def _append_change_log_sync(first_seq: int, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]]) -> None:
+    global _log_pos
+    path = _change_log_path()
+    lines = "".join(f"{first_seq + k} {op} {listing_id}\n" for k, (op, listing_id, _) in enumerate(changes))
+    with open(path, "ab") as f:
+        f.write(lines.encode("utf-8"))
+        size = f.tell()
+        _log_pos = (os.fstat(f.fileno()).st_ino, size)
+    if size > CHANGE_LOG_MAX_BYTES:
+        with open(path, "rb") as f:
+            kept = [l for l in f.read().splitlines() if l and not l.startswith(b"#")][-settings.CHANGE_FEED_SIZE:]
+        floor = int(kept[0].split(b" ", 1)[0]) - 1
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"# floor %d\n" % floor + b"".join(l + b"\n" for l in kept))
+            size = f.tell()
+        os.replace(tmp, path)
+        _log_pos = (os.stat(path).st_ino, size)
+
+
+def _read_change_log_sync(since: int, upto: int) -> Optional[List[Tuple[int, str, str]]]:
+    """Logged changes with `since < seq <= upto`, or None if some are gone."""
+    global _log_pos
+    try:
+        f = open(_change_log_path(), "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        inode = os.fstat(f.fileno()).st_ino
+        same_file = _log_pos is not None and _log_pos[0] == inode
+        offset = _log_pos[1] if same_file else 0
+        f.seek(offset)
+        data = f.read()
+    out: List[Tuple[int, str, str]] = []
+    consumed = 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break  # partial line; the writer still holds the lock
+        text = line.decode("utf-8").rstrip("\n")
+        if text.startswith("# floor "):
+            if int(text[8:]) > since:
+                return None
+        elif text:
+            seq, op, listing_id = text.split(" ", 2)
+            if int(seq) > upto:
+                break
+            if int(seq) > since:
+                out.append((int(seq), op, listing_id))
+        consumed += len(line)
+    if not same_file and not out and upto > since:
+        # A rewritten log that no longer reaches back to `since`.
+        return None
+    _log_pos = (inode, offset + consumed)
+    return out
 
-async def _read_listings() -> List[Dict[str, Any]]:
-    return await asyncio.to_thread(_read_file_sync)
 
+def _load_table_sync(previous_key: Optional[Tuple[str, int]]) -> Tuple[ListingTable, Tuple[str, int], Optional[List[Tuple[int, str, str, Optional[Dict[str, Any]]]]]]:
+    """Load the store, plus the changes other workers made since `previous_key`.
 
-async def _write_listings(data: List[Dict[str, Any]]) -> None:
-    await asyncio.to_thread(_write_file_sync, data)
+    Returns `(table, key, changes)` with changes as `(seq, op, id, listing)`
+    read from the shared change log; `changes` is `None` when they can't
+    be recovered (first load, a different store, or truncated log).
+    """
+    # Read the version before the file: a write racing with the read then
+    # shows up as a version mismatch on the next access instead of being missed.
+    key = _store_key()
+    data = _read_file_sync()
+    with span("listing_service.build_table", records=len(data)):
+        table = ListingTable.from_dicts(data)
+    changes = None
+    if previous_key is not None and previous_key[0] == key[0]:
+        logged = _read_change_log_sync(previous_key[1], key[1])
+        if logged is not None:
+            changes = [(seq, op, listing_id, table.get(listing_id) if op != "deleted" else None) for seq, op, listing_id in logged]
+    else:
+        # Start publishing from the current end of the log.
+        global _log_pos
+        try:
+            st = os.stat(_change_log_path())
+            _log_pos = (st.st_ino, st.st_size)
+        except FileNotFoundError:
+            _log_pos = None
+    return table, key, changes
+
+
+def _write_table_sync(table: ListingTable, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]]) -> Tuple[str, int]:
+    _write_file_sync(table)
+    _, counter = _store_coordination()
+    # One sequence number per changed listing (see change_feed).
+    last = counter.bump(max(len(changes), 1))
+    if changes:
+        _append_change_log_sync(last - len(changes) + 1, changes)
+    return _store_key()
+
+
+async def _get_table(for_write: bool = False) -> ListingTable:
+    """Return the resident table, reloading it if another writer changed the store.
+
+    While a local write holds `_lock` the in-memory table is authoritative
+    (the file is mid-replace), so readers use it as-is. Writers pass
+    `for_write=True` to always revalidate, and wait for any reload a reader
+    started before they took the lock.
+    """
+    global _table, _table_key
+    if not for_write and _table is not None and (_lock.locked() or _store_key() == _table_key):
+        return _table
+    async with _reload_lock:
+        if _table is None or _store_key() != _table_key:
+            _table, _table_key, changes = await asyncio.to_thread(_load_table_sync, _table_key if _table is not None else None)
+            # Writes made by other workers reach this worker's change feed here.
+            if changes is None:
+                change_feed.reset(_table_key[1])
+            else:
+                change_feed.publish(
+                    [(op, listing_id, listing) for _, op, listing_id, listing in changes],
+                    _table_key[1],
+                    local=False,
+                    seqs=[seq for seq, _, _, _ in changes],
+                )
+    return _table
+
+
+async def _persist(table: ListingTable, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]]) -> None:
+    """Write `table`, bump the shared version and publish `changes` as `(op, id, listing)`.
+
+    Call with `_locked()` held.
+    """
+    global _table, _table_key
+    try:
+        _table_key = await asyncio.to_thread(_write_table_sync, table, changes)
+    except Exception:
+        # Memory and disk may now disagree; force a reload on next access.
+        _table, _table_key = None, None
+        raise
+    change_feed.publish(changes, _table_key[1])
 
 
-def _find_index(listings: List[Dict[str, Any]], listing_id: str) -> int:
-    for i, l in enumerate(listings):
-        if str(l.get("id")) == str(listing_id):
-            return i
-    return -1
+def _normalize_price(listing: Dict[str, Any]) -> None:
+    try:
+        listing["price"] = float(listing["price"])
+    except Exception:
+        listing["price"] = 0.0
 
 
+@traced("listing_service.create_listing")
 async def create_listing(payload: Dict[str, Any]) -> Dict[str, Any]:
-    with _lock:
-        listings = await _read_listings()
+    async with _locked():
+        table = await _get_table(for_write=True)
         new = {"id": str(uuid.uuid4()), "available": True, **payload}
         # Ensure price is numeric if present
         if "price" in new:
-            try:
-                new["price"] = float(new["price"])
-            except Exception:
-                new["price"] = 0.0
-        listings.append(new)
-        await _write_listings(listings)
+            _normalize_price(new)
+        table.append(new)
+        await _persist(table, [("created", new["id"], new)])
         # Fire-and-forget an n8n webhook for new listings. We schedule this
         # after the file write so the listing exists even if the webhook fails.
         async def _fire_webhook(l):
@@ -81,51 +328,62 @@ async def create_listing(payload: Dict[str, Any]) -> Dict[str, Any]:
         return new
 
 
+async def get_listing_table() -> ListingTable:
+    """The resident `ListingTable`, for bulk readers such as indexes.
+
+    Writers mutate it in place, so read it without awaiting in between (or
+    copy the columns you need) and never modify it.
+    """
+    return await _get_table()
+
+
+@traced("listing_service.get_listing")
 async def get_listing(listing_id: str) -> Optional[Dict[str, Any]]:
-    listings = await _read_listings()
-    idx = _find_index(listings, listing_id)
-    return listings[idx] if idx >= 0 else None
+    table = await _get_table()
+    return table.get(listing_id)
 
 
+@traced("listing_service.list_listings")
 async def list_listings(available_only: bool = False) -> List[Dict[str, Any]]:
-    listings = await _read_listings()
-    if available_only:
-        return [l for l in listings if l.get("available", True)]
-    return listings
+    table = await _get_table()
+    return table.to_dicts(available_only=available_only)
 
 
+@traced("listing_service.update_listing")
 async def update_listing(listing_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    with _lock:
-        listings = await _read_listings()
-        idx = _find_index(listings, listing_id)
+    async with _locked():
+        table = await _get_table(for_write=True)
+        idx = table.index_of(listing_id)
         if idx < 0:
             return None
-        listings[idx].update(updates)
+        listing = table.row(idx)
+        if not updates:
+            return listing
+        listing.update(updates)
         # normalize price if updated
         if "price" in updates:
-            try:
-                listings[idx]["price"] = float(listings[idx]["price"])
-            except Exception:
-                listings[idx]["price"] = 0.0
-        await _write_listings(listings)
-        return listings[idx]
+            _normalize_price(listing)
+        table.set_row(idx, listing)
+        await _persist(table, [("updated", listing["id"], listing)])
+        return listing
 
 
+@traced("listing_service.delete_listing")
 async def delete_listing(listing_id: str) -> bool:
-    with _lock:
-        listings = await _read_listings()
-        idx = _find_index(listings, listing_id)
-        if idx < 0:
+    async with _locked():
+        table = await _get_table(for_write=True)
+        if not table.remove(listing_id):
             return False
-        listings.pop(idx)
-        await _write_listings(listings)
+        await _persist(table, [("deleted", str(listing_id), None)])
         return True
 
 
+@traced("listing_service.set_availability")
 async def set_availability(listing_id: str, available: bool) -> Optional[Dict[str, Any]]:
     return await update_listing(listing_id, {"available": bool(available)})
 
 
+@traced("listing_service.adjust_price")
 async def adjust_price(listing_id: str, *, multiplier: Optional[float] = None, delta: Optional[float] = None, set_price: Optional[float] = None) -> Optional[Dict[str, Any]]:
     """Adjust price for a single listing. Provide one of multiplier, delta or set_price.
 
@@ -133,47 +391,85 @@ async def adjust_price(listing_id: str, *, multiplier: Optional[float] = None, d
     - delta: add (or subtract) value to current price
     - set_price: set absolute price
     """
-    listings = await _read_listings()
-    idx = _find_index(listings, listing_id)
-    if idx < 0:
-        return None
-    current = float(listings[idx].get("price", 0.0))
-    new_price = current
-    if set_price is not None:
-        new_price = float(set_price)
-    elif multiplier is not None:
-        new_price = current * float(multiplier)
-    elif delta is not None:
-        new_price = current + float(delta)
-    listings[idx]["price"] = round(new_price, 2)
-    await _write_listings(listings)
-    return listings[idx]
-
-
+    async with _locked():
+        table = await _get_table(for_write=True)
+        idx = table.index_of(listing_id)
+        if idx < 0:
+            return None
+        current = table.prices[idx]
+        if math.isnan(current):
+            current = 0.0
+        new_price = current
+        if set_price is not None:
+            new_price = float(set_price)
+        elif multiplier is not None:
+            new_price = current * float(multiplier)
+        elif delta is not None:
+            new_price = current + float(delta)
+        table.set_price(idx, round(new_price, 2))
+        listing = table.row(idx)
+        await _persist(table, [("updated", listing["id"], listing)])
+        return listing
+
+
+@traced("listing_service.adjust_all_dynamic")
 async def adjust_all_dynamic(rate: float = 1.0) -> List[Dict[str, Any]]:
     """Apply a simple multiplier to all available listings' prices.
 
     This is a placeholder for more sophisticated dynamic pricing logic.
+    Prices are computed on the price and availability columns; only the
+    listings whose price changes are decoded, persisted as changes and
+    returned.
     """
-    with _lock:
-        listings = await _read_listings()
-        for l in listings:
-            if l.get("available", True):
-                try:
-                    l["price"] = round(float(l.get("price", 0.0)) * rate, 2)
-                except Exception:
-                    l["price"] = 0.0
-        await _write_listings(listings)
+    async with _locked():
+        table = await _get_table(for_write=True)
+        prices = table.prices
+        changed: List[int] = []
+        for i in range(len(table)):
+            if not table.is_available(i):
+                continue
+            current = prices[i]
+            if math.isnan(current):
+                # missing or unparseable price: same fallback as before
+                listing = table.row(i)
+                listing["price"] = 0.0
+                table.set_row(i, listing)
+                changed.append(i)
+                continue
+            price = round(current * rate, 2)
+            if price != current:
+                prices[i] = price
+                changed.append(i)
+        if not changed:
+            return []
+        listings = [table.row(i) for i in changed]
+        await _persist(table, [("updated", l["id"], l) for l in listings])
         return listings
 
 
-async def get_competitor_prices(address: str) -> Dict[str, Any]:
-    # mock competitor scraping; in prod you'd call APIs or scrape
-    return {
-        "address": address,
-        "competitors": [
-            {"platform": "Airbnb", "price": 120},
-            {"platform": "Booking.com", "price": 110},
-            {"platform": "Vrbo", "price": 125},
-        ],
-    }
+# How often a waiting long-poll re-checks the shared version counter for
+# writes made by other workers (local writes wake waiters immediately).
+_CHANGE_POLL_INTERVAL = 0.5
+
+
+async def wait_for_changes(since: int, timeout: float = 0.0, limit: int = 1000) -> Dict[str, Any]:
+    """Changes with sequence number > `since`, long-polling up to `timeout` seconds.
+
+    Returns the change feed's result dict (`changes`, `last_seq`,
+    `resync_required`, ...); see `app.services.change_feed`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        # Pulls in writes from other workers as change-feed entries.
+        await _get_table()
+        result = change_feed.since(since, limit)
+        remaining = deadline - loop.time()
+        if result["resync_required"] or result["changes"] or remaining <= 0:
+            return result
+        await change_feed.wait(min(remaining, _CHANGE_POLL_INTERVAL))
+
+
+async def current_sequence() -> int:
+    await _get_table()
+    return change_feed.last_seq
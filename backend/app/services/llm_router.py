@@ -0,0 +1,226 @@
+"""Latency-aware routing across LLM providers and models.
+
+A route is a `(provider, model)` pair. For each route the router keeps a
+rolling window of recent call latencies and outcomes and ranks healthy
+routes by median latency, penalized by error rate; routes that have not
+been tried yet rank first so every route gets measured.
+
+A call goes to the best route. If it fails, the next route is tried
+(fallback). With hedging enabled, if the first route hasn't answered
+within its own p95 latency, the next route is fired as well and whichever
+succeeds first wins; the loser is cancelled. A route that fails
+`FAILURE_THRESHOLD` times in a row is skipped for `COOLDOWN_S`, then given
+another chance.
+
+The router is provider-agnostic: it is given a `call(text, provider,
+model)` coroutine (see `llm_service`), so it can be exercised offline with
+the `stub` provider.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.utils.metrics import LLM_HEDGES
+
+logger = logging.getLogger(__name__)
+
+Route = Tuple[str, Optional[str]]
+Call = Callable[[str, str, Optional[str]], Awaitable[str]]
+
+WINDOW = 100
+# Below this many successful samples, the p95 budget is a default.
+MIN_SAMPLES = 5
+FAILURE_THRESHOLD = 3
+COOLDOWN_S = 30.0
+ERROR_PENALTY = 4.0
+
+
+def parse_routes(spec: str) -> List[Route]:
+    """`"anthropic:claude-3-haiku,openai"` -> `[("anthropic", "claude-3-haiku"), ("openai", None)]`."""
+    routes: List[Route] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        provider, _, model = part.partition(":")
+        routes.append((provider.strip().lower(), model.strip() or None))
+    return routes
+
+
+def route_name(route: Route) -> str:
+    return f"{route[0]}:{route[1]}" if route[1] else route[0]
+
+
+class RouteStats:
+    def __init__(self, window: int = WINDOW):
+        # (latency_s, ok); ok is None for a censored sample: an attempt
+        # cancelled before it finished, whose latency is only known to be
+        # at least latency_s.
+        self.samples: Deque[Tuple[float, Optional[bool]]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, latency: float, ok: Optional[bool], now: float) -> None:
+        self.samples.append((latency, ok))
+        if ok:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        elif ok is False:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.open_until = now + COOLDOWN_S
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Latency quantile over completed and censored attempts.
+
+        A censored sample enters at its elapsed time, its lower bound, so
+        a route that keeps losing hedge races can't look faster than the
+        time it was given.
+        """
+        values = sorted(latency for latency, ok in self.samples if ok is not False)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    @property
+    def successes(self) -> int:
+        return sum(1 for _, ok in self.samples if ok)
+
+    @property
+    def failures(self) -> int:
+        return sum(1 for _, ok in self.samples if ok is False)
+
+    def error_rate(self) -> float:
+        """Failed share of the attempts that finished; censored ones are excluded."""
+        finished = self.successes + self.failures
+        return self.failures / finished if finished else 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.open_until
+
+    def score(self) -> float:
+        """Expected latency, inflated by error rate; 0 for untried routes."""
+        if not self.samples:
+            return 0.0
+        p50 = self.quantile(0.5)
+        if p50 is None:
+            return float("inf")
+        return p50 * (1.0 + ERROR_PENALTY * self.error_rate())
+
+
+class LLMRouter:
+    def __init__(self, routes: List[Route], call: Call, hedge: bool = False, hedge_default_s: float = 2.0,
+                 hedge_min_s: float = 0.2, timeout_s: float = 60.0):
+        if not routes:
+            raise ValueError("at least one LLM route is required")
+        self.routes = list(routes)
+        self.call = call
+        self.hedge = hedge
+        self.hedge_default_s = hedge_default_s
+        self.hedge_min_s = hedge_min_s
+        self.timeout_s = timeout_s
+        self.stats: Dict[Route, RouteStats] = {r: RouteStats() for r in self.routes}
+
+    def ranked(self, now: Optional[float] = None) -> List[Route]:
+        """Healthy routes fastest first, then cooling-down ones as a last resort."""
+        now = time.monotonic() if now is None else now
+        healthy = [r for r in self.routes if self.stats[r].healthy(now)]
+        cooling = [r for r in self.routes if not self.stats[r].healthy(now)]
+        # sorted() is stable, so ties keep the configured order.
+        return sorted(healthy, key=lambda r: self.stats[r].score()) + sorted(cooling, key=lambda r: self.stats[r].open_until)
+
+    def hedge_budget(self, route: Route) -> float:
+        stats = self.stats[route]
+        p95 = stats.quantile(0.95) if stats.successes >= MIN_SAMPLES else None
+        return max(self.hedge_min_s, p95 if p95 is not None else self.hedge_default_s)
+
+    async def _attempt(self, route: Route, text: str) -> str:
+        started = time.monotonic()
+        try:
+            reply = await asyncio.wait_for(self.call(text, route[0], route[1]), self.timeout_s)
+        except asyncio.CancelledError:
+            # Lost a hedge race (or the caller went away): neither a success
+            # nor a failure, but the elapsed time is a lower bound on its
+            # latency, which keeps a slow route's p50/p95 honest.
+            self.stats[route].record(time.monotonic() - started, None, time.monotonic())
+            raise
+        except Exception:
+            self.stats[route].record(time.monotonic() - started, False, time.monotonic())
+            raise
+        self.stats[route].record(time.monotonic() - started, True, time.monotonic())
+        return reply
+
+    async def complete(self, text: str) -> Tuple[str, Route]:
+        """Reply from the first route to succeed, and that route."""
+        pending = self.ranked()
+        inflight: Dict[asyncio.Task, Route] = {}
+        errors: List[str] = []
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch() -> Route:
+            route = pending.pop(0)
+            inflight[asyncio.ensure_future(self._attempt(route, text))] = route
+            return route
+
+        latest = launch()
+        try:
+            while inflight:
+                timeout = None
+                if self.hedge and pending and len(inflight) == 1:
+                    timeout = self.hedge_budget(latest)
+                done, _ = await asyncio.wait(inflight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info("LLM route %s exceeded %.2fs; hedging with %s", route_name(latest), timeout, route_name(pending[0]))
+                    hedged = True
+                    latest = launch()
+                    continue
+                for task in done:
+                    route = inflight.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            LLM_HEDGES.inc("hedge" if route == latest else "primary")
+                        return task.result(), route
+                    last_error = task.exception()
+                    errors.append(f"{route_name(route)}: {last_error}")
+                    logger.warning("LLM route %s failed: %s", route_name(route), last_error)
+                if not inflight and pending:
+                    latest = launch()
+        finally:
+            for task in inflight:
+                task.cancel()
+        if hedged:
+            LLM_HEDGES.inc("none")
+        raise RuntimeError("All LLM routes failed: " + "; ".join(errors)) from last_error
+
+    async def probe(self, text: str = "ping") -> Dict[str, object]:
+        """Call every route once, concurrently, to warm clients and seed stats."""
+        async def _one(route: Route) -> object:
+            try:
+                await self._attempt(route, text)
+                return "ok"
+            except Exception as e:
+                return f"error: {e}"
+
+        results = await asyncio.gather(*[_one(r) for r in self.routes])
+        return {route_name(r): res for r, res in zip(self.routes, results)}
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        now = time.monotonic()
+        out = []
+        for route in self.ranked(now):
+            stats = self.stats[route]
+            p50, p95 = stats.quantile(0.5), stats.quantile(0.95)
+            out.append({
+                "route": route_name(route),
+                "healthy": stats.healthy(now),
+                "samples": len(stats.samples),
+                "censored": sum(1 for _, ok in stats.samples if ok is None),
+                "error_rate": round(stats.error_rate(), 3),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedge_budget_ms": round(self.hedge_budget(route) * 1000, 1),
+            })
+        return out
@@ -1,6 +1,13 @@
 import os
+import time
+import random
 import asyncio
-from typing import Optional
+from typing import Dict, List, Optional
+
+from app.services.llm_router import LLMRouter, parse_routes
+from app.utils.http import get_http_client
+from app.utils.metrics import LLM_LATENCY
+from app.utils.tracing import span
 
 try:
     import openai # type: ignore
@@ -27,11 +34,13 @@ async def run_llm(text: str, provider: Optional[str] = None, model: Optional[str
     """Run a text prompt against a configured LLM provider.
 
     Provider selection order:
-    - `provider` argument (if provided)
-    - `LLM_PROVIDER` environment variable
+    - `provider`/`model` arguments (if provided), called directly
+    - otherwise the latency-aware router over `LLM_ROUTES` (see `get_router`),
+      which falls back to `LLM_PROVIDER`/`LLM_MODEL`
     - defaults to `anthropic` if available
 
-    Supported providers (implemented here): `openai`, `huggingface`, `anthropic`, `google`.
+    Supported providers (implemented here): `openai`, `huggingface`, `anthropic`, `google`,
+    and `stub` for offline testing.
     This function is intentionally small and provider adapters are lightweight; add more
     providers as needed.
 
@@ -45,8 +54,89 @@ async def run_llm(text: str, provider: Optional[str] = None, model: Optional[str
     if not text:
         return "No text provided"
 
-    provider = (provider or os.getenv("LLM_PROVIDER") or "anthropic").lower()
-    model = model or os.getenv("LLM_MODEL")
+    if provider or model:
+        # An explicit provider/model bypasses routing.
+        provider = (provider or os.getenv("LLM_PROVIDER") or "anthropic").lower()
+        model = model or os.getenv("LLM_MODEL")
+        return await _call(text, provider, model)
+
+    reply, _ = await get_router().complete(text)
+    return reply
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_router() -> LLMRouter:
+    """Router over `LLM_ROUTES` (default: just `LLM_PROVIDER`/`LLM_MODEL`).
+
+    - `LLM_ROUTES`: comma-separated `provider[:model]`, e.g.
+      `anthropic:claude-3-haiku-20240307,openai:gpt-4o-mini`
+    - `LLM_HEDGE=1`: fire the next route when the first exceeds its p95
+      (`LLM_HEDGE_DEFAULT_MS` until enough samples exist)
+    - `LLM_TIMEOUT_S`: per-attempt timeout (default 60)
+    """
+    global _router
+    if _router is None:
+        routes = parse_routes(os.getenv("LLM_ROUTES", ""))
+        if not routes:
+            routes = [((os.getenv("LLM_PROVIDER") or "anthropic").lower(), os.getenv("LLM_MODEL"))]
+        _router = LLMRouter(
+            routes,
+            _call,
+            hedge=os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes"),
+            hedge_default_s=float(os.getenv("LLM_HEDGE_DEFAULT_MS", "2000")) / 1000.0,
+            timeout_s=float(os.getenv("LLM_TIMEOUT_S", "60")),
+        )
+    return _router
+
+
+def route_stats() -> List[Dict[str, object]]:
+    return get_router().snapshot()
+
+
+async def _call(text: str, provider: str, model: Optional[str]) -> str:
+    started = time.perf_counter()
+    result = "error"
+    try:
+        with span("llm_service.run_llm", provider=provider, model=model):
+            reply = await _dispatch(text, provider, model)
+        result = "success"
+        return reply
+    except asyncio.CancelledError:
+        # Usually the losing attempt of a hedged call: not a provider error.
+        result = "cancelled"
+        raise
+    finally:
+        LLM_LATENCY.observe(time.perf_counter() - started, provider, result)
+
+
+async def _call_stub(text: str, model: Optional[str]) -> str:
+    """Offline provider for tests and local runs.
+
+    `model` is `name[@latency_ms][!error_rate]`, e.g. `fast@50`,
+    `flaky@200!0.3` or `down!1`; latency gets +/-20% jitter.
+    """
+    spec = model or "stub"
+    name, _, rest = spec.partition("@")
+    latency_ms, error_rate = 20.0, 0.0
+    if "!" in name:
+        name, _, rate = name.partition("!")
+        error_rate = float(rate)
+    if rest:
+        latency, _, rate = rest.partition("!")
+        latency_ms = float(latency)
+        error_rate = float(rate) if rate else error_rate
+    await asyncio.sleep(latency_ms / 1000.0 * random.uniform(0.8, 1.2))
+    if random.random() < error_rate:
+        raise RuntimeError(f"stub provider {name} failed")
+    return f"[stub:{name}] {text[:200]}"
+
+
+async def _dispatch(text: str, provider: str, model: Optional[str]) -> str:
+    """Call the adapter for `provider`; see `run_llm` for configuration."""
+    if provider == "stub":
+        return await _call_stub(text, model)
 
     if provider == "openai":
         if openai is None:
@@ -79,26 +169,25 @@ async def run_llm(text: str, provider: Optional[str] = None, model: Optional[str
         hf_model = model or os.getenv("HUGGINGFACE_MODEL") or "gpt2"
         url = f"https://api-inference.huggingface.co/models/{hf_model}"
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            headers = {"Authorization": f"Bearer {hf_key}"}
-            payload = {"inputs": text}
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            data = r.json()
-            # HF returns different shapes depending on model; handle common cases
-            if isinstance(data, dict) and "error" in data:
-                raise RuntimeError(f"Hugging Face error: {data['error']}")
-            if isinstance(data, list):
-                # often a list of completions
-                first = data[0]
-                if isinstance(first, dict) and "generated_text" in first:
-                    return first["generated_text"]
-                # some models return a single string
-                if isinstance(first, str):
-                    return first
-            if isinstance(data, dict) and "generated_text" in data:
-                return data["generated_text"]
-            return str(data)
+        headers = {"Authorization": f"Bearer {hf_key}"}
+        payload = {"inputs": text}
+        r = await get_http_client().post(url, headers=headers, json=payload, timeout=60.0)
+        r.raise_for_status()
+        data = r.json()
+        # HF returns different shapes depending on model; handle common cases
+        if isinstance(data, dict) and "error" in data:
+            raise RuntimeError(f"Hugging Face error: {data['error']}")
+        if isinstance(data, list):
+            # often a list of completions
+            first = data[0]
+            if isinstance(first, dict) and "generated_text" in first:
+                return first["generated_text"]
+            # some models return a single string
+            if isinstance(first, str):
+                return first
+        if isinstance(data, dict) and "generated_text" in data:
+            return data["generated_text"]
+        return str(data)
 
     if provider == "anthropic":
         if Anthropic is None:
@@ -8,13 +8,21 @@ these adapters with auth flows and payload mappings as needed.
 from typing import Any, Dict, Optional
 import logging
 import os
-import httpx
-
+import time
 from app.config import settings
+from app.utils.http import get_http_client
+from app.utils.metrics import N8N_LATENCY, outcome
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+def _observe(operation: str, started: float, result: Dict[str, Any]) -> Dict[str, Any]:
+    N8N_LATENCY.observe(time.perf_counter() - started, operation, outcome(bool(result.get("ok"))))
+    return result
+
+
+@traced("n8n_service.send_webhook")
 async def send_webhook(event: str, payload: Dict[str, Any], *, timeout: float = 10.0) -> Dict[str, Any]:
     """Send a payload to the configured n8n webhook URL.
 
@@ -29,19 +37,20 @@ async def send_webhook(event: str, payload: Dict[str, Any], *, timeout: float =
     url = f"{base}/{event}"
     headers = {"Content-Type": "application/json"}
 
+    started = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            r = await client.post(url, json=payload, headers=headers)
-            try:
-                data = r.json()
-            except Exception:
-                data = r.text
-            return {"ok": r.is_success, "status_code": r.status_code, "result": data}
+        r = await get_http_client().post(url, json=payload, headers=headers, timeout=timeout)
+        try:
+            data = r.json()
+        except Exception:
+            data = r.text
+        return _observe("webhook", started, {"ok": r.is_success, "status_code": r.status_code, "result": data})
     except Exception as e:
         logger.exception("Failed to send n8n webhook to %s: %s", url, e)
-        return {"ok": False, "status_code": None, "error": str(e)}
+        return _observe("webhook", started, {"ok": False, "status_code": None, "error": str(e)})
 
 
+@traced("n8n_service.trigger_workflow_via_api")
 async def trigger_workflow_via_api(workflow_id: str, payload: Optional[Dict[str, Any]] = None, *, timeout: float = 15.0) -> Dict[str, Any]:
     """Trigger a workflow via n8n REST API.
 
@@ -63,19 +72,20 @@ async def trigger_workflow_via_api(workflow_id: str, payload: Optional[Dict[str,
 
     body = payload or {}
 
+    started = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            r = await client.post(endpoint, json={"nodes": [], "workflowData": body}, headers=headers)
-            try:
-                data = r.json()
-            except Exception:
-                data = r.text
-            return {"ok": r.is_success, "status_code": r.status_code, "result": data}
+        r = await get_http_client().post(endpoint, json={"nodes": [], "workflowData": body}, headers=headers, timeout=timeout)
+        try:
+            data = r.json()
+        except Exception:
+            data = r.text
+        return _observe("trigger_workflow", started, {"ok": r.is_success, "status_code": r.status_code, "result": data})
     except Exception as e:
         logger.exception("Failed to trigger n8n workflow %s: %s", workflow_id, e)
-        return {"ok": False, "status_code": None, "error": str(e)}
+        return _observe("trigger_workflow", started, {"ok": False, "status_code": None, "error": str(e)})
 
 
+@traced("n8n_service.list_workflows_via_api")
 async def list_workflows_via_api(*, timeout: float = 10.0) -> Dict[str, Any]:
     """List workflows from n8n REST API (if available).
 
@@ -87,14 +97,14 @@ async def list_workflows_via_api(*, timeout: float = 10.0) -> Dict[str, Any]:
     if settings.N8N_API_KEY:
         headers["Authorization"] = f"Bearer {settings.N8N_API_KEY}"
 
+    started = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            r = await client.get(endpoint, headers=headers)
-            try:
-                data = r.json()
-            except Exception:
-                data = r.text
-            return {"ok": r.is_success, "status_code": r.status_code, "result": data}
+        r = await get_http_client().get(endpoint, headers=headers, timeout=timeout)
+        try:
+            data = r.json()
+        except Exception:
+            data = r.text
+        return _observe("list_workflows", started, {"ok": r.is_success, "status_code": r.status_code, "result": data})
     except Exception as e:
         logger.exception("Failed to list n8n workflows: %s", e)
-        return {"ok": False, "status_code": None, "error": str(e)}
+        return _observe("list_workflows", started, {"ok": False, "status_code": None, "error": str(e)})
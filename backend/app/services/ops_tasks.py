@@ -0,0 +1,306 @@
+"""Persistent ops task store (cleanings and other scheduled chores).
+
+Tasks are dicts:
+
+    {"id", "listing_id", "kind", "due", "due_at", "status", "version",
+     "next_check", "escalations", "last_escalated_at", "cleaner_id", ...}
+
+`due`/`next_check` are epoch seconds; `status` is `scheduled`, `done` or
+`cancelled`. Two in-memory indexes cover the open tasks:
+
+- a min-heap on `next_check` (first `due + ESCALATION_GRACE_S`, then the
+  next re-escalation time): `claim_due` pops only the entries that are due,
+  O(log n) each, never scanning the rest. Entries are invalidated lazily by
+  `version` instead of being removed from the middle of the heap.
+- a list sorted by `due` for overdue/upcoming range queries via bisect.
+
+Every change is appended to a JSON-lines journal (`data/ops_tasks.jsonl`,
+one full task per line, last one wins) under the same `FileLock` scheme as
+the listing store. Before each operation the store replays whatever other
+workers appended since its last read, so all processes share one view; the
+journal is compacted when it grows well past the number of live tasks.
+"""
+import asyncio
+import bisect
+import datetime
+import heapq
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.listing_service import DATA_FILE
+from app.utils.interprocess import FileLock
+from app.utils.serialization import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+TASKS_FILE = os.path.join(os.path.dirname(DATA_FILE), "ops_tasks.jsonl")
+
+OPEN = "scheduled"
+# Escalate once a task is this far past due, then every REPEAT until done;
+# failed escalations (and claims whose worker died) are retried after RETRY.
+ESCALATION_GRACE_S = 15 * 60
+ESCALATION_REPEAT_S = 60 * 60
+ESCALATION_RETRY_S = 5 * 60
+# Closed tasks older than this are dropped when the journal is compacted.
+RETENTION_S = 7 * 24 * 3600
+
+
+def parse_when(when: Any) -> float:
+    """Epoch seconds for an ISO date/datetime string (naive means UTC) or a number."""
+    if isinstance(when, (int, float)):
+        return float(when)
+    value = datetime.datetime.fromisoformat(str(when).strip().replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+class TaskStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[Tuple[float, str, int]] = []  # (next_check, id, version)
+        self._by_due: List[Tuple[float, str]] = []  # open tasks, sorted
+        self._lock = asyncio.Lock()
+        self._file_lock: Optional[FileLock] = None
+        # Journal position already applied, and the file it belongs to.
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._records = 0
+
+    def __len__(self) -> int:
+        return len(self._by_due)
+
+    # --- in-memory indexes ----------------------------------------------
+
+    def _clear(self) -> None:
+        self.tasks.clear()
+        self._heap.clear()
+        self._by_due.clear()
+        self._offset = 0
+        self._records = 0
+
+    def _apply(self, task: Dict[str, Any]) -> None:
+        old = self.tasks.get(task["id"])
+        if old is not None and old["status"] == OPEN:
+            key = (old["due"], old["id"])
+            i = bisect.bisect_left(self._by_due, key)
+            if i < len(self._by_due) and self._by_due[i] == key:
+                del self._by_due[i]
+        self.tasks[task["id"]] = task
+        if task["status"] == OPEN:
+            bisect.insort(self._by_due, (task["due"], task["id"]))
+            heapq.heappush(self._heap, (task["next_check"], task["id"], task["version"]))
+        if len(self._heap) > 2 * len(self._by_due) + 1024:
+            # Too many superseded entries: rebuild from the live tasks.
+            self._heap = [(t["next_check"], t["id"], t["version"]) for t in self.tasks.values() if t["status"] == OPEN]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float, limit: int) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        while self._heap and self._heap[0][0] <= now and len(out) < limit:
+            _, task_id, version = heapq.heappop(self._heap)
+            task = self.tasks.get(task_id)
+            if task is not None and task["status"] == OPEN and task["version"] == version:
+                out.append(task)
+        return out
+
+    def _range(self, start: float, end: float, limit: int) -> List[Dict[str, Any]]:
+        lo = bisect.bisect_left(self._by_due, (start, ""))
+        hi = bisect.bisect_left(self._by_due, (end, ""))
+        return [self.tasks[task_id] for _, task_id in self._by_due[lo:min(hi, lo + limit)]]
+
+    # --- journal ----------------------------------------------------------
+
+    def _read_tail_sync(self) -> Tuple[Optional[int], bool, bytes]:
+        """(inode, reset, new complete lines) since the applied offset."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, self._inode is not None, b""
+        reset = st.st_ino != self._inode or st.st_size < self._offset
+        offset = 0 if reset else self._offset
+        if st.st_size == offset:
+            return st.st_ino, reset, b""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        return st.st_ino, reset, data[:data.rfind(b"\n") + 1]
+
+    async def _refresh(self) -> None:
+        inode, reset, data = await asyncio.to_thread(self._read_tail_sync)
+        if reset:
+            self._clear()
+        self._inode = inode
+        for line in data.splitlines():
+            if line.strip():
+                self._apply(json_loads(line))
+                self._records += 1
+        self._offset += len(data)
+
+    def _append_sync(self, tasks: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(b"".join(json_dumps(t) + b"\n" for t in tasks))
+            offset = f.tell()
+        self._offset = offset
+        self._inode = os.stat(self.path).st_ino
+
+    def _compact_sync(self, tasks: List[Dict[str, Any]]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(json_dumps(t) + b"\n" for t in tasks))
+        os.replace(tmp, self.path)
+
+    @asynccontextmanager
+    async def locked(self):
+        """Exclusive access across coroutines and workers, with the journal replayed."""
+        async with self._lock:
+            if self._file_lock is None:
+                self._file_lock = FileLock(self.path + ".lock")
+            await self._file_lock.acquire()
+            try:
+                await self._refresh()
+                if self._records > 2 * len(self.tasks) + 10000:
+                    await self._compact()
+                yield self
+            finally:
+                self._file_lock.release()
+
+    async def _compact(self) -> None:
+        cutoff = time.time() - RETENTION_S
+        keep = [t for t in self.tasks.values() if t["status"] == OPEN or t.get("updated_at", 0) >= cutoff]
+        await asyncio.to_thread(self._compact_sync, keep)
+        self._clear()
+        self._inode = None
+        await self._refresh()
+        logger.info("Compacted ops task journal to %d tasks", len(keep))
+
+    async def write(self, tasks: List[Dict[str, Any]]) -> None:
+        """Persist and apply task records; call inside `locked()`."""
+        if not tasks:
+            return
+        now = time.time()
+        for t in tasks:
+            t["updated_at"] = now
+        await asyncio.to_thread(self._append_sync, tasks)
+        for t in tasks:
+            self._apply(t)
+        self._records += len(tasks)
+
+
+_store = TaskStore(TASKS_FILE)
+
+
+def _new_task(listing_id: str, due: float, kind: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **fields,
+        "id": str(uuid.uuid4()),
+        "listing_id": listing_id,
+        "kind": kind,
+        "due": due,
+        "due_at": _iso(due),
+        "status": OPEN,
+        "version": 1,
+        "next_check": due + ESCALATION_GRACE_S,
+        "escalations": 0,
+        "last_escalated_at": None,
+        "created_at": time.time(),
+    }
+
+
+def _revise(task: Dict[str, Any], **changes: Any) -> Dict[str, Any]:
+    # Tasks are never mutated in place: readers may still hold the old dict.
+    return {**task, **changes, "version": task["version"] + 1}
+
+
+async def schedule_tasks(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Create tasks from dicts with `listing_id`, `when` and optional `kind`/extra fields."""
+    tasks = []
+    for item in items:
+        fields = {k: v for k, v in item.items() if k not in ("listing_id", "when", "kind")}
+        tasks.append(_new_task(item["listing_id"], parse_when(item["when"]), item.get("kind", "cleaning"), fields))
+    async with _store.locked() as store:
+        await store.write(tasks)
+    return tasks
+
+
+async def schedule_task(listing_id: str, when: Any, kind: str = "cleaning", **fields: Any) -> Dict[str, Any]:
+    return (await schedule_tasks([{"listing_id": listing_id, "when": when, "kind": kind, **fields}]))[0]
+
+
+async def get_task(task_id: str) -> Optional[Dict[str, Any]]:
+    async with _store.locked() as store:
+        return store.tasks.get(task_id)
+
+
+async def _close(task_id: str, status: str) -> Optional[Dict[str, Any]]:
+    async with _store.locked() as store:
+        task = store.tasks.get(task_id)
+        if task is None:
+            return None
+        if task["status"] != OPEN:
+            return task
+        closed = _revise(task, status=status, closed_at=time.time())
+        await store.write([closed])
+        return closed
+
+
+async def complete_task(task_id: str) -> Optional[Dict[str, Any]]:
+    return await _close(task_id, "done")
+
+
+async def cancel_task(task_id: str) -> Optional[Dict[str, Any]]:
+    return await _close(task_id, "cancelled")
+
+
+async def list_tasks(status: str = "upcoming", within_s: float = 24 * 3600, limit: int = 100, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Open tasks that are `overdue` (oldest first) or `upcoming` within `within_s`."""
+    now = time.time() if now is None else now
+    async with _store.locked() as store:
+        if status == "overdue":
+            return store._range(float("-inf"), now, limit)
+        return store._range(now, now + within_s, limit)
+
+
+async def claim_due(now: Optional[float] = None, limit: int = 10000) -> List[Dict[str, Any]]:
+    """Pop tasks needing escalation and claim them for `ESCALATION_RETRY_S`.
+
+    The claim is journaled before returning so other workers skip these
+    tasks; report the outcome with `record_escalations`.
+    """
+    now = time.time() if now is None else now
+    async with _store.locked() as store:
+        claimed = [_revise(t, next_check=now + ESCALATION_RETRY_S) for t in store._pop_due(now, limit)]
+        await store.write(claimed)
+    return claimed
+
+
+async def record_escalations(task_ids: List[str], ok: bool, now: Optional[float] = None) -> None:
+    now = time.time() if now is None else now
+    async with _store.locked() as store:
+        updated = []
+        for task_id in task_ids:
+            task = store.tasks.get(task_id)
+            if task is None or task["status"] != OPEN:
+                continue
+            if ok:
+                updated.append(_revise(task, escalations=task["escalations"] + 1, last_escalated_at=now, next_check=now + ESCALATION_REPEAT_S))
+            else:
+                updated.append(_revise(task, next_check=now + ESCALATION_RETRY_S))
+        await store.write(updated)
+
+
+async def stats() -> Dict[str, Any]:
+    now = time.time()
+    async with _store.locked() as store:
+        overdue = bisect.bisect_left(store._by_due, (now, ""))
+        return {"open": len(store), "overdue": overdue, "next_due_at": _iso(store._by_due[overdue][0]) if overdue < len(store) else None}
@@ -0,0 +1,342 @@
+"""Field-level sync of listing edits to the external platforms.
+
+For every listing published through `publish_listing`, the state last
+pushed to each platform is kept in `data/platform_sync_state.json`:
+
+    {listing_id: {platform: {"remote_id": ..., "fields": {...}, "pushed_at": ...}}}
+
+Listing changes arrive from the change feed. Each changed listing waits
+until it has been quiet for `SYNC_DEBOUNCE_S` (but no longer than
+`SYNC_MAX_DELAY_S` after its first pending change), so a burst of edits or
+a pricing run becomes one update per listing. The flush then diffs the
+listing's current `SYNC_FIELDS` against what each platform last received
+and sends only the changed fields; a listing whose diff is empty costs no
+call at all. Deleted listings are removed from the platforms they were
+published to.
+
+Every worker sees every change, so flushes coordinate through the shared
+state under a `FileLock`: a flush claims each platform entry (stamping
+`claimed_until`) and saves, releases the lock for the outbound calls, then
+re-takes it to record the results. Another worker flushing meanwhile skips
+claimed entries and retries once they are released; whichever worker
+flushes second finds nothing left to send. Platforms that skip an update
+(e.g. no API key) count as synced, so their fields aren't resent on every
+edit. Failed updates are retried after `RETRY_S`.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.services.change_feed import feed as change_feed
+from app.services.integrations_service import (
+    SYNC_FIELDS,
+    publish_listing_cross_platform,
+    remove_listing_cross_platform,
+    update_listing_cross_platform,
+)
+from app.services.listing_service import DATA_FILE, get_listing, get_listing_table
+from app.utils.interprocess import FileLock
+from app.utils.metrics import PLATFORM_SYNC
+from app.utils.serialization import json_dumps, json_loads
+from app.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.path.join(os.path.dirname(DATA_FILE), "platform_sync_state.json")
+
+RETRY_S = 60.0
+# How long a flush may hold a claim; covers the integration call timeouts.
+CLAIM_S = 120.0
+# Listings flushed concurrently; each sends at most one call per platform.
+FLUSH_CONCURRENCY = 8
+
+_state: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_state_key: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of the file _state came from
+_lock = asyncio.Lock()
+_file_lock: Optional[FileLock] = None
+
+# listing id -> (first pending change, earliest flush time)
+_pending: Dict[str, Tuple[float, float]] = {}
+_flusher: Optional[asyncio.Task] = None
+
+
+def snapshot(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """The platform-visible fields of `listing`, normalized for comparison."""
+    fields = {k: listing[k] for k in SYNC_FIELDS if k in listing}
+    if isinstance(fields.get("price"), (int, float)):
+        fields["price"] = round(float(fields["price"]), 2)
+    return fields
+
+
+def field_diff(pushed: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields whose value differs; fields dropped from the listing map to None."""
+    diff = {k: v for k, v in current.items() if k not in pushed or pushed[k] != v}
+    diff.update({k: None for k in pushed if k not in current})
+    return diff
+
+
+# --- shared state --------------------------------------------------------
+
+def _file_key() -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(STATE_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_sync() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    try:
+        with open(STATE_FILE, "rb") as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        return {}
+
+
+def _refresh_sync() -> None:
+    global _state, _state_key
+    key = _file_key()
+    if key == _state_key:
+        return
+    _state = _read_sync() if key is not None else {}
+    _state_key = key
+
+
+def _save_sync(payload: bytes) -> None:
+    global _state_key
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, STATE_FILE)
+    _state_key = _file_key()
+
+
+@asynccontextmanager
+async def _locked():
+    """Exclusive access to the shared state across coroutines and workers."""
+    global _file_lock
+    async with _lock:
+        if _file_lock is None:
+            _file_lock = FileLock(STATE_FILE + ".lock")
+        await _file_lock.acquire()
+        try:
+            await asyncio.to_thread(_refresh_sync)
+            yield _state
+        finally:
+            _file_lock.release()
+
+
+async def _save() -> None:
+    await asyncio.to_thread(_save_sync, json_dumps(_state))
+
+
+# --- debounce ------------------------------------------------------------
+
+def _mark(listing_ids: Iterable[str], delay: Optional[float] = None) -> None:
+    now = time.monotonic()
+    delay = settings.SYNC_DEBOUNCE_S if delay is None else delay
+    for listing_id in listing_ids:
+        first = _pending.get(listing_id, (now, 0.0))[0]
+        _pending[listing_id] = (first, min(now + delay, first + max(delay, settings.SYNC_MAX_DELAY_S)))
+    _ensure_flusher()
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    if _flusher is not None and not _flusher.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # no loop (e.g. a script): picked up by the next change or flush_pending()
+    _flusher = loop.create_task(_run_flusher())
+
+
+async def _run_flusher() -> None:
+    while _pending:
+        now = time.monotonic()
+        ready = [lid for lid, (_, at) in _pending.items() if at <= now]
+        if not ready:
+            await asyncio.sleep(min(at for _, at in _pending.values()) - now)
+            continue
+        for lid in ready:
+            _pending.pop(lid, None)
+        try:
+            await _flush(ready)
+        except Exception:
+            logger.exception("Platform sync flush failed; retrying %d listings", len(ready))
+            _mark(ready, RETRY_S)
+
+
+def _on_listing_changes(changes: List[Dict[str, Any]]) -> None:
+    if not settings.SYNC_ENABLED:
+        return
+    _mark(change["id"] for change in changes)
+
+
+change_feed.subscribe(_on_listing_changes)
+
+
+# --- flushing ------------------------------------------------------------
+
+async def _sync_one(listing_id: str, listing: Optional[Dict[str, Any]], pushed: Dict[str, Dict[str, Any]]) -> bool:
+    """Push one listing's changes; updates `pushed` in place. False if anything failed."""
+    if listing is None:
+        remote_ids = {p: entry["remote_id"] for p, entry in pushed.items()}
+        results = await remove_listing_cross_platform(remote_ids)
+        for r in results:
+            PLATFORM_SYNC.inc(r["platform"], "removed" if r.get("status") == "deleted" else "error")
+            if r.get("status") in ("deleted", "not_found"):
+                pushed.pop(r["platform"], None)
+        return not pushed
+
+    current = snapshot(listing)
+    patches: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    for platform, entry in pushed.items():
+        diff = field_diff(entry["fields"], current)
+        if diff:
+            patches[platform] = (entry["remote_id"], diff)
+        else:
+            PLATFORM_SYNC.inc(platform, "unchanged")
+    if not patches:
+        return True
+    ok = True
+    now = time.time()
+    for r in await update_listing_cross_platform(patches):
+        platform, status = r["platform"], r.get("status", "error")
+        PLATFORM_SYNC.inc(platform, status)
+        if status == "updated":
+            pushed[platform] = {**pushed[platform], "fields": current, "pushed_at": now}
+        elif status == "skipped":
+            # Nothing to retry until the platform is configured.
+            pushed[platform] = {**pushed[platform], "fields": current}
+        else:
+            ok = False
+    return ok
+
+
+async def _claim(listing_ids: List[str]) -> Tuple[Dict[str, Dict[str, Dict[str, Any]]], Dict[str, Optional[Dict[str, Any]]], List[str]]:
+    """Claim the unclaimed platform entries of `listing_ids`.
+
+    Returns copies of the claimed entries and the listing rows to diff
+    them against, plus the listings with entries another flush holds.
+    """
+    claims: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    busy: List[str] = []
+    async with _locked() as state:
+        now = time.time()
+        for lid in listing_ids:
+            pushed = state.get(lid) or {}
+            free = {p: entry for p, entry in pushed.items() if entry.get("claimed_until", 0.0) <= now}
+            if len(free) < len(pushed):
+                busy.append(lid)
+            if not free:
+                continue
+            claims[lid] = {p: {k: v for k, v in entry.items() if k != "claimed_until"} for p, entry in free.items()}
+            for entry in free.values():
+                entry["claimed_until"] = now + CLAIM_S
+        if not claims:
+            return claims, {}, busy
+        table = await get_listing_table()
+        # Copy rows now: the table may change while calls are in flight.
+        rows = {lid: table.get(lid) for lid in claims}
+        await _save()
+    return claims, rows, busy
+
+
+async def _record(claimed: Dict[str, Dict[str, str]], results: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+    """Store the outcome of claimed entries and release the claims."""
+    async with _locked() as state:
+        for lid, remote_ids in claimed.items():
+            pushed = state.get(lid)
+            if pushed is None:
+                continue
+            for platform, remote_id in remote_ids.items():
+                entry = pushed.get(platform)
+                if entry is None or entry.get("remote_id") != remote_id:
+                    continue  # re-published meanwhile: that entry is newer
+                if platform in results[lid]:
+                    pushed[platform] = results[lid][platform]
+                else:
+                    del pushed[platform]
+            if not pushed:
+                del state[lid]
+        await _save()
+
+
+@traced("platform_sync.flush")
+async def _flush(listing_ids: List[str]) -> Dict[str, int]:
+    claims, rows, busy = await _claim(listing_ids)
+    if busy:
+        # Another flush holds some entries: look again once it is likely done.
+        _mark(busy)
+    if not claims:
+        return {"listings": 0, "failed": 0}
+    claimed = {lid: {p: entry["remote_id"] for p, entry in pushed.items()} for lid, pushed in claims.items()}
+    sem = asyncio.Semaphore(FLUSH_CONCURRENCY)
+    failed: List[str] = []
+
+    async def _one(lid: str) -> None:
+        async with sem:
+            if not await _sync_one(lid, rows[lid], claims[lid]):
+                failed.append(lid)
+
+    # No lock is held during the outbound calls.
+    try:
+        await asyncio.gather(*[_one(lid) for lid in claims])
+    finally:
+        await _record(claimed, claims)
+    if failed:
+        logger.warning("Platform sync failed for %d listings; retrying in %.0fs", len(failed), RETRY_S)
+        _mark(failed, RETRY_S)
+    return {"listings": len(claims), "failed": len(failed)}
+
+
+async def flush_pending() -> Dict[str, int]:
+    """Flush every pending listing now, ignoring the debounce window."""
+    ids = list(_pending)
+    _pending.clear()
+    return await _flush(ids) if ids else {"listings": 0, "failed": 0}
+
+
+# --- publishing ----------------------------------------------------------
+
+@traced("platform_sync.publish_listing")
+async def publish_listing(listing_id: str, platforms: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """Publish the full listing and record it as the baseline for later diffs."""
+    listing = await get_listing(listing_id)
+    if listing is None:
+        return None
+    results = await publish_listing_cross_platform(listing, platforms)
+    now = time.time()
+    fields = snapshot(listing)
+    async with _locked() as state:
+        pushed = state.setdefault(listing_id, {})
+        for r in results:
+            if r.get("status") == "created":
+                pushed[r["platform"]] = {"remote_id": r["remote_id"], "fields": fields, "pushed_at": now}
+                PLATFORM_SYNC.inc(r["platform"], "published")
+        if not pushed:
+            del state[listing_id]
+        await _save()
+    # Edits made while publishing are diffed against the baseline above.
+    _mark([listing_id])
+    return results
+
+
+async def sync_status(listing_id: str) -> Dict[str, Any]:
+    # A plain read: saves replace the file atomically, so no lock is needed.
+    state = await asyncio.to_thread(_read_sync)
+    pushed = state.get(listing_id, {})
+    pending = _pending.get(listing_id)
+    return {
+        "id": listing_id,
+        "platforms": pushed,
+        "pending": pending is not None,
+        "flush_in_s": round(max(0.0, pending[1] - time.monotonic()), 2) if pending else None,
+    }
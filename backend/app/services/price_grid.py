@@ -0,0 +1,461 @@
+"""Nightly price grid: per-listing, per-date price recommendations.
+
+For every listing the grid holds `HORIZON_DAYS` float32 prices starting at
+`origin` (today, UTC), all in one flat `array('f')` — row `i` spans
+`values[i * horizon:(i + 1) * horizon]`. A night's price is
+
+    base price × weekend uplift × seasonal factor
+    -> blended towards the competitor price for that night, if observed
+    -> discounted if it is an orphan night (a short gap between bookings)
+    -> clamped to the listing's `constraints` min/max
+
+`rebuild_price_grid()` computes the whole grid in one vectorized pass
+(numpy when installed, a per-row array loop otherwise). Afterwards the
+grid is maintained incrementally: listing changes from the change feed
+only mark rows dirty (recomputed on next read), and new bookings or
+competitor observations recompute just the affected nights of one row.
+
+Bookings and competitor observations persist to
+`data/price_grid_inputs.json`, shared by all workers: writes re-read the
+file under a `FileLock` before applying their change, and reads pick up
+other workers' saves, recomputing the affected rows. The grid itself is
+derived data, rebuilt when the date rolls over, on the next pricing run,
+or on the next read after the change feed resets (changes were missed).
+"""
+import asyncio
+import datetime
+import logging
+import math
+import os
+from array import array
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.change_feed import feed as change_feed
+from app.services.listing_service import DATA_FILE, get_listing_table
+from app.utils.interprocess import FileLock
+from app.utils.serialization import json_dumps, json_loads
+from app.utils.tracing import traced
+
+try:
+    import numpy as np # type: ignore
+except Exception:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HORIZON_DAYS = 365
+# Friday and Saturday nights.
+WEEKEND_UPLIFT = 1.15
+SEASONAL_FACTORS = {1: 0.9, 2: 0.9, 3: 0.95, 4: 1.0, 5: 1.05, 6: 1.15, 7: 1.25, 8: 1.25, 9: 1.05, 10: 1.0, 11: 0.9, 12: 1.1}
+# Weight of the competitor target (competitor price - 1, as in the pricing agent).
+COMPETITOR_WEIGHT = 0.5
+# Free runs of at most this many nights between two bookings are discounted.
+ORPHAN_MAX_NIGHTS = 2
+ORPHAN_DISCOUNT = 0.85
+
+INPUTS_FILE = os.path.join(os.path.dirname(DATA_FILE), "price_grid_inputs.json")
+
+_NAN = float("nan")
+
+
+def _today() -> datetime.date:
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def day_factors(origin: datetime.date, horizon: int = HORIZON_DAYS) -> List[float]:
+    factors = []
+    for k in range(horizon):
+        d = origin + datetime.timedelta(days=k)
+        f = SEASONAL_FACTORS.get(d.month, 1.0)
+        if d.weekday() in (4, 5):
+            f *= WEEKEND_UPLIFT
+        factors.append(f)
+    return factors
+
+
+def _is_orphan(booked: Set[int], night: int) -> bool:
+    if not booked or night in booked:
+        return False
+    run = 1
+    lo = night - 1
+    while lo not in booked:
+        run += 1
+        lo -= 1
+        if run > ORPHAN_MAX_NIGHTS:
+            return False
+    hi = night + 1
+    while hi not in booked:
+        run += 1
+        hi += 1
+        if run > ORPHAN_MAX_NIGHTS:
+            return False
+    return True
+
+
+class PriceGrid:
+    def __init__(self, horizon: int = HORIZON_DAYS):
+        self.horizon = horizon
+        self.origin: Optional[datetime.date] = None
+        self.factors: List[float] = []
+        self.ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        # Per-row inputs; NaN means "no constraint".
+        self.base = array("d")
+        self.min_price = array("d")
+        self.max_price = array("d")
+        self.values = array("f")
+        # Shared with the module-level inputs (keyed by listing id, nights as
+        # date ordinals so they survive the daily roll-over).
+        self.bookings: Dict[str, Set[int]] = {}
+        self.competitors: Dict[str, Dict[int, float]] = {}
+
+    def __contains__(self, listing_id: str) -> bool:
+        return listing_id in self._index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # --- cell computation -----------------------------------------------
+
+    def _adjust(self, listing_id: str, night: int, value: float) -> float:
+        comp = self.competitors.get(listing_id)
+        if comp and night in comp:
+            value = (1.0 - COMPETITOR_WEIGHT) * value + COMPETITOR_WEIGHT * (comp[night] - 1.0)
+        booked = self.bookings.get(listing_id)
+        if booked and _is_orphan(booked, night):
+            value *= ORPHAN_DISCOUNT
+        return value
+
+    def _clamp(self, i: int, value: float) -> float:
+        lo, hi = self.min_price[i], self.max_price[i]
+        if not math.isnan(lo):
+            value = max(value, lo)
+        if not math.isnan(hi):
+            value = min(value, hi)
+        return max(0.0, value)
+
+    def _has_adjustments(self, listing_id: str) -> bool:
+        return bool(self.competitors.get(listing_id)) or bool(self.bookings.get(listing_id))
+
+    def _compute_cells(self, i: int, days: Iterable[int]) -> None:
+        listing_id = self.ids[i]
+        base = self.base[i]
+        start_ordinal = self.origin.toordinal()
+        row = i * self.horizon
+        for k in days:
+            value = base * self.factors[k]
+            value = self._adjust(listing_id, start_ordinal + k, value)
+            self.values[row + k] = self._clamp(i, value)
+
+    # --- bulk build -----------------------------------------------------
+
+    def rebuild(self, origin: datetime.date, ids: List[str], base: array, min_price: array, max_price: array) -> None:
+        self.origin = origin
+        self.factors = day_factors(origin, self.horizon)
+        self.ids = list(ids)
+        self._index = {listing_id: i for i, listing_id in enumerate(self.ids)}
+        self.base, self.min_price, self.max_price = base, min_price, max_price
+        n, h = len(self.ids), self.horizon
+        start_ordinal = origin.toordinal()
+
+        if np is not None and n:
+            grid = np.outer(np.frombuffer(base, dtype=np.float64), np.asarray(self.factors, dtype=np.float64))
+            # Sparse per-night adjustments only touch listings with inputs.
+            for i, listing_id in enumerate(self.ids):
+                if self._has_adjustments(listing_id):
+                    row = grid[i]
+                    for k in range(h):
+                        row[k] = self._adjust(listing_id, start_ordinal + k, row[k])
+            lo = np.frombuffer(min_price, dtype=np.float64)[:, None]
+            hi = np.frombuffer(max_price, dtype=np.float64)[:, None]
+            grid = np.fmax(grid, lo)  # fmax/fmin ignore NaN bounds
+            grid = np.fmin(grid, hi)
+            np.maximum(grid, 0.0, out=grid)
+            values = array("f")
+            values.frombytes(grid.astype(np.float32).tobytes())
+            self.values = values
+            return
+
+        self.values = array("f", bytes(4 * n * h))
+        factors = self.factors
+        for i, listing_id in enumerate(self.ids):
+            if self._has_adjustments(listing_id) or not math.isnan(min_price[i]) or not math.isnan(max_price[i]):
+                self._compute_cells(i, range(h))
+            else:
+                b = base[i]
+                self.values[i * h:(i + 1) * h] = array("f", [max(0.0, b * f) for f in factors])
+
+    # --- incremental maintenance ----------------------------------------
+
+    def update_row(self, listing_id: str, base: float, min_price: float, max_price: float) -> None:
+        i = self._index.get(listing_id)
+        if i is None:
+            i = len(self.ids)
+            self.ids.append(listing_id)
+            self._index[listing_id] = i
+            self.base.append(base)
+            self.min_price.append(min_price)
+            self.max_price.append(max_price)
+            self.values.extend(array("f", bytes(4 * self.horizon)))
+        else:
+            self.base[i], self.min_price[i], self.max_price[i] = base, min_price, max_price
+        self._compute_cells(i, range(self.horizon))
+
+    def remove_row(self, listing_id: str) -> None:
+        i = self._index.pop(listing_id, None)
+        if i is None:
+            return
+        last = len(self.ids) - 1
+        h = self.horizon
+        if i != last:
+            # Move the last row into the hole; grid order is irrelevant.
+            moved = self.ids[last]
+            self.ids[i] = moved
+            self._index[moved] = i
+            self.base[i], self.min_price[i], self.max_price[i] = self.base[last], self.min_price[last], self.max_price[last]
+            self.values[i * h:(i + 1) * h] = self.values[last * h:(last + 1) * h]
+        self.ids.pop()
+        for column in (self.base, self.min_price, self.max_price):
+            column.pop()
+        del self.values[last * h:]
+
+    def recompute_nights(self, listing_id: str, nights: Iterable[int]) -> int:
+        """Recompute the given night ordinals of one row; returns cells touched."""
+        i = self._index.get(listing_id)
+        if i is None or self.origin is None:
+            return 0
+        start = self.origin.toordinal()
+        days = sorted({n - start for n in nights if 0 <= n - start < self.horizon})
+        self._compute_cells(i, days)
+        return len(days)
+
+    def nights(self, listing_id: str, start: datetime.date, end: datetime.date) -> Optional[List[Dict[str, Any]]]:
+        i = self._index.get(listing_id)
+        if i is None or self.origin is None:
+            return None
+        first = max((start - self.origin).days, 0)
+        last = min((end - self.origin).days, self.horizon)
+        booked = self.bookings.get(listing_id, set())
+        row = i * self.horizon
+        out = []
+        for k in range(first, last):
+            d = self.origin + datetime.timedelta(days=k)
+            out.append({"date": d.isoformat(), "price": round(float(self.values[row + k]), 2), "booked": d.toordinal() in booked})
+        return out
+
+
+# --- module state -----------------------------------------------------------
+
+_grid = PriceGrid()
+_bookings: Dict[str, Set[int]] = {}
+_competitors: Dict[str, Dict[int, float]] = {}
+_inputs_key: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of the file the inputs came from
+_inputs_lock = asyncio.Lock()
+_inputs_file_lock: Optional[FileLock] = None
+# Listings whose base price/constraints changed since their row was computed.
+_dirty: Set[str] = set()
+_build_lock = asyncio.Lock()
+# Bumped on every feed reset; a rebuild that spans one is redone.
+_resets = 0
+
+
+def _row_inputs(table, i: int) -> Tuple[float, float, float]:
+    price = table.prices[i]
+    base = 0.0 if math.isnan(price) else price
+    constraints = table.extra(i, "constraints") or {}
+    lo = constraints.get("min_price")
+    hi = constraints.get("max_price")
+    return base, float(lo) if lo is not None else _NAN, float(hi) if hi is not None else _NAN
+
+
+def _grid_inputs_sync(table) -> Tuple[List[str], array, array, array]:
+    base, lo, hi = array("d"), array("d"), array("d")
+    for i in range(len(table)):
+        b, mn, mx = _row_inputs(table, i)
+        base.append(b)
+        lo.append(mn)
+        hi.append(mx)
+    return list(table.ids), base, lo, hi
+
+
+def _inputs_file_key() -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(INPUTS_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_inputs_sync(known: Optional[Tuple[int, int]]):
+    """`(key, bookings, competitors)` from the inputs file, or None if it is still `known`."""
+    key = _inputs_file_key()
+    if key == known:
+        return None
+    bookings: Dict[str, Set[int]] = {}
+    competitors: Dict[str, Dict[int, float]] = {}
+    if key is not None:
+        with open(INPUTS_FILE, "rb") as f:
+            raw = json_loads(f.read())
+        for listing_id, nights in raw.get("bookings", {}).items():
+            bookings[listing_id] = {datetime.date.fromisoformat(n).toordinal() for n in nights}
+        for listing_id, prices in raw.get("competitors", {}).items():
+            competitors[listing_id] = {datetime.date.fromisoformat(n).toordinal(): float(p) for n, p in prices.items()}
+    return key, bookings, competitors
+
+
+async def _reload_inputs() -> None:
+    """Adopt the inputs file if another worker saved it; callers hold `_inputs_lock`."""
+    global _inputs_key
+    loaded = await asyncio.to_thread(_read_inputs_sync, _inputs_key)
+    if loaded is None:
+        return
+    key, bookings, competitors = loaded
+    changed = {lid for lid in _bookings.keys() | bookings.keys() if _bookings.get(lid) != bookings.get(lid)}
+    changed.update(lid for lid in _competitors.keys() | competitors.keys() if _competitors.get(lid) != competitors.get(lid))
+    # Updated in place: the grid shares these dicts.
+    _bookings.clear()
+    _bookings.update(bookings)
+    _competitors.clear()
+    _competitors.update(competitors)
+    _inputs_key = key
+    _dirty.update(changed)
+
+
+async def _refresh_inputs() -> None:
+    async with _inputs_lock:
+        await _reload_inputs()
+
+
+@asynccontextmanager
+async def _inputs_locked():
+    """Exclusive access to the inputs across coroutines and workers, freshly re-read."""
+    global _inputs_file_lock
+    async with _inputs_lock:
+        if _inputs_file_lock is None:
+            _inputs_file_lock = FileLock(INPUTS_FILE + ".lock")
+        await _inputs_file_lock.acquire()
+        try:
+            await _reload_inputs()
+            yield
+        finally:
+            _inputs_file_lock.release()
+
+
+def _save_inputs_sync(payload: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    os.makedirs(os.path.dirname(INPUTS_FILE), exist_ok=True)
+    tmp = INPUTS_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(json_dumps(payload))
+    os.replace(tmp, INPUTS_FILE)
+    return _inputs_file_key()
+
+
+async def _save_inputs() -> None:
+    """Write the inputs back; callers hold `_inputs_locked()`."""
+    global _inputs_key
+    iso = datetime.date.fromordinal
+    payload = {
+        "bookings": {lid: sorted(iso(n).isoformat() for n in nights) for lid, nights in _bookings.items() if nights},
+        "competitors": {lid: {iso(n).isoformat(): p for n, p in sorted(obs.items())} for lid, obs in _competitors.items() if obs},
+    }
+    _inputs_key = await asyncio.to_thread(_save_inputs_sync, payload)
+
+
+def _prune_past(today: datetime.date) -> None:
+    cutoff = today.toordinal() - ORPHAN_MAX_NIGHTS - 1
+    for nights in _bookings.values():
+        nights.difference_update([n for n in nights if n < cutoff])
+    for obs in _competitors.values():
+        for n in [n for n in obs if n < today.toordinal()]:
+            del obs[n]
+
+
+@traced("price_grid.rebuild_price_grid")
+async def rebuild_price_grid() -> Dict[str, Any]:
+    """Recompute the full grid for all listings in one vectorized pass."""
+    global _grid
+    async with _build_lock:
+        while True:
+            await _refresh_inputs()
+            today = _today()
+            _prune_past(today)
+            table = await get_listing_table()
+            # Snapshot the table synchronously: changes from here on mark rows
+            # dirty and are applied to the new grid on the next read.
+            resets, snapshot = _resets, table.copy()
+            _dirty.clear()
+            ids, base, lo, hi = await asyncio.to_thread(_grid_inputs_sync, snapshot)
+            grid = PriceGrid()
+            grid.bookings, grid.competitors = _bookings, _competitors
+            await asyncio.to_thread(grid.rebuild, today, ids, base, lo, hi)
+            if resets == _resets:
+                break
+        _grid = grid
+        return {"listings": len(ids), "origin": today.isoformat(), "horizon_days": grid.horizon, "bytes": grid.values.itemsize * len(grid.values)}
+
+
+async def _ensure_current() -> PriceGrid:
+    if _grid.origin != _today():
+        await rebuild_price_grid()
+    else:
+        await _refresh_inputs()
+    if _dirty:
+        table = await get_listing_table()
+        for listing_id in list(_dirty):
+            i = table.index_of(listing_id)
+            if i >= 0:
+                _grid.update_row(listing_id, *_row_inputs(table, i))
+            else:
+                _grid.remove_row(listing_id)
+            _dirty.discard(listing_id)
+    return _grid
+
+
+@traced("price_grid.get_nightly_prices")
+async def get_nightly_prices(listing_id: str, start: datetime.date, end: datetime.date) -> Optional[List[Dict[str, Any]]]:
+    """Nightly prices for `[start, end)` or None if the listing is unknown."""
+    grid = await _ensure_current()
+    return grid.nights(listing_id, start, end)
+
+
+def _nights(start: datetime.date, end: datetime.date) -> range:
+    return range(start.toordinal(), end.toordinal())
+
+
+async def record_booking(listing_id: str, start: datetime.date, end: datetime.date) -> int:
+    """Mark nights `[start, end)` booked; recomputes only nearby nights."""
+    grid = await _ensure_current()
+    async with _inputs_locked():
+        _bookings.setdefault(listing_id, set()).update(_nights(start, end))
+        await _save_inputs()
+    # Orphan status can change up to ORPHAN_MAX_NIGHTS around the booking.
+    margin = datetime.timedelta(days=ORPHAN_MAX_NIGHTS + 1)
+    return grid.recompute_nights(listing_id, _nights(start - margin, end + margin))
+
+
+async def record_competitor_prices(listing_id: str, prices: Dict[datetime.date, float]) -> int:
+    """Store observed competitor prices per night; recomputes only those nights."""
+    grid = await _ensure_current()
+    async with _inputs_locked():
+        obs = _competitors.setdefault(listing_id, {})
+        for night, price in prices.items():
+            obs[night.toordinal()] = float(price)
+        await _save_inputs()
+    return grid.recompute_nights(listing_id, [n.toordinal() for n in prices])
+
+
+def _on_listing_changes(changes: List[Dict[str, Any]]) -> None:
+    # Rows are refreshed (or dropped) lazily on the next read, so a change
+    # arriving mid-rebuild is applied to the new grid rather than lost.
+    _dirty.update(change["id"] for change in changes)
+
+
+def _on_feed_reset() -> None:
+    global _grid, _resets
+    # A grid with no origin is rebuilt on the next read.
+    _grid = PriceGrid()
+    _resets += 1
+
+
+change_feed.subscribe(_on_listing_changes, on_reset=_on_feed_reset)
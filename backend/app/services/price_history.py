@@ -0,0 +1,538 @@
+"""Append-only price history for every listing.
+
+Each price change (create, `update_listing`, `adjust_price`,
+`adjust_all_dynamic`, pricing-agent runs) becomes one fixed-size record in
+`data/price_history.bin`:
+
+    <Q seq> <d ts> <I listing number> <f price>     (24 bytes, little endian)
+
+`seq` is the change-feed sequence of the write (0 for seeded and
+downsampled points).
+
+Listing numbers index `data/price_history.ids` (one id per line), so the
+record file never stores a UUID twice. In memory each listing has two
+parallel arrays, `array('d')` timestamps and `array('f')` prices, sorted by
+time; range lookups are a bisect.
+
+Changes arrive from the change feed (`local_only`, so only the worker that
+made a write records it) and are appended in batches under a `FileLock`;
+like the ops journal, each worker replays what the others appended before
+touching the file. History starts, for listings without any, at the price
+they have when the store is first loaded.
+
+Memory and file size are bounded by downsampling: points older than
+`RAW_RETENTION_S` are reduced to the last price of each `DOWNSAMPLE_S`
+bucket (the daily close), and the file is compacted to match.
+
+Queries treat a price as in effect until the next change, so window
+aggregates use the time-weighted mean price of each listing.
+`portfolio_summary` computes those for every listing and window and
+reports their distribution (min, max, mean, percentiles) per window;
+vectorized with numpy when installed.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+import struct
+import time
+from array import array
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+from app.services.change_feed import feed as change_feed
+from app.services.listing_service import DATA_FILE, get_listing_table
+from app.utils.interprocess import FileLock
+from app.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = os.path.join(os.path.dirname(DATA_FILE), "price_history.bin")
+IDS_FILE = os.path.join(os.path.dirname(DATA_FILE), "price_history.ids")
+
+RECORD = struct.Struct("<QdIf")  # seq, ts, listing number, price
+
+RAW_RETENTION_S = 30 * 86400
+DOWNSAMPLE_S = 86400
+COMPACT_INTERVAL_S = 6 * 3600
+# Batch feed changes for this long before appending.
+FLUSH_DELAY_S = 0.5
+MAX_BUCKETS = 1000
+# Windows evaluated per numpy pass in `portfolio_summary`, bounding the
+# temporary arrays to listings x this many floats.
+_BUCKET_CHUNK = 32
+
+Point = Tuple[int, str, float, float]  # seq, listing id, ts, price
+
+
+def _f32(value: float) -> float:
+    """`value` at the float32 precision prices are stored with."""
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile of sorted `values` (numpy's default)."""
+    pos = (len(values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def _twaps(ts: Sequence[float], px: Sequence[float], bounds: Sequence[float]) -> List[float]:
+    """Time-weighted mean price over each `[bounds[k], bounds[k+1])`; NaN where not covered.
+
+    One pass over the points: `i` is the point in effect at the window start.
+    """
+    out = []
+    n = len(ts)
+    i = bisect.bisect_right(ts, bounds[0]) - 1
+    for a, b in zip(bounds, bounds[1:]):
+        nxt = ts[i + 1] if i + 1 < n else math.inf
+        if nxt >= b:
+            # No change inside the window (the common case).
+            out.append(px[i] if i >= 0 else math.nan)
+            continue
+        area = covered = 0.0
+        t = a
+        while True:
+            end = nxt if nxt < b else b
+            if i >= 0 and end > t:
+                area += px[i] * (end - t)
+                covered += end - t
+            if nxt >= b:
+                break
+            t, i = nxt, i + 1
+            nxt = ts[i + 1] if i + 1 < n else math.inf
+        out.append(area / covered if covered > 0 else math.nan)
+    return out
+
+
+async def _call(offload: bool, fn, *args):
+    return await asyncio.to_thread(fn, *args) if offload else fn(*args)
+
+
+def _round(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(value, 2)
+
+
+class PriceHistory:
+    def __init__(self, path: str, ids_path: str):
+        self.path = path
+        self.ids_path = ids_path
+        self.ids: List[str] = []
+        self.numbers: Dict[str, int] = {}
+        self.ts: List[array] = []  # per listing number, sorted
+        self.px: List[array] = []
+        self.points = 0
+        self.version = 0
+        self._flat: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._lock = asyncio.Lock()
+        self._file_lock: Optional[FileLock] = None
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._ids_offset = 0
+        self._records = 0
+        self._compacted_at = 0.0
+
+    # --- in-memory series ----------------------------------------------
+
+    def _clear(self) -> None:
+        # Listing numbers stay valid: the ids file is never rewritten.
+        for series in self.ts:
+            del series[:]
+        for series in self.px:
+            del series[:]
+        self.points = 0
+        self._offset = 0
+        self._records = 0
+        self.version += 1
+
+    def _add_id(self, listing_id: str) -> int:
+        no = self.numbers.get(listing_id)
+        if no is None:
+            no = self.numbers[listing_id] = len(self.ids)
+            self.ids.append(listing_id)
+            self.ts.append(array("d"))
+            self.px.append(array("f"))
+        return no
+
+    def price_at(self, no: int, ts: float) -> Optional[float]:
+        i = bisect.bisect_right(self.ts[no], ts) - 1
+        return self.px[no][i] if i >= 0 else None
+
+    def _apply(self, no: int, ts: float, price: float) -> None:
+        series = self.ts[no]
+        if not series or ts >= series[-1]:
+            series.append(ts)
+            self.px[no].append(price)
+        else:
+            # A slightly late batch from another worker.
+            i = bisect.bisect_right(series, ts)
+            series.insert(i, ts)
+            self.px[no].insert(i, price)
+        self.points += 1
+        self.version += 1
+
+    # --- files ------------------------------------------------------------
+
+    def _read_tail_sync(self) -> Tuple[List[str], Optional[int], bool, bytes]:
+        """(new ids, inode, reset, new complete records) since the applied offsets."""
+        new_ids: List[str] = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "rb") as f:
+                f.seek(self._ids_offset)
+                data = f.read()
+            data = data[:data.rfind(b"\n") + 1]
+            self._ids_offset += len(data)
+            new_ids = data.decode("utf-8").splitlines()
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return new_ids, None, self._inode is not None, b""
+        reset = st.st_ino != self._inode or st.st_size < self._offset
+        offset = 0 if reset else self._offset
+        if st.st_size == offset:
+            return new_ids, st.st_ino, reset, b""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        return new_ids, st.st_ino, reset, data[:len(data) - len(data) % RECORD.size]
+
+    async def _refresh(self, offload: bool = False) -> None:
+        tail = await asyncio.to_thread(self._read_tail_sync)
+        await _call(offload, self._replay, *tail)
+
+    def _replay(self, new_ids: List[str], inode: Optional[int], reset: bool, data: bytes) -> None:
+        for listing_id in new_ids:
+            self._add_id(listing_id)
+        if reset:
+            self._clear()
+        self._inode = inode
+        for _, ts, no, price in RECORD.iter_unpack(data):
+            self._apply(no, ts, price)
+        self._records += len(data) // RECORD.size
+        self._offset += len(data)
+
+    def _append_sync(self, new_ids: List[str], records: List[Tuple[int, float, int, float]]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if new_ids:
+            # Ids first, so a reader never sees a record for an unknown number.
+            with open(self.ids_path, "ab") as f:
+                f.write("".join(i + "\n" for i in new_ids).encode("utf-8"))
+                self._ids_offset = f.tell()
+        with open(self.path, "ab") as f:
+            f.write(b"".join(RECORD.pack(*r) for r in records))
+            self._offset = f.tell()
+        self._inode = os.stat(self.path).st_ino
+
+    def _compact_sync(self, records: List[Tuple[int, float, int, float]]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(RECORD.pack(*r) for r in records))
+        os.replace(tmp, self.path)
+
+    @asynccontextmanager
+    async def locked(self, offload: bool = False):
+        """Exclusive access across coroutines and workers, with the files replayed.
+
+        `offload` replays (and compacts) in a worker thread, for loads where
+        nothing else reads the history yet.
+        """
+        async with self._lock:
+            if self._file_lock is None:
+                self._file_lock = FileLock(self.path + ".lock")
+            await self._file_lock.acquire()
+            try:
+                await self._refresh(offload)
+                now = time.time()
+                if now - self._compacted_at > COMPACT_INTERVAL_S or self._records > 2 * self.points + 100000:
+                    await self._compact(now, offload)
+                yield self
+            finally:
+                self._file_lock.release()
+
+    async def _compact(self, now: float, offload: bool = False) -> None:
+        """Downsample points older than `RAW_RETENTION_S` and rewrite the file."""
+        records = await _call(offload, self._compacted_records, now - RAW_RETENTION_S)
+        await asyncio.to_thread(self._compact_sync, records)
+        self._inode = None
+        self._clear()
+        await self._refresh(offload)
+        self._compacted_at = now
+        logger.info("Compacted price history to %d points", self.points)
+
+    def _compacted_records(self, cutoff: float) -> List[Tuple[int, float, int, float]]:
+        records: List[Tuple[int, float, int, float]] = []
+        for no, (ts, px) in enumerate(zip(self.ts, self.px)):
+            last_price = None
+            for k in range(len(ts)):
+                t, p = ts[k], px[k]
+                # Old points: keep only the last of each bucket (its close).
+                if t < cutoff and k + 1 < len(ts) and ts[k + 1] < cutoff and ts[k + 1] // DOWNSAMPLE_S == t // DOWNSAMPLE_S:
+                    continue
+                if p == last_price:
+                    continue
+                records.append((0, t, no, p))
+                last_price = p
+        return records
+
+    async def write(self, points: List[Point], offload: bool = False) -> int:
+        """Record the points that change a listing's price; call inside `locked()`."""
+        n_ids, ids_offset = len(self.ids), self._ids_offset
+        new_ids, records = await _call(offload, self._stage, points)
+        if records or new_ids:
+            try:
+                await asyncio.to_thread(self._append_sync, new_ids, records)
+            except BaseException:
+                self._discard(n_ids, ids_offset)
+                raise
+            self._records += len(records)
+        return len(records)
+
+    def _discard(self, n_ids: int, ids_offset: int) -> None:
+        """Undo a failed append: forget staged ids and replay the files next time."""
+        for listing_id in self.ids[n_ids:]:
+            del self.numbers[listing_id]
+        del self.ids[n_ids:], self.ts[n_ids:], self.px[n_ids:]
+        self._ids_offset = ids_offset
+        self._inode = None
+        self._clear()
+
+    def _stage(self, points: List[Point]) -> Tuple[List[str], List[Tuple[int, float, int, float]]]:
+        """Apply `points` in memory; returns the new ids and records to append."""
+        new_ids: List[str] = []
+        records: List[Tuple[int, float, int, float]] = []
+        for seq, listing_id, ts, price in sorted(points, key=lambda p: p[2]):
+            if listing_id not in self.numbers:
+                new_ids.append(listing_id)
+            no = self._add_id(listing_id)
+            price = _f32(price)
+            if self.price_at(no, ts) == price:
+                continue
+            self._apply(no, ts, price)
+            records.append((seq, ts, no, price))
+        return new_ids, records
+
+    # --- queries ----------------------------------------------------------
+
+    def series(self, listing_id: str, start: float, end: float) -> Tuple[List[float], List[float]]:
+        """Points in `[start, end)`, led by the price in effect at `start` (if any)."""
+        no = self.numbers.get(listing_id)
+        if no is None:
+            return [], []
+        ts, px = self.ts[no], self.px[no]
+        lo = bisect.bisect_right(ts, start) - 1
+        hi = bisect.bisect_left(ts, end)
+        lo = max(lo, 0)
+        return list(ts[lo:hi]), list(px[lo:hi])
+
+    def _flat_arrays(self) -> Dict[str, Any]:
+        """Every series concatenated, with cumulative price x time, for numpy queries."""
+        if self._flat is not None and self._flat[0] == self.version:
+            return self._flat[1]
+        nos = [no for no, ts in enumerate(self.ts) if len(ts)]
+        counts = np.array([len(self.ts[no]) for no in nos], dtype=np.int64)
+        ts = np.concatenate([np.frombuffer(self.ts[no], dtype=np.float64) for no in nos]) if nos else np.zeros(0)
+        px = np.concatenate([np.frombuffer(self.px[no], dtype=np.float32) for no in nos]).astype(np.float64) if nos else np.zeros(0)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64) if nos else np.zeros(0, dtype=np.int64)
+        owner = np.repeat(np.arange(len(nos)), counts)
+        dur = np.diff(ts, append=ts[-1:]) if len(ts) else ts
+        if len(ts):
+            dur[starts + counts - 1] = 0.0  # a series' last price runs to "now", handled at query time
+        cum = np.concatenate([[0.0], np.cumsum(px * dur)[:-1]]) if len(ts) else ts
+        flat = {"nos": nos, "ts": ts, "px": px, "starts": starts, "owner": owner, "cum": cum}
+        self._flat = (self.version, flat)
+        return flat
+
+    @staticmethod
+    def _twap_matrix(f: Dict[str, Any], bounds: Sequence[float]) -> Any:
+        """listings x windows time-weighted means (NaN where a listing has no data)."""
+        n = len(f["nos"])
+        q = np.asarray(bounds, dtype=np.float64)
+        if not n:
+            return np.zeros((0, len(q) - 1))
+        ts, px, cum, starts, owner = f["ts"], f["px"], f["cum"], f["starts"], f["owner"]
+        t0 = float(ts.min())
+        span = max(float(ts.max()), float(q.max())) - t0 + 1.0
+        keys = owner * span + (ts - t0)
+        listing = np.arange(n)[:, None]
+        # Bounds before all data sort just after the previous listing's points.
+        qkeys = listing * span + (np.maximum(q, t0 - 0.5) - t0)[None, :]
+        j = np.searchsorted(keys, qkeys, side="right") - 1
+        valid = (j >= 0) & (owner[np.maximum(j, 0)] == listing)
+        jj = np.where(valid, j, starts[:, None])
+        qq = q[None, :]
+        integral = np.where(valid, cum[jj] + px[jj] * (qq - ts[jj]), cum[starts][:, None])
+        covered = np.maximum(0.0, qq - ts[starts][:, None])
+        area = np.diff(integral, axis=1)
+        time_ = np.diff(covered, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(time_ > 0, area / time_, np.nan)
+
+    def portfolio(self, start: float, end: float, bucket_s: float, percentiles: Sequence[float],
+                  flat: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Per-window distribution across listings; pass `flat` to run off the event loop."""
+        if np is not None and flat is None:
+            flat = self._flat_arrays()
+        n_buckets = max(1, math.ceil((end - start) / bucket_s))
+        bounds = [start + k * bucket_s for k in range(n_buckets)] + [end]
+        windows: List[Dict[str, Any]] = []
+        for c in range(0, n_buckets, _BUCKET_CHUNK):
+            chunk = bounds[c:c + _BUCKET_CHUNK + 1]
+            if np is not None:
+                matrix = self._twap_matrix(flat, chunk)
+                columns = [col[~np.isnan(col)] for col in matrix.T]
+            else:
+                per_listing = [_twaps(ts, px, chunk) for ts, px in zip(self.ts, self.px) if len(ts)]
+                columns = [[row[k] for row in per_listing if not math.isnan(row[k])] for k in range(len(chunk) - 1)]
+            for k, values in enumerate(columns):
+                window: Dict[str, Any] = {"start": chunk[k], "end": chunk[k + 1], "listings": int(len(values))}
+                if len(values):
+                    ordered = sorted(values) if np is None else np.sort(values)
+                    window.update({
+                        "min": round(float(ordered[0]), 2),
+                        "max": round(float(ordered[-1]), 2),
+                        "mean": round(float(sum(ordered) / len(ordered) if np is None else ordered.mean()), 2),
+                        **{f"p{p:g}": round(float(_percentile(ordered, p)), 2) for p in percentiles},
+                    })
+                windows.append(window)
+        return windows
+
+
+_history = PriceHistory(HISTORY_FILE, IDS_FILE)
+_loaded = False
+_load_lock = asyncio.Lock()
+
+_buffer: List[Point] = []
+_flusher: Optional[asyncio.Task] = None
+
+
+async def ensure_loaded() -> PriceHistory:
+    """Replay the history files; seed listings that have no history yet."""
+    global _loaded
+    if _loaded:
+        return _history
+    async with _load_lock:
+        if not _loaded:
+            table = await get_listing_table()
+            now = time.time()
+            # Listings with buffered changes start their history there instead.
+            buffered = {p[1] for p in _buffer}
+            # Nothing reads the history until it is loaded, so the replay
+            # and seeding run in worker threads.
+            async with _history.locked(offload=True) as history:
+                seed = []
+                for i in range(len(table)):
+                    listing_id, price = table.ids[i], table.prices[i]
+                    no = history.numbers.get(listing_id)
+                    if not math.isnan(price) and (no is None or not history.ts[no]) and listing_id not in buffered:
+                        seed.append((0, listing_id, now, price))
+                seeded = await history.write(seed, offload=True)
+            _loaded = True
+            logger.info("Loaded price history: %d points for %d listings (%d seeded)", history.points, len(history.ids), seeded)
+    return _history
+
+
+async def _flush_later() -> None:
+    await asyncio.sleep(FLUSH_DELAY_S)
+    try:
+        await flush()
+    except Exception:
+        logger.exception("Price history flush failed; %d points stay buffered", len(_buffer))
+
+
+async def flush() -> int:
+    """Append buffered changes now; returns the number of points recorded.
+
+    Also picks up other workers' appends, so queries call it first to see
+    every write, including this worker's still-buffered ones.
+    """
+    global _buffer
+    history = await ensure_loaded()
+    points, _buffer = _buffer, []
+    try:
+        async with history.locked():
+            return await history.write(points) if points else 0
+    except BaseException:
+        # Keep them for the next flush, ahead of anything buffered since.
+        _buffer[:0] = points
+        raise
+
+
+def _on_listing_changes(changes: List[Dict[str, Any]]) -> None:
+    global _flusher
+    for change in changes:
+        listing = change.get("listing")
+        if listing is None or not isinstance(listing.get("price"), (int, float)):
+            continue
+        no = _history.numbers.get(change["id"]) if _loaded else None
+        if no is not None and _history.price_at(no, change["ts"]) == _f32(listing["price"]):
+            continue  # not a price change
+        _buffer.append((change["seq"], change["id"], change["ts"], float(listing["price"])))
+    if not _buffer or (_flusher is not None and not _flusher.done()):
+        return
+    try:
+        _flusher = asyncio.get_running_loop().create_task(_flush_later())
+    except RuntimeError:
+        pass  # no loop: written by the next flush()
+
+
+change_feed.subscribe(_on_listing_changes, local_only=True)
+
+
+# --- queries -------------------------------------------------------------
+
+@traced("price_history.listing_price_history")
+async def listing_price_history(listing_id: str, start: float, end: float, bucket_s: Optional[float] = None) -> Dict[str, Any]:
+    """A listing's price changes in `[start, end)`, or per-window aggregates with `bucket_s`."""
+    await flush()
+    history = _history
+    ts, px = history.series(listing_id, start, end)
+    out: Dict[str, Any] = {"id": listing_id, "start": start, "end": end}
+    if not bucket_s:
+        out["points"] = [{"ts": t, "price": round(p, 2)} for t, p in zip(ts, px)]
+        return out
+    n_buckets = max(1, math.ceil((end - start) / bucket_s))
+    bounds = [start + k * bucket_s for k in range(n_buckets)] + [end]
+    windows = []
+    for a, b, twap in zip(bounds, bounds[1:], _twaps(ts, px, bounds) if ts else [math.nan] * n_buckets):
+        lo = max(bisect.bisect_right(ts, a) - 1, 0)
+        hi = bisect.bisect_left(ts, b)
+        prices = px[lo:hi] if math.isfinite(twap) else []
+        windows.append({
+            "start": a,
+            "end": b,
+            "mean": _round(twap),
+            "min": round(min(prices), 2) if prices else None,
+            "max": round(max(prices), 2) if prices else None,
+            "close": round(prices[-1], 2) if prices else None,
+            "changes": max(0, hi - bisect.bisect_right(ts, a)),
+        })
+    out["windows"] = windows
+    return out
+
+
+@traced("price_history.portfolio_summary")
+async def portfolio_summary(start: float, end: float, bucket_s: float, percentiles: Sequence[float] = (25, 50, 75, 90)) -> Dict[str, Any]:
+    """Distribution of listings' time-weighted mean price per window, across the portfolio."""
+    await flush()
+    history = _history
+    if np is not None:
+        # The flat arrays are an immutable snapshot, so the numpy work can
+        # leave the event loop; the pure-Python path reads live series.
+        flat = history._flat_arrays()
+        windows = await asyncio.to_thread(history.portfolio, start, end, bucket_s, percentiles, flat)
+    else:
+        windows = history.portfolio(start, end, bucket_s, percentiles)
+    return {"start": start, "end": end, "bucket_s": bucket_s, "windows": windows}
+
+
+async def stats() -> Dict[str, Any]:
+    history = await ensure_loaded()
+    return {"listings": len(history.ids), "points": history.points, "bytes": history._offset}
@@ -0,0 +1,266 @@
+"""In-process full-text search over listing titles, descriptions and addresses.
+
+An inverted index maps each token to `{doc: weighted term frequency}`;
+fields are weighted (`FIELD_WEIGHTS`) before BM25 scoring, so a title hit
+counts more than one in the description. Queries match all their tokens
+(AND); the last token also matches as a prefix (`"sea vi"` finds
+"sea view"), expanding to at most `PREFIX_EXPANSION` vocabulary terms
+found by bisecting a sorted vocabulary.
+
+The index is built from the resident listing table on first search (in a
+worker thread) and then kept current from the listing change feed, so
+creates, updates and deletes in `listing_service` are reflected without a
+rebuild. If the feed resets (changes were missed), the index is dropped and
+rebuilt on the next search.
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.change_feed import feed as change_feed
+from app.services.listing_service import get_listing_table
+from app.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {"title": 2.0, "address": 1.0, "description": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_EXPANSION = 64
+MAX_RESULTS = 10000
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._vocab: List[str] = []  # sorted, for prefix lookups
+        # Dense doc numbers; freed slots are reused.
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_of: Dict[str, int] = {}
+        self._doc_terms: List[Tuple[str, ...]] = []
+        self._doc_len = array("f")
+        self._free: List[int] = []
+        self._total_len = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_of)
+
+    @classmethod
+    def from_table(cls, table) -> "SearchIndex":
+        index = cls()
+        for i, listing_id in enumerate(table.ids):
+            index.upsert(listing_id, table.titles[i], table.extra(i, "description"), table.addresses[i])
+        return index
+
+    # --- maintenance ----------------------------------------------------
+
+    def upsert(self, listing_id: str, title: Optional[str], description: Optional[str], address: Optional[str]) -> None:
+        self.remove(listing_id)
+        tf: Dict[str, float] = {}
+        length = 0.0
+        for field, text in (("title", title), ("description", description), ("address", address)):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                tf[token] = tf.get(token, 0.0) + weight
+                length += weight
+        if self._free:
+            doc = self._free.pop()
+            self._doc_ids[doc] = listing_id
+            self._doc_terms[doc] = tuple(tf)
+            self._doc_len[doc] = length
+        else:
+            doc = len(self._doc_ids)
+            self._doc_ids.append(listing_id)
+            self._doc_terms.append(tuple(tf))
+            self._doc_len.append(length)
+        self._doc_of[listing_id] = doc
+        self._total_len += length
+        for token, freq in tf.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+            postings[doc] = freq
+
+    def remove(self, listing_id: str) -> bool:
+        doc = self._doc_of.pop(listing_id, None)
+        if doc is None:
+            return False
+        for token in self._doc_terms[doc]:
+            postings = self._postings[token]
+            del postings[doc]
+            if not postings:
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+        self._total_len -= self._doc_len[doc]
+        self._doc_ids[doc] = None
+        self._doc_terms[doc] = ()
+        self._doc_len[doc] = 0.0
+        self._free.append(doc)
+        return True
+
+    # --- querying -------------------------------------------------------
+
+    def _expand(self, prefix: str) -> List[str]:
+        lo = bisect.bisect_left(self._vocab, prefix)
+        hi = bisect.bisect_left(self._vocab, prefix + "\U0010ffff")
+        terms = self._vocab[lo:hi]
+        if len(terms) > PREFIX_EXPANSION:
+            terms = heapq.nlargest(PREFIX_EXPANSION, terms, key=lambda t: len(self._postings[t]))
+        return terms
+
+    def _term_scores(self, terms: Iterable[str], candidates: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """BM25 score per doc for one query token (max over its expansions).
+
+        With `candidates`, only those docs are scored (by posting lookup)
+        and the result is their running total; others are dropped.
+        """
+        n = len(self._doc_of)
+        avg_len = self._total_len / n if n else 1.0
+        doc_len = self._doc_len
+        k1, b = BM25_K1, BM25_B
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            if candidates is None:
+                pairs = postings.items()
+            else:
+                pairs = [(doc, postings[doc]) for doc in candidates if doc in postings]
+            for doc, tf in pairs:
+                s = idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * doc_len[doc] / avg_len))
+                if s > scores.get(doc, 0.0):
+                    scores[doc] = s
+        if candidates is not None:
+            return {doc: candidates[doc] + s for doc, s in scores.items()}
+        return scores
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, prefix: bool = True,
+               accept: Optional[Callable[[str], bool]] = None) -> Tuple[int, List[Tuple[str, float]]]:
+        """`(total_matches, [(listing_id, score), ...])` for one page.
+
+        `accept` filters matches by listing id before ranking, so totals and
+        pages only count accepted listings.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+        groups = [[t] for t in tokens]
+        if prefix:
+            groups[-1] = self._expand(tokens[-1]) or [tokens[-1]]
+        # Rarest token first: later tokens only score the surviving docs.
+        groups.sort(key=lambda g: sum(len(self._postings.get(t, ())) for t in g))
+        totals: Optional[Dict[int, float]] = None
+        for group in groups:
+            totals = self._term_scores(group, totals)
+            if accept is not None:
+                # Filtering the rarest token's matches keeps later groups cheap.
+                doc_ids = self._doc_ids
+                totals = {doc: score for doc, score in totals.items() if accept(doc_ids[doc])}
+                accept = None
+            if not totals:
+                return 0, []
+        top = heapq.nlargest(min(offset + limit, MAX_RESULTS), totals.items(), key=lambda kv: (kv[1], -kv[0]))
+        return len(totals), [(self._doc_ids[doc], round(score, 4)) for doc, score in top[offset:]]
+
+
+_index: Optional[SearchIndex] = None
+_build_lock = asyncio.Lock()
+# Feed changes that arrive while the index is being built.
+_backlog: Optional[List[Dict[str, Any]]] = None
+# Bumped on every feed reset; a build that spans one is discarded.
+_resets = 0
+
+
+async def ensure_index() -> SearchIndex:
+    """Build the index on first use; later changes arrive via the change feed.
+
+    The build runs in a worker thread over a snapshot of the table, so it
+    doesn't block the event loop; changes published meanwhile are queued
+    and applied before the index is used.
+    """
+    global _index, _backlog
+    if _index is not None:
+        return _index
+    async with _build_lock:
+        while _index is None:
+            table = await get_listing_table()
+            resets, snapshot, _backlog = _resets, table.copy(), []
+            try:
+                index = await asyncio.to_thread(SearchIndex.from_table, snapshot)
+                if resets == _resets:
+                    _apply(index, _backlog)
+                    _index = index
+                    logger.info("Built search index over %d listings", len(index))
+            finally:
+                _backlog = None
+    return _index
+
+
+def _apply(index: SearchIndex, changes: List[Dict[str, Any]]) -> None:
+    for change in changes:
+        listing = change.get("listing")
+        if change["op"] == "deleted" or listing is None:
+            index.remove(change["id"])
+        else:
+            index.upsert(change["id"], listing.get("title"), listing.get("description"), listing.get("address"))
+
+
+def _on_listing_changes(changes: List[Dict[str, Any]]) -> None:
+    if _index is None:
+        if _backlog is not None:
+            _backlog.extend(changes)
+        return
+    _apply(_index, changes)
+
+
+def _on_feed_reset() -> None:
+    global _index, _resets
+    _index = None
+    _resets += 1
+
+
+change_feed.subscribe(_on_listing_changes, on_reset=_on_feed_reset)
+
+
+@traced("search_index.search_listings")
+async def search_listings(query: str, limit: int = 20, offset: int = 0, available_only: bool = False) -> Dict[str, Any]:
+    """One page of listings matching `query`, best BM25 score first."""
+    # Reload the table first: a reload that resets the feed drops the index.
+    table = await get_listing_table()
+    index = await ensure_index()
+    accept = None
+    if available_only:
+        def accept(listing_id: str) -> bool:
+            i = table.index_of(listing_id)
+            return i >= 0 and table.is_available(i)
+    total, hits = index.search(query, limit=limit, offset=offset, accept=accept)
+    results = []
+    for listing_id, score in hits:
+        i = table.index_of(listing_id)
+        if i < 0:
+            continue
+        price = table.prices[i]
+        results.append({
+            "id": listing_id,
+            "title": table.titles[i],
+            "address": table.addresses[i],
+            "price": None if math.isnan(price) else price,
+            "available": table.is_available(i),
+            "score": score,
+        })
+    return {"query": query, "total": total, "offset": offset, "limit": limit, "results": results}
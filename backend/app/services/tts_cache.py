@@ -0,0 +1,278 @@
+"""Content-addressed on-disk cache for synthesized speech.
+
+Clips are keyed by the SHA-256 of `(text, voice, model, voice settings,
+media type)` and stored as `<TTS_CACHE_DIR>/<key[:2]>/<key>.<ext>`. Hits
+touch the file's mtime, so mtime order is the least-recently-used order
+across all workers sharing the directory. `TTS_CACHE_MAX_MB` bounds the
+whole directory, not each worker: after adding a clip, a worker takes a
+`FileLock` on the directory, rescans it and evicts the oldest clips until
+the total fits. Each worker's in-memory index of sizes is refreshed from
+that scan.
+
+Misses are generated once: the first request starts a background
+generation that appends chunks to a shared buffer and a `.part` file, and
+every request for the same key — including ones arriving mid-generation —
+streams from that buffer as chunks arrive. A client disconnecting doesn't
+cancel the generation, so the finished clip still lands in the cache.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.services.ai_service import stream_text_to_speech, tts_media_type
+from app.utils.interprocess import FileLock
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+_EXTENSIONS = {"audio/mpeg": "mp3", "audio/wav": "wav"}
+
+
+def cache_key(text: str, voice_id: str, model_id: str, voice_settings: Optional[Dict[str, Any]], media_type: str) -> str:
+    # Canonical JSON (sorted keys) so equal settings always hash the same.
+    material = json.dumps({
+        "text": text,
+        "voice": voice_id,
+        "model": model_id,
+        "settings": voice_settings or {},
+        "format": media_type,
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Generation:
+    """Chunks of one in-flight synthesis, readable by any number of streams."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+
+    async def append(self, chunk: bytes) -> None:
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        async with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    async def read(self) -> AsyncIterator[bytes]:
+        i = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: i < len(self.chunks) or self.done)
+                pending = self.chunks[i:]
+                done, error = self.done, self.error
+            for chunk in pending:
+                yield chunk
+            i += len(pending)
+            if done and i >= len(self.chunks):
+                if error is not None:
+                    raise RuntimeError("speech synthesis failed") from error
+                return
+
+
+class TTSResult:
+    __slots__ = ("key", "media_type", "status", "chunks")
+
+    def __init__(self, key: str, media_type: str, status: str, chunks: AsyncIterator[bytes]):
+        self.key = key
+        self.media_type = media_type
+        # `hit`, `miss` (this request started the generation) or `coalesced`.
+        self.status = status
+        self.chunks = chunks
+
+
+class AudioCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # path -> size, LRU first
+        self._total = 0
+        self._loaded = False
+        self._inflight: Dict[str, _Generation] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def path_for(self, key: str, media_type: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{_EXTENSIONS.get(media_type, 'bin')}")
+
+    # --- index ------------------------------------------------------------
+
+    def _scan_sync(self) -> List[tuple]:
+        found = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".part") or name.startswith("."):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+        found.sort()
+        return found
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        found = await asyncio.to_thread(self._scan_sync)
+        if not self._loaded:
+            for _, path, size in found:
+                self._entries[path] = size
+                self._total += size
+            self._loaded = True
+
+    def _touch(self, path: str) -> None:
+        self._entries.move_to_end(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(path)
+
+    def _forget(self, path: str) -> None:
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._total -= size
+
+    def _add(self, path: str, size: int) -> None:
+        self._forget(path)
+        self._entries[path] = size
+        self._total += size
+
+    def _evict_sync(self) -> List[tuple]:
+        """Delete the oldest clips until the directory fits; returns what is left."""
+        found = self._scan_sync()
+        total = sum(size for _, _, size in found)
+        evicted = 0
+        while total > self.max_bytes and len(found) - evicted > 1:
+            _, victim, size = found[evicted]
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        return found[evicted:]
+
+    async def _enforce_limit(self) -> None:
+        """Apply `max_bytes` to the shared directory, under its `FileLock`."""
+        lock = FileLock(os.path.join(self.root, ".lock"))
+        await lock.acquire()
+        try:
+            found = await asyncio.to_thread(self._evict_sync)
+        finally:
+            lock.release()
+        self._entries.clear()
+        self._total = 0
+        for _, path, size in found:
+            self._entries[path] = size
+            self._total += size
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes, "inflight": len(self._inflight)}
+
+    # --- reads ------------------------------------------------------------
+
+    async def _read_file(self, path: str) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            f.close()
+
+    async def _generate(self, key: str, path: str, gen: _Generation, text: str, voice_id: str, model_id: str,
+                        voice_settings: Optional[Dict[str, Any]]) -> None:
+        part = f"{path}.{os.getpid()}.part"
+        error: Optional[BaseException] = None
+        size = 0
+        try:
+            await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+            f = await asyncio.to_thread(open, part, "wb")
+            try:
+                async for chunk in stream_text_to_speech(text, voice_id, model_id, voice_settings):
+                    if not chunk:
+                        continue
+                    await gen.append(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+                    size += len(chunk)
+            finally:
+                f.close()
+            await asyncio.to_thread(os.replace, part, path)
+            self._add(path, size)
+            await self._enforce_limit()
+        except Exception as e:
+            logger.exception("Speech synthesis failed for %s", key[:12])
+            error = e
+            try:
+                os.remove(part)
+            except FileNotFoundError:
+                pass
+        finally:
+            self._inflight.pop(key, None)
+            self._tasks.pop(key, None)
+            await gen.finish(error)
+
+    async def get(self, text: str, voice_id: Optional[str] = None, model_id: Optional[str] = None,
+                  voice_settings: Optional[Dict[str, Any]] = None) -> TTSResult:
+        await self._ensure_loaded()
+        voice_id = voice_id or settings.ELEVENLABS_VOICE_ID
+        model_id = model_id or settings.ELEVENLABS_MODEL_ID
+        media_type = tts_media_type()
+        key = cache_key(text, voice_id, model_id, voice_settings, media_type)
+        path = self.path_for(key, media_type)
+
+        gen = self._inflight.get(key)
+        if gen is not None:
+            return TTSResult(key, media_type, "coalesced", gen.read())
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            self._forget(path)  # evicted, possibly by another worker
+        else:
+            if path not in self._entries:
+                # Written by another worker since we scanned.
+                self._add(path, size)
+            self._touch(path)
+            return TTSResult(key, media_type, "hit", self._read_file(path))
+
+        gen = self._inflight[key] = _Generation()
+        self._tasks[key] = asyncio.get_running_loop().create_task(
+            self._generate(key, path, gen, text, voice_id, model_id, voice_settings)
+        )
+        return TTSResult(key, media_type, "miss", gen.read())
+
+
+_cache: Optional[AudioCache] = None
+
+
+def get_cache() -> AudioCache:
+    global _cache
+    if _cache is None:
+        _cache = AudioCache(settings.TTS_CACHE_DIR, int(settings.TTS_CACHE_MAX_MB * 1024 * 1024))
+    return _cache
+
+
+async def synthesize(text: str, voice_id: Optional[str] = None, model_id: Optional[str] = None,
+                     voice_settings: Optional[Dict[str, Any]] = None) -> TTSResult:
+    """Cached, coalesced speech for `text`; iterate `result.chunks` to stream it."""
+    return await get_cache().get(text, voice_id, model_id, voice_settings)
+
+
+async def warm_cache() -> Dict[str, Any]:
+    """Index the on-disk cache ahead of the first request."""
+    cache = get_cache()
+    await cache._ensure_loaded()
+    return cache.stats()
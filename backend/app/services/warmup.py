@@ -0,0 +1,149 @@
+"""Startup warm-up and readiness tracking.
+
+`warm_up()` runs once from the app lifespan. The listing store loads
+first, then its dependent indexes (search, comp set, price grid, price history) build
+concurrently with the independent components (HTTP pool, ops task
+journal, TTS cache index and, if `WARMUP_LLM` is set, one probe per LLM
+route). The CPU-heavy builds run in worker threads over table snapshots,
+so the event loop keeps serving `/health` and `/ready` and the lifespan's
+`WARMUP_TIMEOUT_S` fires on time. The threads share the GIL, so a
+component's duration includes time spent waiting for the others. Each
+component's status and duration is recorded in `readiness`, served by
+`/ready`, and logged as a timing breakdown when warm-up ends.
+
+Only `REQUIRED` components gate readiness; the others are best effort and
+a failure there is reported but doesn't keep the instance out of rotation.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.services import comp_index, llm_service, ops_tasks, price_grid, price_history, search_index, tts_cache
+from app.services.listing_service import get_listing_table
+from app.utils.http import open_http_client
+
+logger = logging.getLogger(__name__)
+
+REQUIRED = ("listing_store", "search_index", "comp_index", "http_pool")
+
+
+class Readiness:
+    def __init__(self):
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def ready(self) -> bool:
+        return all(self.components.get(name, {}).get("status") == "ready" for name in REQUIRED)
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round(((self.finished_at or time.perf_counter()) - self.started_at) * 1000, 1)
+        return {
+            "ready": self.ready(),
+            "warmup_complete": self.finished_at is not None,
+            "warmup_ms": elapsed,
+            "components": self.components,
+        }
+
+
+readiness = Readiness()
+
+
+async def _component(name: str, fn: Callable[[], Awaitable[Any]]) -> None:
+    entry = readiness.components[name] = {"status": "pending", "required": name in REQUIRED}
+    started = time.perf_counter()
+    try:
+        detail = await fn()
+        entry["status"] = "ready"
+        if detail is not None:
+            entry["detail"] = detail
+    except Exception as e:
+        logger.exception("Warm-up of %s failed", name)
+        entry["status"] = "failed"
+        entry["error"] = str(e)
+    entry["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _listing_store() -> Dict[str, Any]:
+    return {"listings": len(await get_listing_table())}
+
+
+async def _search_index() -> Dict[str, Any]:
+    return {"documents": len(await search_index.ensure_index())}
+
+
+async def _comp_index() -> Dict[str, Any]:
+    return {"points": len(await comp_index.ensure_index())}
+
+
+async def _price_grid() -> Dict[str, Any]:
+    return await price_grid.rebuild_price_grid()
+
+
+async def _http_pool() -> None:
+    await open_http_client()
+
+
+async def _ops_tasks() -> Dict[str, Any]:
+    return await ops_tasks.stats()
+
+
+async def _price_history() -> Dict[str, Any]:
+    return await price_history.stats()
+
+
+async def _llm() -> Dict[str, Any]:
+    return await llm_service.get_router().probe()
+
+
+async def warm_up() -> Dict[str, Any]:
+    readiness.started_at = time.perf_counter()
+    readiness.finished_at = None
+    for name in ("listing_store", "search_index", "comp_index", "price_grid", "price_history", "http_pool", "ops_tasks", "tts_cache"):
+        readiness.components[name] = {"status": "pending", "required": name in REQUIRED}
+    if settings.WARMUP_LLM:
+        readiness.components["llm"] = {"status": "pending", "required": False}
+    else:
+        readiness.components["llm"] = {"status": "skipped", "required": False}
+
+    async def store_and_indexes() -> None:
+        await _component("listing_store", _listing_store)
+        if readiness.components["listing_store"]["status"] != "ready":
+            for name in ("search_index", "comp_index", "price_grid", "price_history"):
+                readiness.components[name] = {"status": "failed", "required": name in REQUIRED, "error": "listing store unavailable"}
+            return
+        await asyncio.gather(
+            _component("search_index", _search_index),
+            _component("comp_index", _comp_index),
+            _component("price_grid", _price_grid),
+            _component("price_history", _price_history),
+        )
+
+    jobs = [
+        store_and_indexes(),
+        _component("http_pool", _http_pool),
+        _component("ops_tasks", _ops_tasks),
+        _component("tts_cache", tts_cache.warm_cache),
+    ]
+    if settings.WARMUP_LLM:
+        jobs.append(_component("llm", _llm))
+    await asyncio.gather(*jobs)
+    readiness.finished_at = time.perf_counter()
+
+    breakdown = ", ".join(
+        f"{name}=skipped" if c["status"] == "skipped"
+        else f"{name}={c.get('duration_ms', 0):.0f}ms" + ("" if c["status"] == "ready" else f" ({c['status']})")
+        for name, c in readiness.components.items()
+    )
+    logger.info("Warm-up finished in %.0f ms (ready=%s): %s", (readiness.finished_at - readiness.started_at) * 1000, readiness.ready(), breakdown)
+    return readiness.report()
+
+
+def mark_ready_without_warmup() -> None:
+    """Treat components as lazily initialized when warm-up is disabled."""
+    for name in REQUIRED:
+        readiness.components[name] = {"status": "ready", "required": True, "detail": "lazy"}
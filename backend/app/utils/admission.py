@@ -0,0 +1,209 @@
+"""Admission control for expensive routes.
+
+Expensive endpoints are mapped (by method and exact path) to a named
+`Pool` with a concurrency limit, a bounded wait queue and a maximum wait.
+Everything else — listing reads, health/readiness, metrics — is not
+admission-controlled at all, so it can't be starved by LLM or pricing
+traffic.
+
+Within a pool, waiters are served by priority class (`INTERACTIVE` before
+`BATCH`), FIFO within a class. When the queue is full, an arriving request
+displaces the newest lower-priority waiter, or is shed. Shed requests and
+waiters whose deadline passes get an immediate 503 with a `Retry-After`
+estimated from the pool's recent service time.
+
+Limits are per worker process. Override them with `ADMISSION_LIMITS`,
+e.g. `llm=8/32/5,pricing=1/4/10` (limit/queue/max wait in seconds).
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.metrics import counter, gauge, histogram
+
+INTERACTIVE = 1
+BATCH = 2
+
+ADMISSION_REJECTED = counter(
+    "admission_rejected_total", "Requests shed by admission control, by pool and reason.",
+    ("pool", "reason"),
+)
+ADMISSION_QUEUED = gauge(
+    "admission_queued_requests", "Requests waiting for an admission slot.",
+    ("pool",),
+)
+ADMISSION_WAIT = histogram(
+    "admission_wait_seconds", "Time admitted requests spent queued.",
+    ("pool",),
+)
+
+
+class Pool:
+    def __init__(self, name: str, limit: int, queue: int, max_wait_s: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.max_wait_s = max_wait_s
+        self.active = 0
+        self.queued = 0
+        # (priority, seq, future); entries whose future is done are stale.
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # Exponentially weighted service time, for Retry-After.
+        self.service_s = 1.0
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.service_s * (self.queued + 1) / self.limit))
+
+    def _displace(self, priority: int) -> bool:
+        """Evict the newest waiter of a lower priority than `priority`."""
+        victim = None
+        for entry in self._waiters:
+            if entry[2].done() or entry[0] <= priority:
+                continue
+            if victim is None or entry[:2] > victim[:2]:
+                victim = entry
+        if victim is None:
+            return False
+        victim[2].set_result(False)
+        self.queued -= 1
+        return True
+
+    async def acquire(self, priority: int) -> Optional[str]:
+        """None once a slot is held, else the rejection reason."""
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            return None
+        if self.queued >= self.queue and not self._displace(priority):
+            return "queue_full"
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self.queued += 1
+        ADMISSION_QUEUED.inc(self.name)
+        started = time.perf_counter()
+        try:
+            granted = await asyncio.wait_for(asyncio.shield(fut), self.max_wait_s)
+        except asyncio.TimeoutError:
+            if not fut.done():
+                fut.set_result(False)
+                self.queued -= 1
+                return "deadline"
+            granted = fut.result()  # decided while the timeout fired
+        except asyncio.CancelledError:
+            self._abandon(fut)
+            raise
+        finally:
+            ADMISSION_QUEUED.dec(self.name)
+        if not granted:
+            return "displaced"
+        ADMISSION_WAIT.observe(time.perf_counter() - started, self.name)
+        return None
+
+    def _abandon(self, fut: asyncio.Future) -> None:
+        if not fut.done():
+            fut.set_result(False)
+            self.queued -= 1
+        elif fut.result():
+            # The slot was handed to us but we are leaving: pass it on.
+            self.release()
+
+    def release(self, service_s: Optional[float] = None) -> None:
+        if service_s is not None:
+            self.service_s = 0.8 * self.service_s + 0.2 * service_s
+        self.active -= 1
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self.queued -= 1
+            self.active += 1
+            fut.set_result(True)
+            return
+
+
+# pool name -> (limit, queue, max wait seconds)
+DEFAULT_POOLS: Dict[str, Tuple[int, int, float]] = {
+    "llm": (8, 32, 5.0),
+    "predict": (4, 16, 5.0),
+    "tts": (8, 32, 10.0),
+    "pricing": (1, 4, 10.0),
+    "compare": (16, 64, 2.0),
+    "ops": (2, 8, 10.0),
+    "analytics": (4, 16, 5.0),
+}
+
+# (method, path) -> (pool, priority class)
+DEFAULT_ROUTES: Dict[Tuple[str, str], Tuple[str, int]] = {
+    ("POST", "/api/v1/ai/text"): ("llm", INTERACTIVE),
+    ("POST", "/api/v1/reviews/requests"): ("llm", BATCH),
+    ("POST", "/api/predict"): ("predict", INTERACTIVE),
+    ("POST", "/api/image"): ("predict", INTERACTIVE),
+    ("POST", "/api/v1/ai/tts"): ("tts", INTERACTIVE),
+    ("POST", "/api/v1/listings/dynamic"): ("pricing", BATCH),
+    ("GET", "/api/v1/listings/compare"): ("compare", INTERACTIVE),
+    ("GET", "/api/v1/listings/price-history"): ("analytics", INTERACTIVE),
+    ("POST", "/api/v1/ops/checks"): ("ops", BATCH),
+    ("POST", "/api/v1/ops/cleanings/bulk"): ("ops", BATCH),
+}
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int, float]]:
+    limits: Dict[str, Tuple[int, int, float]] = {}
+    for part in spec.split(","):
+        name, _, values = part.strip().partition("=")
+        if not name or not values:
+            continue
+        limit, queue, wait = (values.split("/") + ["", ""])[:3]
+        default = DEFAULT_POOLS.get(name, (4, 16, 5.0))
+        limits[name] = (int(limit or default[0]), int(queue or default[1]), float(wait or default[2]))
+    return limits
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying `Pool` limits to mapped routes."""
+
+    def __init__(self, app, limits: str = "", routes: Optional[Dict[Tuple[str, str], Tuple[str, int]]] = None):
+        self.app = app
+        config = {**DEFAULT_POOLS, **parse_limits(limits)}
+        self.pools = {name: Pool(name, *values) for name, values in config.items()}
+        self.routes = routes if routes is not None else DEFAULT_ROUTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope.get("path", "")
+        policy = self.routes.get((scope.get("method", "GET"), path.rstrip("/") or "/"))
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        pool = self.pools[policy[0]]
+        reason = await pool.acquire(policy[1])
+        if reason is not None:
+            ADMISSION_REJECTED.inc(pool.name, reason)
+            await self._reject(send, pool, reason)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(time.perf_counter() - started)
+
+    @staticmethod
+    async def _reject(send, pool: Pool, reason: str) -> None:
+        body = json.dumps({"detail": "Server busy, retry later", "pool": pool.name, "reason": reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(pool.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
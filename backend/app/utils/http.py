@@ -0,0 +1,61 @@
+"""Process-wide pooled `httpx.AsyncClient`.
+
+Opening a client per call costs a fresh connection pool (and TLS handshake)
+every time; services share this one instead and pass per-request timeouts.
+The lifespan opens it at startup and closes it on shutdown; outside the
+app (scripts, benchmarks) it is created on first use. A client is bound to
+the event loop it was created on, so a new loop gets a new client.
+"""
+import asyncio
+from typing import Optional
+
+import httpx
+
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE = 20
+
+_client: Optional[httpx.AsyncClient] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+    )
+
+
+def _current(loop: asyncio.AbstractEventLoop) -> bool:
+    return _client is not None and not _client.is_closed and _loop is loop
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    if not _current(loop):
+        _client, _loop = _new_client(), loop
+    return _client
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    """Like `get_http_client`, but builds the client in a worker thread.
+
+    Loading the CA bundle takes ~0.2 s of CPU, which startup shouldn't
+    spend on the event loop.
+    """
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    if not _current(loop):
+        client = await asyncio.to_thread(_new_client)
+        if _current(loop):
+            await client.aclose()  # created on the loop meanwhile
+        else:
+            _client, _loop = client, loop
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client, _loop
+    if _client is not None and not _client.is_closed and _loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client, _loop = None, None
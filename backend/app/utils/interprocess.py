@@ -0,0 +1,86 @@
+"""Local coordination primitives shared by uvicorn worker processes.
+
+- `FileLock`: an exclusive advisory lock (`flock`) on a lock file. It is
+  acquired with a non-blocking attempt plus async backoff, so waiting never
+  blocks the event loop and a cancelled waiter can't leak a held lock.
+- `VersionCounter`: a 64-bit counter in a small memory-mapped file. All
+  processes on the host map the same page, so reading it is a cheap change
+  check; writers bump it (while holding the `FileLock`) after each write.
+
+On platforms without `fcntl` the lock degrades to a no-op with a warning;
+run a single worker there.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+
+try:
+    import fcntl # type: ignore
+except Exception:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_COUNTER = struct.Struct("<Q")
+
+
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        if fcntl is None:
+            logger.warning("fcntl unavailable; %s will not be locked across processes", path)
+
+    def acquire_nowait(self) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    async def acquire(self, max_backoff: float = 0.02) -> None:
+        delay = 0.0005
+        while not self.acquire_nowait():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_backoff)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+class VersionCounter:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _COUNTER.size:
+                os.ftruncate(fd, _COUNTER.size)
+            self._mm = mmap.mmap(fd, _COUNTER.size)
+        finally:
+            os.close(fd)
+
+    def read(self) -> int:
+        return _COUNTER.unpack_from(self._mm, 0)[0]
+
+    def bump(self, n: int = 1) -> int:
+        """Add `n` and return the new value; callers must hold the matching FileLock."""
+        value = self.read() + n
+        _COUNTER.pack_into(self._mm, 0, value)
+        return value
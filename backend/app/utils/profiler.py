@@ -0,0 +1,149 @@
+"""Opt-in per-request sampling profiler.
+
+A profiled request runs with an active `tracing` trace and a background
+thread that samples Python stacks every `PROFILE_INTERVAL_MS`. When the
+request finishes two files are written to `PROFILE_DIR`:
+
+- `<id>.folded` — collapsed stacks (`frame;frame;frame count`), the input
+  format of `flamegraph.pl`, speedscope and inferno.
+- `<id>.trace.json` — the span trace in Chrome trace-event format.
+
+Profiling is enabled per request by sending `X-Profile: <PROFILE_TOKEN>`
+(only when `PROFILE_TOKEN` is configured) or for every request with the
+`PROFILE_ALL_REQUESTS` admin flag. Only one profile runs at a time; other
+requests are served normally while it is in progress.
+
+Note that the sampler records every thread, including the event loop
+while it serves other concurrent requests — profile on a quiet instance
+for the clearest picture.
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from app.config import settings
+from app.utils.tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+_profile_guard = threading.Lock()
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads at a fixed interval."""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names.setdefault(t.ident, t.name)
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+@asynccontextmanager
+async def profile_block(label: str, out_dir: Optional[str] = None) -> AsyncIterator[Optional[str]]:
+    """Profile and trace the enclosed block; yields the profile id.
+
+    Yields `None` (and profiles nothing) if another profile is running.
+    Usable outside HTTP too, e.g. around `run_pricing_all()` in a script.
+    """
+    if not _profile_guard.acquire(blocking=False):
+        yield None
+        return
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')[:60]}-{uuid.uuid4().hex[:6]}"
+    out_dir = out_dir or settings.PROFILE_DIR
+    profiler = SamplingProfiler(interval=settings.PROFILE_INTERVAL_MS / 1000.0)
+    try:
+        with start_trace(label) as trace:
+            profiler.start()
+            try:
+                yield profile_id
+            finally:
+                profiler.stop()
+        try:
+            # Off the event loop: the other requests in flight are still being served.
+            await asyncio.to_thread(profiler.write_folded, os.path.join(out_dir, f"{profile_id}.folded"))
+            await asyncio.to_thread(trace.export, os.path.join(out_dir, f"{profile_id}.trace.json"))
+            logger.info("Profile %s written to %s (%d samples, %d spans)", profile_id, out_dir, sum(profiler.samples.values()), len(trace.spans))
+        except Exception:
+            logger.exception("Failed to write profile %s", profile_id)
+    finally:
+        _profile_guard.release()
+
+
+def _wants_profile(scope) -> bool:
+    if settings.PROFILE_ALL_REQUESTS:
+        return True
+    if not settings.PROFILE_TOKEN:
+        return False
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return value.decode("latin-1") == settings.PROFILE_TOKEN
+    return False
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles requests which opt in."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope.get('method', 'GET')} {scope.get('path', '')}"
+        async with profile_block(label) as profile_id:
+            if profile_id is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def _send(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, _send)
@@ -0,0 +1,120 @@
+"""Pluggable serialization for the listing store and API responses.
+
+Two codecs are provided, each with an optional fast backend:
+
+- `json`: `orjson` when installed, otherwise the stdlib `json` module with
+  compact separators.
+- `msgpack`: compact binary format via the `msgpack` package. If it is not
+  installed, requesting it falls back to `json` with a warning.
+
+`detect_format` sniffs the leading byte of a payload so stores written in
+either format can be read back regardless of the configured default.
+`FastJSONResponse` is a drop-in `JSONResponse` that renders with the fast
+JSON backend.
+"""
+import json
+import logging
+from typing import Any
+
+from fastapi.responses import JSONResponse # type: ignore
+
+try:
+    import orjson # type: ignore
+except Exception:
+    orjson = None
+
+try:
+    import msgpack # type: ignore
+except Exception:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+def json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONCodec:
+    name = "json"
+    extension = ".json"
+
+    @staticmethod
+    def dumps(obj: Any) -> bytes:
+        return json_dumps(obj)
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        return json_loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    extension = ".msgpack"
+
+    @staticmethod
+    def dumps(obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+CODECS = {"json": JSONCodec, "msgpack": MsgpackCodec}
+
+_warned_fallback = False
+
+
+def get_codec(name: str):
+    """Return the codec for `name`, falling back to JSON if unavailable."""
+    name = (name or "json").lower()
+    if name == "msgpack" and msgpack is None:
+        global _warned_fallback
+        if not _warned_fallback:
+            logger.warning("msgpack is not installed; falling back to JSON serialization")
+            _warned_fallback = True
+        return JSONCodec
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unsupported serialization format: {name}")
+    return codec
+
+
+def detect_format(data: bytes) -> str:
+    """Guess the codec of `data` from its first significant byte.
+
+    JSON documents stored here always start with `[` or `{` (possibly after
+    whitespace/BOM); msgpack arrays and maps start with 0x80-0x9f or
+    0xdc-0xdf.
+    """
+    stripped = data.lstrip(b" \t\r\n\xef\xbb\xbf")
+    if not stripped or stripped[:1] in (b"[", b"{"):
+        return "json"
+    first = stripped[0]
+    if 0x80 <= first <= 0x9F or 0xDC <= first <= 0xDF:
+        return "msgpack"
+    return "json"
+
+
+def loads_any(data: bytes) -> Any:
+    """Decode `data` with whichever codec it was written in."""
+    fmt = detect_format(data)
+    if fmt == "msgpack" and msgpack is None:
+        raise RuntimeError("data is msgpack-encoded but msgpack is not installed")
+    return CODECS[fmt].loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """`JSONResponse` rendered with the fast JSON backend (orjson if installed)."""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
@@ -0,0 +1,151 @@
+"""Lightweight nested timing spans.
+
+Spans are only recorded while a `Trace` is active in the current context
+(see `start_trace`), so the decorators and context managers below cost a
+single `ContextVar.get()` on untraced requests. A finished trace can be
+exported in the Chrome trace-event format, which loads directly in
+`chrome://tracing`, Perfetto or speedscope.
+
+Usage:
+
+    @traced("listing_service.get_listing")
+    async def get_listing(...): ...
+
+    with span("listing_service.decode", bytes=len(raw)):
+        ...
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class Trace:
+    """Collects finished spans for one request or job."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lanes: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def _lane(self) -> int:
+        # One lane per asyncio task / thread so concurrent spans (gather,
+        # to_thread) don't render as if they were nested.
+        try:
+            key: Any = id(asyncio.current_task())
+        except RuntimeError:
+            key = threading.get_ident()
+        with self._lock:
+            return self._lanes.setdefault(key, len(self._lanes))
+
+    def record(self, name: str, start: float, end: float, parent: Optional[str], attrs: Dict[str, Any]) -> None:
+        entry = {
+            "name": name,
+            "start_ms": (start - self.started) * 1000.0,
+            "duration_ms": (end - start) * 1000.0,
+            "parent": parent,
+            "lane": self._lane(),
+            "attrs": attrs,
+        }
+        with self._lock:
+            self.spans.append(entry)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Total time and call count per span name."""
+        out: Dict[str, Dict[str, float]] = {}
+        for s in self.spans:
+            agg = out.setdefault(s["name"], {"count": 0, "total_ms": 0.0})
+            agg["count"] += 1
+            agg["total_ms"] += s["duration_ms"]
+        return out
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        events = [
+            {
+                "name": s["name"],
+                "ph": "X",
+                "ts": round(s["start_ms"] * 1000.0, 3),
+                "dur": round(s["duration_ms"] * 1000.0, 3),
+                "pid": os.getpid(),
+                "tid": s["lane"],
+                "args": {**s["attrs"], "parent": s["parent"]},
+            }
+            for s in self.spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace": self.name}}
+
+    def export(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name: str) -> Iterator[Trace]:
+    """Activate a new trace for the enclosed block (and tasks it spawns)."""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    parent = _current_span.get()
+    token = _current_span.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, start, time.perf_counter(), parent, attrs)
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator wrapping a sync or async function in a span."""
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _current_trace.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1 @@
+"""Benchmark and load-test suite; see `benchmarks/run.py`."""
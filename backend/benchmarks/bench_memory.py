@@ -0,0 +1,40 @@
+"""Resident memory of the portfolio: plain dicts vs `ListingTable`.
+
+Both representations are built from freshly decoded store bytes (as a
+real load would) and measured with `tracemalloc`.
+"""
+import gc
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.models.listing_table import ListingTable
+from app.utils.serialization import json_dumps, json_loads
+
+
+def _measure(build: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        obj = build()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del obj
+    return after - before
+
+
+def bench_memory(portfolio: List[Dict[str, Any]]) -> Dict[str, Any]:
+    raw = json_dumps(portfolio)
+    n = max(len(portfolio), 1)
+    dicts = _measure(lambda: json_loads(raw))
+    table = _measure(lambda: ListingTable.from_dicts(json_loads(raw)))
+    return {
+        "listings": len(portfolio),
+        "dicts_bytes": dicts,
+        "table_bytes": table,
+        "dicts_bytes_per_listing": round(dicts / n, 1),
+        "table_bytes_per_listing": round(table / n, 1),
+        "reduction": round(1 - table / dicts, 3) if dicts else 0.0,
+    }
@@ -0,0 +1,159 @@
+"""Microbenchmarks for `listing_service` and the pricing/calendar agents."""
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from app.services import listing_service
+from app.services.comp_index import SpatialIndex
+from app.services.agents import run_calendar_sync, run_pricing_all
+from app.services.price_history import PriceHistory
+from app.services.search_index import SearchIndex
+
+from benchmarks.common import summarize, time_calls
+
+
+async def bench_listing_service(portfolio: List[Dict[str, Any]], iterations: int, seed: int = 7) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    ids = [l["id"] for l in portfolio]
+    results: Dict[str, Any] = {}
+
+    results["get_listing"] = await time_calls(lambda: listing_service.get_listing(rng.choice(ids)), iterations)
+    results["list_listings"] = await time_calls(lambda: listing_service.list_listings(), iterations)
+    results["list_listings_available"] = await time_calls(lambda: listing_service.list_listings(available_only=True), iterations)
+    results["update_listing"] = await time_calls(
+        lambda: listing_service.update_listing(rng.choice(ids), {"price": round(rng.uniform(50, 400), 2)}), iterations
+    )
+    results["adjust_price"] = await time_calls(
+        lambda: listing_service.adjust_price(rng.choice(ids), multiplier=1.01), iterations
+    )
+
+    created: List[str] = []
+
+    async def _create():
+        new = await listing_service.create_listing(
+            {"title": "Bench listing", "description": "Benchmark", "address": "1 Bench St, Cityville", "price": 99.0}
+        )
+        created.append(new["id"])
+
+    results["create_listing"] = await time_calls(_create, iterations)
+    results["delete_listing"] = await time_calls(lambda: listing_service.delete_listing(created.pop()), iterations)
+    results["adjust_all_dynamic"] = await time_calls(lambda: listing_service.adjust_all_dynamic(rate=1.01), max(1, iterations // 4))
+    return results
+
+
+async def bench_price_history(portfolio: List[Dict[str, Any]], iterations: int, changes: int = 10, seed: int = 7) -> Dict[str, Any]:
+    """Price history append/replay cost and range queries over 30 days of changes per listing."""
+    rng = random.Random(seed)
+    now = time.time()
+    start = now - 30 * 86400
+    points = []
+    for l in portfolio:
+        t = start + rng.random() * 86400
+        for _ in range(changes):
+            points.append((0, l["id"], t, round(rng.uniform(50, 400), 2)))
+            t += rng.random() * 6 * 86400
+    ids = [l["id"] for l in portfolio]
+    with tempfile.TemporaryDirectory() as tmp:
+        history = PriceHistory(os.path.join(tmp, "history.bin"), os.path.join(tmp, "history.ids"))
+        started = time.perf_counter()
+        async with history.locked() as h:
+            await h.write(points)
+        write = time.perf_counter() - started
+        replica = PriceHistory(history.path, history.ids_path)
+        started = time.perf_counter()
+        async with replica.locked():
+            pass
+        replay = time.perf_counter() - started
+        results: Dict[str, Any] = {
+            "write": {**summarize([write], write), "points": history.points, "bytes": os.path.getsize(history.path)},
+            "replay": summarize([replay], replay),
+        }
+
+        async def _series():
+            return history.series(rng.choice(ids), start, now)
+
+        async def _summary():
+            return history.portfolio(start, now, 86400, (50, 90))
+
+        results["series"] = await time_calls(_series, iterations * 5)
+        results["portfolio_daily_30d"] = await time_calls(_summary, max(1, iterations // 10))
+    return results
+
+
+async def _time_once(fn) -> Dict[str, Any]:
+    started = time.perf_counter()
+    out = await fn()
+    elapsed = time.perf_counter() - started
+    return {**summarize([elapsed], elapsed), "items": len(out or [])}
+
+
+async def bench_agents(portfolio: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One full pricing run and calendar sync over the portfolio (mock adapters)."""
+    return {
+        "run_pricing_all": await _time_once(run_pricing_all),
+        "run_calendar_sync": await _time_once(run_calendar_sync),
+    }
+
+
+async def bench_search(portfolio: List[Dict[str, Any]], iterations: int, seed: int = 7) -> Dict[str, Any]:
+    """Search index build time and query latency (exact, multi-token, prefix)."""
+    rng = random.Random(seed)
+    table = await listing_service.get_listing_table()
+    started = time.perf_counter()
+    index = SearchIndex.from_table(table)
+    build = time.perf_counter() - started
+    titles = [l["title"].lower().split() for l in portfolio]
+
+    def _query(kind: str) -> str:
+        words = rng.choice(titles)
+        if kind == "one":
+            return rng.choice(words)
+        if kind == "prefix":
+            return " ".join(words[:-1] + [words[-1][:3]])
+        return " ".join(words)
+
+    results: Dict[str, Any] = {"build": {**summarize([build], build), "docs": len(index)}}
+    for kind in ("one", "all", "prefix"):
+        async def _search(kind=kind):
+            return index.search(_query(kind), limit=20)
+        results[f"query_{kind}"] = await time_calls(_search, iterations * 5)
+    return results
+
+
+async def bench_comp_index(portfolio: List[Dict[str, Any]], iterations: int, cities: int = 20, seed: int = 7) -> Dict[str, Any]:
+    """Spatial index build and kNN/radius lookups, listings clustered around `cities` centres."""
+    rng = random.Random(seed)
+    centres = [(rng.uniform(-40, 60), rng.uniform(-120, 140)) for _ in range(cities)]
+    points = []
+    for l in portfolio:
+        lat, lng = rng.choice(centres)
+        # ~5 km spread around the centre, like listings across a city.
+        points.append((l["id"], rng.gauss(lat, 0.05), rng.gauss(lng, 0.05)))
+    index = SpatialIndex()
+    started = time.perf_counter()
+    for key, lat, lng in points:
+        index.upsert(key, lat, lng, {"beds": rng.randint(1, 4)})
+    build = time.perf_counter() - started
+    attrs = index.attrs
+    results: Dict[str, Any] = {"build": {**summarize([build], build), "points": len(index), "cell_deg": index.cell_deg}}
+
+    def _at_listing():
+        _, lat, lng = rng.choice(points)
+        return lat, lng
+
+    async def _knn():
+        return index.nearest(*_at_listing(), 10, 5.0)
+
+    async def _knn_beds():
+        return index.nearest(*_at_listing(), 10, 5.0, lambda key: abs(attrs[key]["beds"] - 2) <= 1)
+
+    async def _radius():
+        return index.radius(*_at_listing(), 1.0)
+
+    results["knn_10_5km"] = await time_calls(_knn, iterations * 5)
+    results["knn_10_5km_beds"] = await time_calls(_knn_beds, iterations * 5)
+    results["radius_1km"] = await time_calls(_radius, iterations * 5)
+    results["radius_1km"]["mean_results"] = round(sum(len(index.radius(*_at_listing(), 1.0)) for _ in range(100)) / 100, 1)
+    return results
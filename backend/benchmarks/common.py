@@ -0,0 +1,116 @@
+"""Shared helpers for the benchmark suite: timing, summaries and an isolated store."""
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List
+
+from app.services import comp_index, listing_service, ops_tasks, platform_sync, price_grid, price_history, search_index
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies: List[float], wall: float = 0.0) -> Dict[str, Any]:
+    """Summarize per-call latencies (seconds) in milliseconds."""
+    values = sorted(latencies)
+    n = len(values)
+    wall = wall or sum(values)
+    return {
+        "n": n,
+        "mean_ms": round(sum(values) / n * 1000.0, 4) if n else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000.0, 4),
+        "p95_ms": round(percentile(values, 95) * 1000.0, 4),
+        "p99_ms": round(percentile(values, 99) * 1000.0, 4),
+        "max_ms": round(values[-1] * 1000.0, 4) if n else 0.0,
+        "ops_per_sec": round(n / wall, 2) if wall else 0.0,
+    }
+
+
+async def time_calls(fn: Callable[[], Awaitable[Any]], iterations: int) -> Dict[str, Any]:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def _no_webhook(event: str, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+    return {"ok": True, "status_code": 200, "result": "benchmark"}
+
+
+@contextmanager
+def isolated_store(listings: List[Dict[str, Any]]) -> Iterator[str]:
+    """Point the file-backed services at a temporary directory seeded with `listings`.
+
+    The listing store, price history, comp index, price grid inputs,
+    platform sync state and ops task journal all live there for the run,
+    with their loaded state reset, so benchmarks never read or write
+    `backend/data`. Outbound n8n webhooks fired by listing mutations are
+    replaced with a no-op so runs measure our code rather than network
+    timeouts.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="rentout-bench-")
+    path = os.path.join(tmpdir, "listings.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(listings, f)
+
+    def data(name: str) -> str:
+        return os.path.join(tmpdir, name)
+
+    overrides = [
+        (listing_service, {"DATA_FILE": path, "send_webhook": _no_webhook}),
+        (price_history, {
+            "_history": price_history.PriceHistory(data("price_history.bin"), data("price_history.ids")),
+            "_loaded": False,
+            "_buffer": [],
+        }),
+        (search_index, {"_index": None}),
+        (comp_index, {
+            "GEOCODE_CACHE_FILE": data("geocode_cache.json"),
+            "OBSERVATIONS_FILE": data("competitor_observations.json"),
+            "_index": comp_index.SpatialIndex(),
+            "_geocode_cache": {},
+            "_observations": {},
+            "_pending_geocode": set(),
+            "_loaded": False,
+        }),
+        (price_grid, {
+            "INPUTS_FILE": data("price_grid_inputs.json"),
+            "_grid": price_grid.PriceGrid(),
+            "_bookings": {},
+            "_competitors": {},
+            "_inputs_key": None,
+            "_inputs_file_lock": None,
+            "_dirty": set(),
+        }),
+        (platform_sync, {
+            "STATE_FILE": data("platform_sync_state.json"),
+            "_state": {},
+            "_state_key": None,
+            "_file_lock": None,
+            "_pending": {},
+        }),
+        (ops_tasks, {"TASKS_FILE": data("ops_tasks.jsonl"), "_store": ops_tasks.TaskStore(data("ops_tasks.jsonl"))}),
+    ]
+    saved = [(module, {name: getattr(module, name) for name in values}) for module, values in overrides]
+    for module, values in overrides:
+        for name, value in values.items():
+            setattr(module, name, value)
+    try:
+        yield path
+    finally:
+        for module, values in saved:
+            for name, value in values.items():
+                setattr(module, name, value)
+        shutil.rmtree(tmpdir, ignore_errors=True)
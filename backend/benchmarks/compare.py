@@ -0,0 +1,57 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json --threshold 0.15
+
+Every `p50_ms`/`p95_ms`/`p99_ms` present in both files is compared; the
+exit status is 1 if any got slower by more than `--threshold` (relative).
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _walk(node: Any, path: Tuple[str, ...] = ()) -> Iterator[Tuple[str, float]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in _KEYS and isinstance(value, (int, float)):
+                yield "/".join(path + (key,)), float(value)
+            else:
+                yield from _walk(value, path + (str(key),))
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> int:
+    before = dict(_walk(old.get("results", {})))
+    after = dict(_walk(new.get("results", {})))
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        a, b = before[key], after[key]
+        change = (b - a) / a if a else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  improved"
+        print(f"{key:70s} {a:12.3f} -> {b:12.3f} ms  {change:+7.1%}{flag}")
+    print(f"\n{regressions} regression(s) above {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    return compare(old, new, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
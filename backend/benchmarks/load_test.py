@@ -0,0 +1,84 @@
+"""Concurrent HTTP load generator for the FastAPI app.
+
+Runs in-process through `httpx.ASGITransport` by default (no server
+needed) or against a live server with `base_url`. A fixed number of
+workers issue requests drawn from a weighted scenario mix until
+`total_requests` have been sent; latency percentiles and throughput are
+reported per scenario and overall.
+"""
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import summarize
+
+Scenario = Tuple[str, int, Callable[[random.Random, List[str]], Tuple[str, str, Optional[Dict[str, Any]]]]]
+
+SCENARIOS: List[Scenario] = [
+    ("get_listing", 50, lambda rng, ids: ("GET", f"/api/v1/listings/{rng.choice(ids)}", None)),
+    ("update_listing", 15, lambda rng, ids: ("PUT", f"/api/v1/listings/{rng.choice(ids)}", {"price": round(rng.uniform(50, 400), 2)})),
+    ("compare", 15, lambda rng, ids: ("GET", "/api/v1/listings/compare?address=1%20Main%20St", None)),
+    ("health", 15, lambda rng, ids: ("GET", "/health", None)),
+    ("list_listings", 5, lambda rng, ids: ("GET", "/api/v1/listings/?available_only=true", None)),
+]
+
+
+async def run_load(
+    total_requests: int = 2000,
+    concurrency: int = 32,
+    base_url: Optional[str] = None,
+    seed: int = 11,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+    else:
+        from app.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=timeout)
+
+    async with client:
+        listing = await client.get("/api/v1/listings/")
+        listing.raise_for_status()
+        ids = [l["id"] for l in listing.json()]
+        if not ids:
+            raise RuntimeError("load test needs at least one listing in the store")
+
+        names = [s[0] for s in SCENARIOS]
+        weights = [s[1] for s in SCENARIOS]
+        builders = {s[0]: s[2] for s in SCENARIOS}
+        latencies: Dict[str, List[float]] = {n: [] for n in names}
+        errors: Dict[str, int] = {n: 0 for n in names}
+        remaining = [total_requests]
+
+        async def worker(worker_id: int):
+            rng = random.Random(seed * 1000 + worker_id)
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                name = rng.choices(names, weights)[0]
+                method, path, body = builders[name](rng, ids)
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(method, path, json=body)
+                    if r.status_code >= 500:
+                        errors[name] += 1
+                except Exception:
+                    errors[name] += 1
+                latencies[name].append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    all_latencies = [x for values in latencies.values() for x in values]
+    return {
+        "target": base_url or "in-process",
+        "concurrency": concurrency,
+        "overall": {**summarize(all_latencies, wall), "errors": sum(errors.values())},
+        "scenarios": {
+            n: {**summarize(latencies[n], wall), "errors": errors[n]} for n in names if latencies[n]
+        },
+    }
@@ -0,0 +1,51 @@
+"""Synthetic listing portfolios for benchmarks.
+
+Portfolios are deterministic for a given `(size, seed)` so results from
+different versions of the code are comparable.
+"""
+import random
+import uuid
+from typing import Any, Dict, List
+
+_ADJECTIVES = ["Cozy", "Sunny", "Modern", "Rustic", "Spacious", "Quiet", "Charming", "Bright", "Elegant", "Compact"]
+_KINDS = ["apartment", "studio", "loft", "cottage", "villa", "townhouse", "cabin", "suite", "bungalow", "flat"]
+_AREAS = ["downtown", "near the beach", "in the old town", "by the park", "with sea view", "close to the station"]
+_STREETS = ["Main St", "Ocean Ave", "Park Rd", "High St", "Station Rd", "Hill Ln", "River Walk", "Market Sq"]
+_CITIES = [
+    ("Cityville", 48.8566, 2.3522),
+    ("Beachtown", 43.2965, 5.3698),
+    ("Hillside", 45.7640, 4.8357),
+    ("Lakeview", 46.2044, 6.1432),
+    ("Harbor City", 51.5072, -0.1276),
+]
+
+
+def make_listing(rng: random.Random, i: int) -> Dict[str, Any]:
+    city, lat, lng = rng.choice(_CITIES)
+    beds = rng.randint(1, 5)
+    title = f"{rng.choice(_ADJECTIVES)} {rng.choice(_KINDS)} {rng.choice(_AREAS)}"
+    metadata: Dict[str, Any] = {
+        "beds": beds,
+        "baths": max(1, beds - rng.randint(0, 2)),
+        "lat": round(lat + rng.uniform(-0.08, 0.08), 6),
+        "lng": round(lng + rng.uniform(-0.08, 0.08), 6),
+        "amenities": rng.sample(["wifi", "parking", "pool", "kitchen", "washer", "ac", "pets"], k=3),
+    }
+    # Roughly a third of the portfolio is published somewhere, so the
+    # calendar agent has remote ids to sync.
+    if rng.random() < 0.33:
+        metadata["remote_ids"] = {"airbnb": f"airbnb-{i}"}
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "title": title,
+        "description": f"{title}. Sleeps {beds * 2}, {city}. Listing #{i}.",
+        "address": f"{rng.randint(1, 999)} {rng.choice(_STREETS)}, {city}",
+        "price": round(rng.uniform(45.0, 450.0), 2),
+        "available": rng.random() < 0.85,
+        "metadata": metadata,
+    }
+
+
+def make_portfolio(size: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rng = random.Random(seed + size)
+    return [make_listing(rng, i) for i in range(size)]
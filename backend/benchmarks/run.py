@@ -0,0 +1,112 @@
+"""Run the benchmark suite and save results as JSON.
+
+Usage (from `backend/`):
+
+    python -m benchmarks.run                       # 1k, 10k, 100k listings
+    python -m benchmarks.run --sizes 1000 --load-requests 5000 --concurrency 64
+    python -m benchmarks.run --url http://localhost:8000 --sizes 0   # load-test a live server only
+
+Agent runs (`run_pricing_all`, `run_calendar_sync`) touch every listing, so
+they are skipped above `--agent-max-size` unless raised explicitly.
+Compare two result files with `python -m benchmarks.compare old.json new.json`.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks.bench_memory import bench_memory
+from benchmarks.bench_services import bench_agents, bench_comp_index, bench_listing_service, bench_price_history, bench_search
+from benchmarks.common import isolated_store
+from benchmarks.load_test import run_load
+from benchmarks.portfolio import make_portfolio
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _default_iterations(size: int) -> int:
+    # Writes rewrite the whole store, so scale iterations down with size.
+    return max(3, min(200, 200_000 // max(size, 1)))
+
+
+async def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for size in args.sizes:
+        if size <= 0:
+            continue
+        logging.info("Benchmarking portfolio of %d listings", size)
+        portfolio = make_portfolio(size, seed=args.seed)
+        entry: Dict[str, Any] = {"memory": bench_memory(portfolio)}
+        with isolated_store(portfolio):
+            entry["listing_service"] = await bench_listing_service(portfolio, args.iterations or _default_iterations(size))
+            entry["search"] = await bench_search(portfolio, args.iterations or _default_iterations(size))
+            entry["price_history"] = await bench_price_history(portfolio, args.iterations or _default_iterations(size))
+            entry["comp_index"] = await bench_comp_index(portfolio, args.iterations or _default_iterations(size))
+            if size <= args.agent_max_size:
+                entry["agents"] = await bench_agents(portfolio)
+            else:
+                entry["agents"] = {"skipped": f"size > --agent-max-size ({args.agent_max_size})"}
+            if not args.skip_load and not args.url:
+                entry["load"] = await run_load(args.load_requests, args.concurrency, seed=args.seed)
+        results[str(size)] = entry
+
+    if args.url and not args.skip_load:
+        results["remote"] = {"load": await run_load(args.load_requests, args.concurrency, base_url=args.url, seed=args.seed)}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=0, help="calls per CRUD benchmark (default scales with size)")
+    parser.add_argument("--agent-max-size", type=int, default=1000)
+    parser.add_argument("--load-requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--url", help="load-test a running server instead of the in-process app")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="output file (default benchmarks/results/<timestamp>-<rev>.json)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Keep per-request service logs out of the benchmark output.
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    started = time.time()
+    results = asyncio.run(run_suite(args))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "duration_s": round(time.time() - started, 2),
+        },
+        "results": results,
+    }
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))}-{report['meta']['git_rev']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
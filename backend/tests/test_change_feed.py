@@ -0,0 +1,79 @@
+"""Change feed delivery and resync after the shared change log is truncated."""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from app.services import listing_service, search_index
+from app.services.change_feed import ChangeFeed
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_publish_and_since():
+    feed = ChangeFeed(maxlen=3)
+    seen = []
+    feed.subscribe(seen.extend)
+    feed.reset(10)
+    feed.publish([("created", "a", {"id": "a"}), ("updated", "b", {"id": "b"})], 12)
+    assert [c["seq"] for c in seen] == [11, 12]
+    assert [c["id"] for c in feed.since(11)["changes"]] == ["b"]
+    feed.publish([("deleted", "a", None), ("updated", "b", {"id": "b"})], 14)
+    # Seq 11 fell off the front: asking from before it means resync.
+    assert feed.since(10)["resync_required"]
+    assert [c["seq"] for c in feed.since(11)["changes"]] == [12, 13, 14]
+
+
+def test_reset_notifies_subscribers():
+    feed = ChangeFeed()
+    resets = []
+    feed.subscribe(lambda changes: None, on_reset=lambda: resets.append(feed.last_seq))
+    feed.subscribe(lambda changes: None)
+    feed.reset(5)
+    assert resets == [5]
+    assert feed.since(4)["resync_required"]
+
+
+_OTHER_WORKER = textwrap.dedent("""
+    import asyncio, sys
+    from app.services import listing_service
+
+    async def no_webhook(event, payload, **kwargs):
+        return {"ok": True}
+
+    listing_service.DATA_FILE = sys.argv[1]
+    listing_service.CHANGE_LOG_MAX_BYTES = 256
+    listing_service.send_webhook = no_webhook
+
+    async def main():
+        for n in range(60):
+            await listing_service.create_listing({"title": f"zebra loft {n}", "price": 100})
+
+    asyncio.run(main())
+""")
+
+
+def test_truncated_change_log_rebuilds_search_index(tmp_path, monkeypatch):
+    path = str(tmp_path / "listings.json")
+    titles = ["zebra house", "zebra flat", "zebra barn", "sea view", "city loft"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"id": f"l{i}", "title": t, "price": 100.0, "available": True} for i, t in enumerate(titles)], f)
+    monkeypatch.setattr(listing_service, "DATA_FILE", path)
+    monkeypatch.setattr(listing_service, "_table", None)
+    monkeypatch.setattr(listing_service, "_table_key", None)
+    monkeypatch.setattr(listing_service, "_log_pos", None)
+    monkeypatch.setattr(search_index, "_index", None)
+
+    assert asyncio.run(search_index.search_listings("zebra"))["total"] == 3
+
+    # Another worker writes more changes than the log keeps.
+    env = {**os.environ, "CHANGE_FEED_SIZE": "4", "PYTHONPATH": BACKEND}
+    subprocess.run([sys.executable, "-c", _OTHER_WORKER, path], cwd=BACKEND, env=env, check=True)
+    with open(listing_service._change_log_path(), encoding="utf-8") as f:
+        assert f.readline().startswith("# floor ")
+
+    result = asyncio.run(search_index.search_listings("zebra", limit=100))
+    assert result["total"] == 63
+    assert len(result["results"]) == 63
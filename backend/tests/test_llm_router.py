@@ -0,0 +1,109 @@
+"""LLMRouter against the offline `stub` provider (see `llm_service._call_stub`)."""
+import asyncio
+import time
+
+from app.services.llm_router import FAILURE_THRESHOLD, LLMRouter, RouteStats, parse_routes
+from app.services.llm_service import _call
+from app.utils.metrics import LLM_LATENCY
+
+
+def _router(spec: str, **kwargs) -> LLMRouter:
+    return LLMRouter(parse_routes(spec), _call, **kwargs)
+
+
+def test_parse_routes():
+    assert parse_routes(" Anthropic:claude-3-haiku, openai ,,stub:fast@5") == [
+        ("anthropic", "claude-3-haiku"), ("openai", None), ("stub", "fast@5"),
+    ]
+
+
+def test_routes_to_fastest_after_probe():
+    router = _router("stub:slow@150,stub:fast@10")
+
+    async def run():
+        await router.probe()
+        return await router.complete("hello")
+
+    reply, route = asyncio.run(run())
+    assert route == ("stub", "fast@10")
+    assert reply == "[stub:fast] hello"
+
+
+def test_falls_back_when_route_fails():
+    router = _router("stub:down!1,stub:up@5")
+    reply, route = asyncio.run(router.complete("hi"))
+    assert route == ("stub", "up@5")
+    down = router.stats[("stub", "down!1")]
+    assert down.failures == 1 and down.error_rate() == 1.0
+
+
+def test_all_routes_failing_raises():
+    router = _router("stub:a!1,stub:b!1")
+    try:
+        asyncio.run(router.complete("hi"))
+    except RuntimeError as e:
+        assert "stub:a!1" in str(e) and "stub:b!1" in str(e)
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    router = _router("stub:down!1,stub:up@5")
+
+    async def run():
+        for _ in range(FAILURE_THRESHOLD):
+            await router.probe()
+
+    asyncio.run(run())
+    assert not router.stats[("stub", "down!1")].healthy(time.monotonic())
+    assert router.ranked()[-1] == ("stub", "down!1")
+
+
+def test_hedge_wins_and_loser_is_censored():
+    router = _router("stub:slow@400,stub:fast@10", hedge=True, hedge_default_s=0.05, hedge_min_s=0.05)
+
+    async def run():
+        result = await router.complete("hi")
+        await asyncio.sleep(0)  # let the cancelled loser record its sample
+        return result
+
+    _, route = asyncio.run(run())
+    assert route == ("stub", "fast@10")
+    slow = router.stats[("stub", "slow@400")]
+    assert len(slow.samples) == 1
+    assert slow.successes == 0 and slow.failures == 0 and slow.error_rate() == 0.0
+    # The censored sample is a lower bound: at least the hedge budget.
+    assert slow.quantile(0.5) >= 0.05
+    assert router.ranked()[0] == ("stub", "fast@10")
+
+
+def test_censored_sample_does_not_reset_breaker():
+    stats = RouteStats()
+    for _ in range(FAILURE_THRESHOLD - 1):
+        stats.record(0.1, False, 0.0)
+    stats.record(0.5, None, 0.0)
+    assert stats.consecutive_failures == FAILURE_THRESHOLD - 1
+    stats.record(0.1, False, 0.0)
+    assert not stats.healthy(1.0)
+    assert stats.successes == 0
+    assert stats.quantile(0.5) == 0.5
+
+
+def _llm_outcomes(provider: str) -> dict:
+    with LLM_LATENCY._lock:
+        return {key[1]: hv.count for key, hv in LLM_LATENCY._values.items() if key[0] == provider}
+
+
+def test_cancelled_hedge_loser_is_not_an_error():
+    router = _router("stub:slow@400,stub:fast@10", hedge=True, hedge_default_s=0.05, hedge_min_s=0.05)
+    before = _llm_outcomes("stub")
+
+    async def run():
+        await router.complete("hi")
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    after = _llm_outcomes("stub")
+    assert after.get("success", 0) - before.get("success", 0) == 1
+    assert after.get("cancelled", 0) - before.get("cancelled", 0) == 1
+    assert after.get("error", 0) == before.get("error", 0)
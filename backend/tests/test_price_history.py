@@ -0,0 +1,38 @@
+"""Buffered price history writes survive a failed flush."""
+import asyncio
+
+import pytest
+
+from app.services import price_history
+
+
+def test_failed_flush_keeps_buffered_points(tmp_path, monkeypatch):
+    history = price_history.PriceHistory(str(tmp_path / "price_history.bin"), str(tmp_path / "price_history.ids"))
+    monkeypatch.setattr(price_history, "_history", history)
+    monkeypatch.setattr(price_history, "_loaded", True)
+    monkeypatch.setattr(price_history, "_buffer", [(1, "a", 100.0, 50.0), (2, "b", 100.0, 70.0), (3, "a", 200.0, 55.0)])
+
+    append = history._append_sync
+
+    def disk_full(new_ids, records):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(history, "_append_sync", disk_full)
+    with pytest.raises(OSError):
+        asyncio.run(price_history.flush())
+    assert len(price_history._buffer) == 3
+    assert "a" not in history.numbers
+
+    monkeypatch.setattr(history, "_append_sync", append)
+    assert asyncio.run(price_history.flush()) == 3
+    assert price_history._buffer == []
+    assert history.series("a", 0.0, 1000.0) == ([100.0, 200.0], [50.0, 55.0])
+
+    # A fresh reader sees exactly what was written.
+    reread = price_history.PriceHistory(history.path, history.ids_path)
+
+    async def replay():
+        async with reread.locked():
+            return reread.series("b", 0.0, 1000.0)
+
+    assert asyncio.run(replay()) == ([100.0], [70.0])